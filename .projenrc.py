@@ -13,12 +13,28 @@ PROJECT = PythonProject(
     version="0.0.0",
     description="description",
     poetry=True,
+    poetry_options={
+        "scripts": {
+            "pinecone-plan": "pinecone_constructs.aws.plan:main",
+            "pinecone-metadata-config": "pinecone_constructs.aws.metadata_config:main",
+            "pinecone-reduce-dimension": "pinecone_constructs.aws.dimensionality_reduction:main",
+            "pinecone-export": "pinecone_constructs.aws.export:main",
+        },
+        # the dimensionality reduction and export tools, i.e. pip install pinecone_constructs[tools]
+        "extras": {
+            "tools": ["numpy", "pyarrow"],
+        },
+    },
     deps=[
         "python@^3.8",
         "pydantic@^2.4",
         "pydantic-settings@^2.0",
+        'numpy@{ version = "^1.24", optional = true }',
+        'pyarrow@{ version = ">=12", optional = true }',
     ],
     dev_deps=[
+        "numpy@^1.24",
+        "pyarrow@>=12",
         "projen@<=0.72.0",
         "aws-cdk-lib@^2.69",
         "crhelper@^2.0",
@@ -1,16 +1,23 @@
 """Define the Pinecone database construct."""
 import json
 from hashlib import md5
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, Union, List
+from typing import Dict, Optional, Union, List
 
-from aws_cdk import CustomResource, Duration
-from aws_cdk.aws_secretsmanager import Secret
+import jsii
+from aws_cdk import CustomResource, Duration, RemovalPolicy, Stack, Stage
+from aws_cdk import aws_dynamodb as dynamodb
+from aws_cdk import aws_events as events
+from aws_cdk import aws_events_targets as events_targets
+from aws_cdk import aws_s3_assets as s3_assets
+from aws_cdk import aws_ssm as ssm
+from aws_cdk.aws_secretsmanager import ISecret, Secret
 from aws_cdk.aws_iam import PolicyStatement
 from aws_cdk import aws_lambda_python_alpha as lambda_alpha
 from aws_cdk import aws_lambda as _lambda
 from aws_cdk import (
+    Aws,
     Size,
     CfnOutput,
 )
@@ -20,14 +27,83 @@ from pydantic_settings import BaseSettings
 from pydantic import BaseModel
 
 from .custom_resource.function.pinecone_settings import (
+    IndexPoolShape,
     PineconeIndexSettings,
+    SharedIndex,
+    ShardLayout,
+    ShardMap,
     MAX_INDEX_NAME_LENGTH,
+    get_shard_name,
+    get_shared_indexes,
+    get_environment_attribute_name,
+    get_benchmark_attribute_names,
+)
+from .custom_resource.function.settings import (
+    Settings as RuntimeSettings,
+    DriftDetectionSettings,
+    IndexPoolSettings,
 )
-from .custom_resource.function.settings import Settings as RuntimeSettings
 
 
 
 _CUSTOM_RESOURCE_DIRECTORY = Path(__file__).parent / "custom_resource"
+_BUNDLING_SCRIPT = "bundling.py"
+_BENCHMARK_TIMEOUT_SECONDS = 900
+_MAX_STANDARD_PARAMETER_SIZE = 4096
+
+
+@dataclass
+class BundleConfig:
+    """
+    Bundling configuration for the custom resource functions.
+
+    The size and import time of the bundle are reported against their budgets
+    every time the functions are bundled. The import time is measured on the build
+    host, i.e. in the bundling container, often under emulation, so it only tracks
+    regressions of the bundle and is not the cold start of the function. It is not
+    checked by fail_on_budget.
+    """
+
+    slim: bool = False
+    precompile: bool = True
+    strip: bool = True
+    lazy_powertools_import: bool = True
+    max_bundle_size_mb: float = 100
+    max_bundle_import_ms: float = 2000
+    fail_on_budget: bool = False
+
+
+@jsii.implements(lambda_alpha.ICommandHooks)
+class _BundleCommandHooks:
+    """Slim the bundle and report its size after the requirements are installed."""
+
+    def __init__(self, config: BundleConfig) -> None:
+        self._config = config
+
+    def before_bundling(self, input_dir: str, output_dir: str) -> List[str]:  # pylint: disable=unused-argument
+        """Return the commands to run before bundling."""
+        return []
+
+    def after_bundling(self, input_dir: str, output_dir: str) -> List[str]:
+        """Return the commands to run after bundling."""
+        config = self._config
+        flags = [
+            f"--max-bundle-size-mb {config.max_bundle_size_mb}",
+            f"--max-bundle-import-ms {config.max_bundle_import_ms}",
+        ]
+        if config.slim:
+            flags += [
+                flag
+                for flag, enabled in {
+                    "--strip": config.strip,
+                    "--lazy-powertools-import": config.lazy_powertools_import,
+                    "--precompile": config.precompile,
+                }.items()
+                if enabled
+            ]
+        if config.fail_on_budget:
+            flags.append("--fail-on-budget")
+        return [f"python {input_dir}/{_BUNDLING_SCRIPT} {output_dir} {' '.join(flags)}"]
 
 
 class PineconeIndex(Construct):
@@ -47,36 +123,190 @@ class PineconeIndex(Construct):
         memory_size_mb: int = 256
         timeout: int = 120
         ephemeral_storage_size_mb: int = 512
+        tracing: bool = False
+        bundle_config: BundleConfig = field(default_factory=BundleConfig)
 
     def __init__(  # pylint: disable=too-many-arguments
         self,
         scope: Construct,
         construct_id: str,
         index_settings: Union[List[PineconeIndexSettings], PineconeIndexSettings],
+        enable_operation_ledger: bool = False,
+        drift_detection_schedule: Optional[events.Schedule] = None,
+        drift_detection_index_prefixes: Optional[List[str]] = None,
+        bundle_config: Optional[BundleConfig] = None,
+        enable_tracing: bool = False,
+        index_pool: Optional["PineconeIndexPool"] = None,
+        multiplex_namespaces: bool = False,
+        legacy_index_name: Optional[str] = None,
         **kwargs,
     ) -> None:
-        """Initialize the Pinecone database construct."""
+        """
+        Initialize the Pinecone database construct.
+
+        Args:
+            scope: The scope of the construct.
+            construct_id: The id of the construct.
+            index_settings: The settings for the indexes to manage.
+            enable_operation_ledger: If true, completed operations are recorded in a
+                DynamoDB table so that replayed CloudFormation events are no-ops even
+                when they land on a new lambda container.
+            drift_detection_schedule: If set, a function is deployed on this schedule
+                that compares the live indexes against the synthesized settings and
+                publishes drift metrics and events.
+            drift_detection_index_prefixes: Additional index name prefixes to treat as
+                managed by this construct when detecting drift, i.e. the stack prefix
+                used by indexes created with the legacy stack-level custom resource.
+            bundle_config: How to bundle the custom resource functions. Set slim to
+                precompile and strip the bundle for faster uploads and cold starts.
+            enable_tracing: If true, active X-Ray tracing is enabled on the custom resource
+                function, and every step of a request, i.e. fetching the api key, each
+                pinecone call and retry, is traced as a subsegment annotated with the
+                CloudFormation request id.
+            index_pool: If set, indexes are leased from this pool of ready indexes instead
+                of being created, and cleared and returned to it when they are deleted.
+                Only indexes with the DESTROY removal policy, and without a metadata
+                config, source collection or additional environments, are leased. A
+                leased index keeps the name it has in the pool, which is output as the
+                IndexName of the index. Drift detection and plans look up the leased
+                names in the pool table.
+            multiplex_namespaces: If true, indexes with the same project, dimension and
+                metric are stored in namespaces of one shared index, named after the
+                dimension and metric, i.e. for many small tenants, or a project that
+                allows a single index. The shared index has the largest pods and
+                replicas of its namespaces, and the namespaces must have the same pod
+                type. Deleting a namespace deletes its vectors, unless its removal policy
+                retains them. The shared index and namespace of each index are output.
+            legacy_index_name: The name in the settings of the index that was deployed
+                when the construct managed a single index. Its custom resource keeps the
+                logical id it had then, so that it is not replaced. The logical ids of the
+                other indexes are derived from their names, so adding, removing or
+                reordering indexes does not move settings onto another resource.
+
+        """
         super().__init__(scope, construct_id, **kwargs)
         if not isinstance(index_settings, list):
             index_settings = [index_settings]
+        self._shared_indexes: List[SharedIndex] = []
+        if multiplex_namespaces:
+            assert index_pool is None, "Shared indexes cannot be leased from a pool"
+            self._shared_indexes = get_shared_indexes(index_settings)
+            index_settings = [shared_index.index_settings for shared_index in self._shared_indexes]
+        assert legacy_index_name is None or legacy_index_name in [settings.name for settings in index_settings], (
+            f"Legacy index '{legacy_index_name}' is not one of the indexes"
+        )
         self._index_settings = index_settings
+        self._legacy_index_name = legacy_index_name
+        self._bundle_config = bundle_config or BundleConfig()
+        runtime_settings = RuntimeSettings()
+        self.operation_ledger_table: Optional[dynamodb.Table] = None
+        if enable_operation_ledger:
+            self.operation_ledger_table = self._create_operation_ledger_table(f"{construct_id}OperationLedger")
+            runtime_settings.operation_ledger_table_name = self.operation_ledger_table.table_name
+        runtime_settings.tracing_enabled = enable_tracing
+        self._index_pool = index_pool
+        if index_pool is not None:
+            runtime_settings.index_pool_table_name = index_pool.table.table_name
+            runtime_settings.index_pool_name_prefix = index_pool.index_name_prefix
+        # the benchmark runs in the same invocation as the create or update it measures
+        timeout = self.LambdaConfig.timeout
+        if any(settings.benchmark for settings in index_settings):
+            timeout = _BENCHMARK_TIMEOUT_SECONDS
         self.custom_resource_provider = self._create_custom_resource(
             self.LambdaConfig(
                 construct_id=f"{construct_id}Lambda",
                 description="Custom resource provider for configuring Pinecone indexes.",
                 index_directory=_CUSTOM_RESOURCE_DIRECTORY,
-                environment=RuntimeSettings()
+                environment=runtime_settings,
+                timeout=timeout,
+                tracing=enable_tracing,
+                bundle_config=self._bundle_config,
             )
         )
+        self.drift_detection_function: Optional[lambda_alpha.PythonFunction] = None
+        if drift_detection_schedule:
+            self.drift_detection_function = self._create_drift_detector(
+                f"{construct_id}DriftDetection",
+                drift_detection_schedule,
+                [self.index_name_prefix, *(drift_detection_index_prefixes or [])],
+            )
+
+    @property
+    def index_settings(self) -> List[PineconeIndexSettings]:
+        """Return the settings of the managed indexes, with their deployed names."""
+        return self._index_settings
+
+    @property
+    def namespace_settings(self) -> List[PineconeIndexSettings]:
+        """Return the settings of the indexes stored in namespaces, with the deployed names of their shared indexes."""
+        return [settings for shared_index in self._shared_indexes for settings in shared_index.namespace_settings]
+
+    @property
+    def index_name_prefix(self) -> str:
+        """Return the prefix of the names of the managed indexes."""
+        return self.get_index_name_prefix(self.custom_resource_provider)
+
+    @property
+    def index_pool(self) -> Optional["PineconeIndexPool"]:
+        """Return the pool the indexes are leased from, if any."""
+        return self._index_pool
+
+    def add_projection_artifact(
+        self,
+        index_settings: PineconeIndexSettings,
+        artifact_path: Union[str, Path],
+    ) -> s3_assets.Asset:
+        """
+        Upload the dimensionality reduction artifact of an index next to it.
+
+        The artifact is created with pinecone_constructs.aws.dimensionality_reduction,
+        and its S3 url is output so that the clients of the index apply the same
+        projection. Grant the clients read access with asset.grant_read.
+
+        Args:
+            index_settings: The settings of the index, as passed to this construct.
+            artifact_path: The path to the saved projection.
+
+        Returns:
+            The asset of the artifact.
+
+        """
+        assert index_settings in self._index_settings, f"Index '{index_settings.name}' is not managed by this construct"
+        asset = s3_assets.Asset(self, f"{index_settings.name}Projection", path=str(artifact_path))
+        CfnOutput(
+            self,
+            f"{index_settings.name}ProjectionUrl",
+            value=asset.s3_object_url,
+            description=f"S3 url of the dimensionality reduction of the '{index_settings.name}' Pinecone index.",
+        )
+        return asset
+
+    def _create_operation_ledger_table(self, construct_id: str) -> dynamodb.Table:
+        return dynamodb.Table(
+            self,
+            construct_id,
+            partition_key=dynamodb.Attribute(name="key", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.DESTROY,
+        )
 
     def _create_custom_resource(self, func_config: LambdaConfig) -> cr.Provider:
-        function = self._get_lambda(func_config)
+        function = self._get_lambda(self, func_config)
+        if self.operation_ledger_table:
+            self.operation_ledger_table.grant_read_write_data(function)
+        if self._index_pool is not None:
+            self._index_pool.table.grant_read_write_data(function)
         provider: cr.Provider = cr.Provider(
             self,
             id=f"{func_config.construct_id}Provider",
             on_event_handler=function,  # type: ignore
         )
-        for index_settings in self._index_settings:
+        api_key_secrets: Dict[str, ISecret] = {}
+        for i, index_settings in enumerate(self._index_settings):
+            # the legacy index keeps the id it had when the construct managed a single index
+            suffix = "" if index_settings.name == self._legacy_index_name else index_settings.name
+            custom_resource_id = f"{func_config.construct_id}{suffix}CustomResource"
             index_settings.name = self.get_index_name(provider, index_settings)
             properties = self.serialize_env(index_settings)
             # we are adding these properties so that cloudformation will
@@ -84,26 +314,174 @@ class PineconeIndex(Construct):
             # or the custom resource directory has changed, i.e. the lambda
             # function code has changed
             properties["custom_resource_dir_hash"] = self.get_hash_for_all_files_in_dir(_CUSTOM_RESOURCE_DIRECTORY)
-            api_key_secret = Secret.from_secret_name_v2(self, "PineconeApiKey", index_settings.api_key_secret_name)
-            api_key_secret.grant_read(function)
-            CustomResource(
+            if index_settings.api_key_secret_name not in api_key_secrets:
+                api_key_secret = Secret.from_secret_name_v2(
+                    self,
+                    "PineconeApiKey" if not api_key_secrets else f"PineconeApiKey{len(api_key_secrets)}",
+                    index_settings.api_key_secret_name,
+                )
+                api_key_secret.grant_read(function)
+                api_key_secrets[index_settings.api_key_secret_name] = api_key_secret
+            for j, additional_environment in enumerate(index_settings.additional_environments):
+                if additional_environment.api_key_secret_name:
+                    Secret.from_secret_name_v2(
+                        self,
+                        f"{index_settings.name}PineconeApiKey{j}",
+                        additional_environment.api_key_secret_name,
+                    ).grant_read(function)
+            custom_resource = CustomResource(
                 self,
-                id=f"{func_config.construct_id}CustomResource",
+                id=custom_resource_id,
                 service_token=provider.service_token,
                 properties=properties,
             )
             CfnOutput(
                 self,
                 f"{index_settings.name}IndexName",
-                value=index_settings.name,
+                # the physical id is the name of the index, which differs from the
+                # synthesized name when the index is leased from a pool
+                value=custom_resource.ref if self._index_pool is not None else index_settings.name,
                 description=f"Name of the '{index_settings.name}' Pinecone index.",
             )
+            if index_settings.additional_environments:
+                self._add_environment_outputs(custom_resource, index_settings)
+            if index_settings.benchmark:
+                self._add_benchmark_outputs(custom_resource, index_settings)
+                if index_settings.benchmark.sample_s3_uri:
+                    bucket, _, key = index_settings.benchmark.sample_s3_uri[len("s3://") :].partition("/")
+                    function.add_to_role_policy(
+                        statement=PolicyStatement(
+                            actions=["s3:GetObject"],
+                            resources=[f"arn:{Aws.PARTITION}:s3:::{bucket}/{key}"],
+                        )
+                    )
+            if self._shared_indexes:
+                self._add_namespaces(provider, custom_resource, self._shared_indexes[i], func_config.construct_id)
         return provider
 
+    def _add_namespaces(
+        self,
+        provider: cr.Provider,
+        index_resource: CustomResource,
+        shared_index: SharedIndex,
+        construct_id: str,
+    ) -> None:
+        """Add a custom resource for each namespace of a shared index, and output where to find it."""
+        for namespace_settings in shared_index.namespace_settings:
+            namespace_settings.name = shared_index.index_settings.name
+            properties = self.serialize_env(namespace_settings)
+            properties["custom_resource_dir_hash"] = self.get_hash_for_all_files_in_dir(_CUSTOM_RESOURCE_DIRECTORY)
+            namespace_resource = CustomResource(
+                self,
+                id=f"{construct_id}{namespace_settings.namespace}NamespaceCustomResource",
+                service_token=provider.service_token,
+                properties=properties,
+            )
+            # namespaces are created after, and deleted before, their shared index
+            namespace_resource.node.add_dependency(index_resource)
+            for attribute in ("IndexName", "Namespace", "Host"):
+                CfnOutput(
+                    self,
+                    f"{namespace_settings.namespace}{attribute}",
+                    value=namespace_resource.get_att_string(attribute),
+                    description=f"{attribute} of the '{namespace_settings.namespace}' Pinecone index.",
+                )
+
+    def _add_environment_outputs(
+        self,
+        custom_resource: CustomResource,
+        index_settings: PineconeIndexSettings,
+    ) -> None:
+        """Output the name and host of each copy of the index, so that clients can route to the closest one."""
+        for environment_settings in index_settings.get_environment_settings():
+            environment = environment_settings.environment
+            for attribute in ("IndexName", "Host"):
+                attribute_name = get_environment_attribute_name(attribute, environment)
+                CfnOutput(
+                    self,
+                    f"{index_settings.name}{attribute_name}",
+                    value=custom_resource.get_att_string(attribute_name),
+                    description=f"{attribute} of the '{index_settings.name}' Pinecone index in '{environment}'.",
+                )
+
+    def _add_benchmark_outputs(
+        self,
+        custom_resource: CustomResource,
+        index_settings: PineconeIndexSettings,
+    ) -> None:
+        """Output the latency and throughput of the index at each benchmarked concurrency level."""
+        assert index_settings.benchmark is not None, "index_settings.benchmark is None"
+        for concurrency in index_settings.benchmark.concurrency_levels:
+            for attribute_name in get_benchmark_attribute_names(concurrency).values():
+                CfnOutput(
+                    self,
+                    f"{index_settings.name}{attribute_name}",
+                    value=custom_resource.get_att_string(attribute_name),
+                    description=f"{attribute_name} of the '{index_settings.name}' Pinecone index.",
+                )
+
+    def _create_drift_detector(
+        self,
+        construct_id: str,
+        schedule: events.Schedule,
+        managed_index_prefixes: List[str],
+    ) -> lambda_alpha.PythonFunction:
+        # the settings of many indexes exceed the 4 KB limit of the environment variables
+        expected_indexes_path = Path(Stage.of(self).outdir) / f"{self.node.addr}-expected-indexes.json"
+        expected_indexes_path.write_text(
+            json.dumps([index_settings.model_dump(mode="json") for index_settings in self._index_settings])
+        )
+        expected_indexes = s3_assets.Asset(self, f"{construct_id}ExpectedIndexes", path=str(expected_indexes_path))
+        function = self._get_lambda(
+            self,
+            self.LambdaConfig(
+                construct_id=construct_id,
+                description="Detects drift between the synthesized and live Pinecone indexes.",
+                index_directory=_CUSTOM_RESOURCE_DIRECTORY,
+                index_module_name="function/drift.py",
+                environment=DriftDetectionSettings(
+                    expected_indexes_s3_uri=expected_indexes.s3_object_url,
+                    managed_index_prefixes=managed_index_prefixes,
+                    index_pool_table_name=self._index_pool.table.table_name if self._index_pool else None,
+                ),
+                bundle_config=self._bundle_config,
+            )
+        )
+        secret_names = sorted(
+            {
+                environment_settings.api_key_secret_name
+                for index_settings in self._index_settings
+                for environment_settings in index_settings.get_environment_settings()
+            }
+        )
+        for i, secret_name in enumerate(secret_names):
+            Secret.from_secret_name_v2(self, f"{construct_id}ApiKey{i}", secret_name).grant_read(function)
+        expected_indexes.grant_read(function)
+        if self._index_pool is not None:
+            self._index_pool.table.grant_read_data(function)
+        function.add_to_role_policy(
+            statement=PolicyStatement(
+                actions=["events:PutEvents"],
+                resources=["*"],
+            )
+        )
+        events.Rule(
+            self,
+            f"{construct_id}Schedule",
+            schedule=schedule,
+            targets=[events_targets.LambdaFunction(function)],  # type: ignore
+        )
+        return function
+
     @staticmethod
-    def get_index_name(provider: cr.Provider, index_settings: PineconeIndexSettings) -> str:
+    def get_index_name_prefix(provider: cr.Provider) -> str:
+        """Get the prefix of the names of the indexes managed by the provider."""
+        return md5(provider.service_token.encode()).hexdigest()[:20]
+
+    @classmethod
+    def get_index_name(cls, provider: cr.Provider, index_settings: PineconeIndexSettings) -> str:
         """Get the index name."""
-        prefix = md5(provider.service_token.encode()).hexdigest()[:20]
+        prefix = cls.get_index_name_prefix(provider)
         index_name = index_settings.name
         name = f"{prefix}-{index_name}"
         return name[:MAX_INDEX_NAME_LENGTH]
@@ -133,10 +511,11 @@ class PineconeIndex(Construct):
             )
         )
 
-    def _get_lambda(self, config: LambdaConfig) -> lambda_alpha.PythonFunction:
+    @classmethod
+    def _get_lambda(cls, scope: Construct, config: LambdaConfig) -> lambda_alpha.PythonFunction:
         index_directory = Path(config.index_directory)
         lambda_function = lambda_alpha.PythonFunction(
-            self,
+            scope,
             config.construct_id,
             description=config.description,
             entry=str(index_directory.resolve().as_posix()),
@@ -149,6 +528,7 @@ class PineconeIndex(Construct):
                     "PIP_PLATFORM": "manylinux2014_aarch64",
                     "PIP_ONLY_BINARY": ":all:",
                 },
+                command_hooks=_BundleCommandHooks(config.bundle_config),  # type: ignore
             ),
             index=config.index_module_name,
             handler=config.handler,
@@ -156,10 +536,11 @@ class PineconeIndex(Construct):
             timeout=Duration.seconds(config.timeout),
             memory_size=config.memory_size_mb,
             ephemeral_storage_size=Size.mebibytes(config.ephemeral_storage_size_mb),
-            environment=self.serialize_env(config.environment) if config.environment else None,
+            tracing=_lambda.Tracing.ACTIVE if config.tracing else None,
+            environment=cls.serialize_env(config.environment) if config.environment else None,
         )
         CfnOutput(
-            self,
+            scope,
             f"{config.construct_id}FunctionArn",
             value=lambda_function.function_arn,
             description=f"ARN for the {config.construct_id} Lambda function.",
@@ -206,3 +587,193 @@ class PineconeIndex(Construct):
             if file.is_file() and file.suffix in {".py", ".json"}:
                 raw_text += file.read_text()
         return md5(raw_text.encode()).hexdigest()
+
+
+class PineconeIndexPool(Construct):
+    """
+    Define a pool of ready, empty Pinecone indexes.
+
+    Creating a pod-based index takes minutes. PineconeIndex constructs that use the
+    pool lease a ready index with a matching shape instead, i.e. for short lived
+    preview stacks, and return it once they are deleted. The pool is refilled on a
+    schedule, and when it is created or updated. Indexes in the pool that are not
+    leased are deleted with it.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        scope: Construct,
+        construct_id: str,
+        shapes: List[IndexPoolShape],
+        refill_schedule: Optional[events.Schedule] = None,
+        bundle_config: Optional[BundleConfig] = None,
+        index_name_prefix: Optional[str] = None,
+        **kwargs,
+    ) -> None:
+        """
+        Initialize the index pool construct.
+
+        Args:
+            scope: The scope of the construct.
+            construct_id: The id of the construct.
+            shapes: The shapes of the indexes to keep ready, and how many of each.
+            refill_schedule: How often to refill the pool. Defaults to every 5 minutes.
+            bundle_config: How to bundle the pool function.
+            index_name_prefix: The prefix of the names of the indexes in the pool, which
+                must be unique in the Pinecone project. Defaults to a hash of the stack
+                account, region and name, and the path of the construct. Set it when
+                environment agnostic stacks with the same name share a project.
+
+        """
+        super().__init__(scope, construct_id, **kwargs)
+        stack = Stack.of(self)
+        pool_id = f"{stack.account}/{stack.region}/{stack.stack_name}/{self.node.addr}"
+        self.index_name_prefix = index_name_prefix or f"pool-{md5(pool_id.encode()).hexdigest()[:10]}"
+        self.table = dynamodb.Table(
+            self,
+            f"{construct_id}Table",
+            partition_key=dynamodb.Attribute(name="index_name", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+        pool_settings = IndexPoolSettings(
+            index_pool_table_name=self.table.table_name,
+            index_pool_name_prefix=self.index_name_prefix,
+            shapes=shapes,
+        )
+        self.function = PineconeIndex._get_lambda(  # pylint: disable=protected-access
+            self,
+            PineconeIndex.LambdaConfig(
+                construct_id=f"{construct_id}Refill",
+                description="Keeps ready Pinecone indexes in the pool.",
+                index_directory=_CUSTOM_RESOURCE_DIRECTORY,
+                index_module_name="function/pool.py",
+                environment=pool_settings,
+                bundle_config=bundle_config or BundleConfig(),
+            ),
+        )
+        self.table.grant_read_write_data(self.function)
+        for i, secret_name in enumerate(sorted({shape.api_key_secret_name for shape in shapes})):
+            Secret.from_secret_name_v2(self, f"{construct_id}ApiKey{i}", secret_name).grant_read(self.function)
+        events.Rule(
+            self,
+            f"{construct_id}RefillSchedule",
+            schedule=refill_schedule or events.Schedule.rate(Duration.minutes(5)),
+            targets=[events_targets.LambdaFunction(self.function)],  # type: ignore
+        )
+        provider = cr.Provider(
+            self,
+            id=f"{construct_id}Provider",
+            on_event_handler=self.function,  # type: ignore
+        )
+        CustomResource(
+            self,
+            id=f"{construct_id}CustomResource",
+            service_token=provider.service_token,
+            properties=PineconeIndex.serialize_env(pool_settings),
+        )
+        # the table is named by CloudFormation, so it is published under a name known at
+        # synth time, for plans to look up the leased indexes with
+        self.table_name_parameter_name = f"/pinecone-constructs/index-pool/{self.index_name_prefix}/table-name"
+        ssm.StringParameter(
+            self,
+            f"{construct_id}TableNameParameter",
+            parameter_name=self.table_name_parameter_name,
+            string_value=self.table.table_name,
+            description="Name of the table of the Pinecone index pool.",
+        )
+
+
+class ShardedPineconeIndex(Construct):
+    """
+    Define a set of identical Pinecone indexes that share the vectors of one logical index.
+
+    A single index is limited to a couple of pods, so capacity and write throughput are
+    scaled out by adding shards. The shards are managed by a PineconeIndex construct,
+    and the shard map is output, and optionally published to an SSM parameter, for the
+    ShardRouter in pinecone_constructs.aws.sharding to route to the shards with.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        scope: Construct,
+        construct_id: str,
+        index_settings: PineconeIndexSettings,
+        num_shards: int,
+        layout: ShardLayout = ShardLayout.CONSISTENT_HASH,
+        tenant_shards: Optional[Dict[str, int]] = None,
+        virtual_nodes: int = 64,
+        shard_map_parameter_name: Optional[str] = None,
+        **kwargs,
+    ) -> None:
+        """
+        Initialize the sharded index construct.
+
+        Args:
+            scope: The scope of the construct.
+            construct_id: The id of the construct.
+            index_settings: The settings of each shard. The shards are named after it,
+                i.e. 'my-index-0'.
+            num_shards: The number of shards. Changing it moves the vectors of some ids
+                or tenants to other shards, which must be re-upserted.
+            layout: Whether vectors are assigned to shards by the hash of their id, or
+                by their tenant.
+            tenant_shards: The shard of each tenant with the tenant layout, i.e. to give
+                the largest tenants a shard of their own. Other tenants are hashed onto
+                the shards.
+            virtual_nodes: The number of points of each shard on the hash ring.
+            shard_map_parameter_name: If set, the shard map is published to an SSM
+                parameter with this name.
+            kwargs: Passed to the PineconeIndex construct of the shards, i.e.
+                enable_operation_ledger or enable_tracing.
+
+        """
+        super().__init__(scope, construct_id)
+        assert num_shards >= 1, f"num_shards '{num_shards}' must be at least 1"
+        assert "index_pool" not in kwargs and "multiplex_namespaces" not in kwargs, (
+            "Shards must be indexes of their own, with names known at synth time"
+        )
+        tenant_shards = tenant_shards or {}
+        assert all(0 <= shard < num_shards for shard in tenant_shards.values()), (
+            f"Tenant shards {tenant_shards} must be less than num_shards '{num_shards}'"
+        )
+        self.index = PineconeIndex(
+            self,
+            f"{construct_id}Shards",
+            [
+                index_settings.model_copy(update={"name": get_shard_name(index_settings.name, shard)})
+                for shard in range(num_shards)
+            ],
+            **kwargs,
+        )
+        index_names = [settings.name for settings in self.index.index_settings]
+        assert len(set(index_names)) == num_shards, (
+            f"Shard names {index_names} are not unique once truncated. Use a shorter index name."
+        )
+        self.shard_map = ShardMap(
+            layout=layout,
+            index_names=index_names,
+            environment=index_settings.environment,
+            metric=index_settings.metric,
+            virtual_nodes=virtual_nodes,
+            tenant_shards=tenant_shards,
+        )
+        shard_map_json = self.shard_map.model_dump_json()
+        CfnOutput(
+            self,
+            f"{construct_id}ShardMap",
+            value=shard_map_json,
+            description=f"Shard map of the '{index_settings.name}' Pinecone index set.",
+        )
+        self.shard_map_parameter: Optional[ssm.StringParameter] = None
+        if shard_map_parameter_name:
+            self.shard_map_parameter = ssm.StringParameter(
+                self,
+                f"{construct_id}ShardMapParameter",
+                parameter_name=shard_map_parameter_name,
+                string_value=shard_map_json,
+                description=f"Shard map of the '{index_settings.name}' Pinecone index set.",
+                tier=ssm.ParameterTier.ADVANCED
+                if len(shard_map_json) > _MAX_STANDARD_PARAMETER_SIZE
+                else ssm.ParameterTier.STANDARD,
+            )
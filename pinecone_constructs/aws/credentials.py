@@ -0,0 +1,16 @@
+"""Read the Pinecone API key of a project for the command line tools."""
+import os
+
+import boto3
+
+
+API_KEY_ENVIRONMENT_VARIABLE = "PINECONE_API_KEY"
+
+
+def get_api_key(secret_name: str) -> str:
+    """Return the Pinecone API key from the environment, or from AWS Secrets Manager."""
+    api_key = os.environ.get(API_KEY_ENVIRONMENT_VARIABLE)
+    if api_key:
+        return api_key
+    client = boto3.client("secretsmanager")
+    return client.get_secret_value(SecretId=secret_name)["SecretString"]
@@ -0,0 +1,231 @@
+"""
+Slim the bundled custom resource functions, and report their size and import time.
+
+This runs inside the bundling container, after the requirements have been installed
+into the output directory, and is removed from the bundle once it has run.
+"""
+import argparse
+import compileall
+import os
+import py_compile
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# packages that are installed as dependencies, but never imported by the functions
+UNUSED_PATHS = [
+    "bin",
+    "pinecone/core/grpc",
+    "numpy/f2py",
+    "numpy/_pyinstaller",
+    "aws_lambda_powertools/event_handler",
+    "aws_lambda_powertools/utilities/batch",
+    "aws_lambda_powertools/utilities/data_classes",
+    "aws_lambda_powertools/utilities/data_masking",
+    "aws_lambda_powertools/utilities/feature_flags",
+    "aws_lambda_powertools/utilities/idempotency",
+    "aws_lambda_powertools/utilities/parser",
+    "aws_lambda_powertools/utilities/streaming",
+    "aws_lambda_powertools/utilities/validation",
+]
+HANDLER_MODULES = ["function.index", "function.drift", "function.pool"]
+NUM_IMPORT_TIME_SAMPLES = 3
+
+# the imports in the powertools package __init__ of the logger, metrics and tracer,
+# which are otherwise imported whenever any powertools utility is imported
+EAGER_POWERTOOLS_IMPORT = re.compile(
+    r"^from (?:aws_lambda_powertools)?\.(logging|metrics|tracing) import ([\w, ]+?)[ \t]*(?:#.*)?$\n?",
+    re.MULTILINE,
+)
+LAZY_POWERTOOLS_GETATTR = """
+
+import importlib as _importlib
+
+_LAZY_ATTRIBUTES = {lazy_attributes!r}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(_importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    raise AttributeError(f"module {{__name__!r}} has no attribute {{name!r}}")
+"""
+
+
+def strip(bundle_dir: Path) -> None:
+    """Remove tests, type stubs and unused packages from the bundle."""
+    for path in UNUSED_PATHS:
+        shutil.rmtree(bundle_dir / path, ignore_errors=True)
+    for path in list(bundle_dir.rglob("tests")) + list(bundle_dir.rglob("__pycache__")):
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+    for path in bundle_dir.rglob("*.pyi"):
+        path.unlink()
+
+
+def get_lazy_powertools_init(source: str) -> Optional[str]:
+    """
+    Return the powertools package __init__ with its logger, metrics and tracer imported on first use.
+
+    Only the eager imports are removed from the installed __init__, so the rest of it,
+    which differs between powertools versions, is kept as is.
+
+    Returns:
+        The patched source, or None if the __init__ has none of the eager imports.
+
+    """
+    lazy_attributes: Dict[str, str] = {}
+    for match in EAGER_POWERTOOLS_IMPORT.finditer(source):
+        for name in match.group(2).split(","):
+            lazy_attributes[name.strip()] = f"aws_lambda_powertools.{match.group(1)}"
+    if not lazy_attributes:
+        return None
+    return EAGER_POWERTOOLS_IMPORT.sub("", source) + LAZY_POWERTOOLS_GETATTR.format(lazy_attributes=lazy_attributes)
+
+
+def use_lazy_powertools_import(bundle_dir: Path) -> None:
+    """Import only the powertools modules that are used, instead of the whole package."""
+    init_file = bundle_dir / "aws_lambda_powertools" / "__init__.py"
+    if not init_file.exists():
+        return
+    source = get_lazy_powertools_init(init_file.read_text())
+    if source is None:
+        print("WARNING: the powertools package imports were not recognized, so they are not made lazy.")
+        return
+    init_file.write_text(source)
+
+
+def precompile(bundle_dir: Path) -> None:
+    """
+    Compile every module in the bundle to bytecode.
+
+    The lambda file system is read-only, so modules that are not precompiled are
+    compiled on every cold start. The bundle is zipped with fixed timestamps, so the
+    bytecode is not checked against the source timestamps.
+    """
+    success = compileall.compile_dir(
+        str(bundle_dir),
+        quiet=1,
+        force=True,
+        workers=0,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    )
+    if not success:
+        print("WARNING: some modules in the bundle could not be compiled.")
+
+
+def get_bundle_size_mb(bundle_dir: Path) -> float:
+    """Return the uncompressed size of the bundle in MiB."""
+    return sum(path.stat().st_size for path in bundle_dir.rglob("*") if path.is_file()) / 2**20
+
+
+def get_zipped_bundle_size_mb(bundle_dir: Path) -> float:
+    """Return the size of the zipped bundle in MiB."""
+    with tempfile.TemporaryFile() as file:
+        with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for path in bundle_dir.rglob("*"):
+                if path.is_file():
+                    archive.write(path, path.relative_to(bundle_dir))
+        return file.tell() / 2**20
+
+
+def get_import_time_ms(bundle_dir: Path, modules: List[str]) -> float:
+    """
+    Return the median time to import the handler modules in a fresh interpreter.
+
+    Raises:
+        subprocess.CalledProcessError: If the modules fail to import.
+
+    """
+    code = (
+        "import time; start = time.perf_counter(); "
+        + "; ".join(f"import {module}" for module in modules)
+        + "; print((time.perf_counter() - start) * 1000)"
+    )
+    env = {**os.environ, "PYTHONPATH": str(bundle_dir), "PYTHONDONTWRITEBYTECODE": "1"}
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    samples = []
+    for _ in range(NUM_IMPORT_TIME_SAMPLES):
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=bundle_dir,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def report(bundle_dir: Path, max_bundle_size_mb: float, max_bundle_import_ms: float) -> bool:
+    """
+    Print the size and import time of the bundle against their budgets.
+
+    The import time is measured here, on the build host, which is often emulating
+    the architecture of the function. It is reported to track regressions, but is
+    not the cold start of the function, so it does not count against the budgets.
+    A bundle whose handlers fail to import is reported, rather than failing the
+    bundling, and is not within its budgets.
+
+    Returns:
+        Whether the bundle is within its size budget, and its handlers import.
+
+    """
+    size = get_bundle_size_mb(bundle_dir)
+    zipped_size = get_zipped_bundle_size_mb(bundle_dir)
+    within_budget = True
+    lines = [f"bundle size: {size:.1f} MiB ({zipped_size:.1f} MiB zipped), budget {max_bundle_size_mb:.1f} MiB"]
+    if size > max_bundle_size_mb:
+        within_budget = False
+        lines.append("WARNING: the bundle is larger than its budget.")
+    modules = [module for module in HANDLER_MODULES if _exists(bundle_dir, module)]
+    try:
+        import_time = get_import_time_ms(bundle_dir, modules)
+    except subprocess.CalledProcessError as error:
+        within_budget = False
+        stderr = (error.stderr or "").strip().splitlines()
+        lines.append(f"ERROR: the handlers failed to import: {stderr[-1] if stderr else error}")
+    else:
+        lines.append(f"bundle import time (build host): {import_time:.0f} ms, budget {max_bundle_import_ms:.0f} ms")
+        if import_time > max_bundle_import_ms:
+            lines.append("WARNING: the handlers take longer to import on the build host than their budget.")
+    print("\n".join(["Pinecone custom resource bundle report", *lines]))
+    return within_budget
+
+
+def _exists(bundle_dir: Path, module: str) -> bool:
+    return (bundle_dir / f"{module.replace('.', '/')}.py").exists()
+
+
+def main(argv: List[str] = None) -> int:
+    """Slim the bundle, then report its size and import time."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("bundle_dir", type=Path)
+    parser.add_argument("--strip", action="store_true")
+    parser.add_argument("--lazy-powertools-import", action="store_true")
+    parser.add_argument("--precompile", action="store_true")
+    parser.add_argument("--max-bundle-size-mb", type=float, required=True)
+    parser.add_argument("--max-bundle-import-ms", type=float, required=True)
+    parser.add_argument("--fail-on-budget", action="store_true")
+    args = parser.parse_args(argv)
+    bundle_dir: Path = args.bundle_dir
+    (bundle_dir / Path(__file__).name).unlink(missing_ok=True)
+    if args.strip:
+        strip(bundle_dir)
+    if args.lazy_powertools_import:
+        use_lazy_powertools_import(bundle_dir)
+    if args.precompile:
+        precompile(bundle_dir)
+    within_budget = report(bundle_dir, args.max_bundle_size_mb, args.max_bundle_import_ms)
+    return 1 if args.fail_on_budget and not within_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
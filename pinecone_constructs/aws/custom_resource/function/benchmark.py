@@ -0,0 +1,167 @@
+"""Define a query latency and throughput benchmark for a pinecone index."""
+import json
+import logging
+import math
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import boto3
+from aws_lambda_powertools.metrics import MetricUnit, single_metric
+from pydantic import BaseModel, Field
+from .pinecone_settings import BenchmarkSettings, get_benchmark_attribute_names
+from .tracing import propagate_context, tracer
+
+
+LOGGER = logging.getLogger(__name__)
+
+SKIPPED_ATTRIBUTE_VALUE = "skipped"
+
+
+class LatencyReport(BaseModel):
+    """Define the latency and throughput measured at one concurrency level."""
+
+    concurrency: int
+    num_queries: int
+    num_errors: int = 0
+    p50_ms: float = Field(default=0, description="The median query latency.")
+    p95_ms: float = Field(default=0, description="The 95th percentile query latency.")
+    p99_ms: float = Field(default=0, description="The 99th percentile query latency.")
+    qps: float = Field(default=0, description="The successful queries per second.")
+
+
+def get_percentile(sorted_values: List[float], percentile: float) -> float:
+    """Return the nearest-rank percentile of sorted values."""
+    if not sorted_values:
+        return 0
+    rank = math.ceil(percentile / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def load_query_vectors(settings: BenchmarkSettings, dimension: int, seed: int = 0) -> List[List[float]]:
+    """
+    Load the query vectors of the benchmark.
+
+    Vectors are read from the sample file when one is set, and otherwise drawn at
+    random. Each line of the sample file is either a list of floats, or an object with
+    the vector under 'values', i.e. a record in the format of a pinecone upsert.
+    """
+    if settings.sample_s3_uri is None:
+        generator = random.Random(seed)
+        return [[generator.gauss(0, 1) for _ in range(dimension)] for _ in range(settings.num_queries)]
+    bucket, _, key = settings.sample_s3_uri[len("s3://") :].partition("/")
+    body = boto3.client("s3").get_object(Bucket=bucket, Key=key)["Body"]
+    vectors = []
+    for line in body.iter_lines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        vectors.append(record["values"] if isinstance(record, dict) else record)
+    assert vectors, f"Sample '{settings.sample_s3_uri}' has no query vectors"
+    for vector in vectors:
+        assert len(vector) == dimension, f"Sample vector dimension '{len(vector)}' does not match '{dimension}'"
+    return vectors
+
+
+def _measure(concurrency: int, queries: List[Any]) -> LatencyReport:
+    """Run the queries with a number of concurrent clients, and measure their latency."""
+
+    def run_query(query: Any) -> Optional[float]:
+        start = time.perf_counter()
+        try:
+            query()
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.warning("Benchmark query failed: %s", error)
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(propagate_context(run_query), queries))
+    seconds = time.perf_counter() - start
+    latencies = sorted(latency for latency in results if latency is not None)
+    return LatencyReport(
+        concurrency=concurrency,
+        num_queries=len(queries),
+        num_errors=len(queries) - len(latencies),
+        p50_ms=get_percentile(latencies, 50),
+        p95_ms=get_percentile(latencies, 95),
+        p99_ms=get_percentile(latencies, 99),
+        qps=len(latencies) / seconds if seconds else 0,
+    )
+
+
+def run_benchmark(index: Any, vectors: List[List[float]], settings: BenchmarkSettings) -> List[LatencyReport]:
+    """
+    Measure the query latency and throughput of an index at each concurrency level.
+
+    Args:
+        index: The index to query, i.e. a pinecone.Index, or a fake with the same query method.
+        vectors: The query vectors, which are cycled through to make up the number of queries.
+        settings: The benchmark settings.
+
+    Returns:
+        The report of each concurrency level.
+
+    Raises:
+        RuntimeError: If every query at a concurrency level failed.
+
+    """
+    queries = [
+        lambda vector=vectors[i % len(vectors)]: index.query(
+            vector=vector,
+            top_k=settings.top_k,
+            namespace=settings.namespace,
+        )
+        for i in range(settings.num_queries)
+    ]
+    reports = []
+    for concurrency in settings.concurrency_levels:
+        with tracer.span("benchmark.concurrency", concurrency=concurrency):
+            report = _measure(concurrency, queries)
+        if report.num_errors == report.num_queries:
+            raise RuntimeError(f"Every benchmark query failed at concurrency {concurrency}")
+        LOGGER.info("Benchmark: %s", report.model_dump_json())
+        reports.append(report)
+    return reports
+
+
+def get_benchmark_attributes(
+    reports: List[LatencyReport],
+    concurrency_levels: Optional[List[int]] = None,
+) -> Dict[str, str]:
+    """
+    Return the reports as custom resource attributes, i.e. BenchmarkP95MsConcurrency4.
+
+    The stack outputs reference the attributes of every configured concurrency level,
+    so levels without a report, i.e. when the benchmark was skipped, are set to 'skipped'.
+    """
+    attributes = {
+        attribute_name: SKIPPED_ATTRIBUTE_VALUE
+        for concurrency in concurrency_levels or []
+        for attribute_name in get_benchmark_attribute_names(concurrency).values()
+    }
+    attributes.update(
+        {
+            attribute_name: f"{getattr(report, measure):.1f}"
+            for report in reports
+            for measure, attribute_name in get_benchmark_attribute_names(report.concurrency).items()
+        }
+    )
+    return attributes
+
+
+def publish_benchmark_metrics(namespace: str, index_name: str, reports: List[LatencyReport]) -> None:
+    """Publish the reports as CloudWatch metrics, with a dimension for the index and concurrency."""
+    for report in reports:
+        for name, unit, value in (
+            ("QueryLatencyP50", MetricUnit.Milliseconds, report.p50_ms),
+            ("QueryLatencyP95", MetricUnit.Milliseconds, report.p95_ms),
+            ("QueryLatencyP99", MetricUnit.Milliseconds, report.p99_ms),
+            ("QueriesPerSecond", MetricUnit.CountPerSecond, report.qps),
+            ("QueryErrors", MetricUnit.Count, report.num_errors),
+        ):
+            with single_metric(name=name, unit=unit, value=value, namespace=namespace) as metric:
+                metric.add_dimension(name="IndexName", value=index_name)
+                metric.add_dimension(name="Concurrency", value=str(report.concurrency))
@@ -0,0 +1,238 @@
+"""Define the lambda function for detecting drift between the synthesized and live indexes."""
+import json
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import boto3
+import pinecone
+from aws_lambda_powertools.metrics import Metrics, MetricUnit, single_metric
+from aws_lambda_powertools.utilities import parameters
+from aws_lambda_powertools.utilities.typing import LambdaContext
+from pydantic import BaseModel, Field
+from .pinecone import PineconeIndex
+from .pinecone_settings import PineconeIndexSettings
+from .pool import DynamoDBIndexPoolStore, resolve_leased_index_names
+from .settings import DriftDetectionSettings
+from .tracing import propagate_context
+
+
+LOGGER = logging.getLogger(__name__)
+
+EVENT_SOURCE = "pinecone-constructs.drift"
+EVENT_DETAIL_TYPE = "Pinecone Index Drift"
+MAX_EVENTS_PER_REQUEST = 10
+
+
+class DriftType(str, Enum):
+    """Define the kinds of drift."""
+
+    MISSING = "MISSING"
+    MODIFIED = "MODIFIED"
+    UNMANAGED = "UNMANAGED"
+
+
+class IndexDrift(BaseModel):
+    """Define the drift detected for a single index."""
+
+    index_name: str = Field(
+        ...,
+        description="The name of the drifted index.",
+    )
+    drift_type: DriftType = Field(
+        ...,
+        description="The kind of drift.",
+    )
+    environment: Optional[str] = Field(
+        default=None,
+        description="The environment of the drifted index.",
+    )
+    differences: Dict[str, Dict[str, Any]] = Field(
+        default_factory=dict,
+        description="The expected and actual value of each drifted property.",
+    )
+
+
+def get_expected_properties(index_settings: PineconeIndexSettings) -> Dict[str, Any]:
+    """Return the index properties that are compared against the live index."""
+    return {
+        "pods": index_settings.pods,
+        "replicas": index_settings.replicas,
+        "pod_type": PineconeIndex.get_pod_type(index_settings),
+        "metric": index_settings.metric,
+    }
+
+
+def load_expected_indexes(s3_uri: Optional[str]) -> List[PineconeIndexSettings]:
+    """Load the synthesized settings of the managed indexes from the JSON file the construct uploaded."""
+    if s3_uri is None:
+        return []
+    bucket, _, key = s3_uri[len("s3://") :].partition("/")
+    body = boto3.client("s3").get_object(Bucket=bucket, Key=key)["Body"]
+    return [PineconeIndexSettings.model_validate(index_settings) for index_settings in json.loads(body.read())]
+
+
+def detect_drift(
+    expected_indexes: List[PineconeIndexSettings],
+    live_indexes: Dict[str, Any],
+    managed_index_prefixes: Iterable[str],
+) -> List[IndexDrift]:
+    """
+    Compare the expected indexes against the live indexes.
+
+    Args:
+        expected_indexes: The synthesized settings of the managed indexes.
+        live_indexes: The live index descriptions, keyed by index name.
+        managed_index_prefixes: Prefixes of index names managed by the construct.
+
+    Returns:
+        The drift detected for each index. Indexes without drift are omitted.
+
+    """
+    drifts: List[IndexDrift] = []
+    expected_names = set()
+    for index_settings in expected_indexes:
+        expected_names.add(index_settings.name)
+        description = live_indexes.get(index_settings.name)
+        if description is None:
+            drifts.append(IndexDrift(index_name=index_settings.name, drift_type=DriftType.MISSING))
+            continue
+        differences = {
+            key: {"expected": value, "actual": getattr(description, key)}
+            for key, value in get_expected_properties(index_settings).items()
+            if getattr(description, key) != value
+        }
+        if differences:
+            drifts.append(
+                IndexDrift(
+                    index_name=index_settings.name,
+                    drift_type=DriftType.MODIFIED,
+                    differences=differences,
+                )
+            )
+    prefixes = tuple(managed_index_prefixes)
+    for index_name in sorted(set(live_indexes) - expected_names):
+        if prefixes and index_name.startswith(prefixes):
+            drifts.append(IndexDrift(index_name=index_name, drift_type=DriftType.UNMANAGED))
+    return drifts
+
+
+def describe_managed_indexes(
+    index_names: Iterable[str],
+    managed_index_prefixes: Iterable[str],
+    max_concurrent_requests: int,
+) -> Dict[str, Any]:
+    """
+    Describe every managed index in the current pinecone environment.
+
+    The indexes are listed once, and each managed index is described once.
+
+    Args:
+        index_names: The names of the indexes that are expected to exist.
+        managed_index_prefixes: Prefixes of index names managed by the construct.
+        max_concurrent_requests: The maximum number of concurrent describe requests.
+
+    Returns:
+        The index descriptions, keyed by index name.
+
+    """
+    prefixes = tuple(managed_index_prefixes)
+    expected_names = set(index_names)
+    managed_names = [
+        name
+        for name in pinecone.list_indexes()
+        if name in expected_names or (prefixes and name.startswith(prefixes))
+    ]
+    if not managed_names:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_concurrent_requests) as executor:
+        descriptions = executor.map(propagate_context(pinecone.describe_index), managed_names)
+        return dict(zip(managed_names, descriptions))
+
+
+def publish_metrics(namespace: str, drifts: List[IndexDrift], expected_indexes: List[PineconeIndexSettings]) -> None:
+    """Publish a drift metric for every index, and a count of drifted and unmanaged indexes."""
+    drifted_indexes = {(drift.index_name, drift.environment) for drift in drifts}
+    num_drifted = 0
+    for index_settings in expected_indexes:
+        drifted = 1 if (index_settings.name, index_settings.environment) in drifted_indexes else 0
+        num_drifted += drifted
+        with single_metric(
+            name="IndexDrift",
+            unit=MetricUnit.Count,
+            value=drifted,
+            namespace=namespace,
+        ) as metric:
+            metric.add_dimension(name="IndexName", value=index_settings.name)
+            metric.add_dimension(name="Environment", value=index_settings.environment)
+    metrics = Metrics(namespace=namespace)
+    metrics.add_metric(name="DriftedIndexes", unit=MetricUnit.Count, value=num_drifted)
+    unmanaged = sum(1 for drift in drifts if drift.drift_type == DriftType.UNMANAGED)
+    metrics.add_metric(name="UnmanagedIndexes", unit=MetricUnit.Count, value=unmanaged)
+    metrics.flush_metrics()
+
+
+def publish_events(event_bus_name: str, drifts: List[IndexDrift]) -> None:
+    """Publish an EventBridge event for every drifted index."""
+    if not drifts:
+        return
+    client = boto3.client("events")
+    entries = [
+        {
+            "Source": EVENT_SOURCE,
+            "DetailType": EVENT_DETAIL_TYPE,
+            "Detail": drift.model_dump_json(),
+            "EventBusName": event_bus_name,
+        }
+        for drift in drifts
+    ]
+    for start in range(0, len(entries), MAX_EVENTS_PER_REQUEST):
+        response = client.put_events(Entries=entries[start : start + MAX_EVENTS_PER_REQUEST])
+        if response.get("FailedEntryCount"):
+            LOGGER.error("Failed to publish %s drift events.", response["FailedEntryCount"])
+
+
+def _group_by_project(
+    expected_indexes: List[PineconeIndexSettings],
+) -> Dict[Tuple[str, str], List[PineconeIndexSettings]]:
+    """Group the indexes by the api key and environment needed to reach them."""
+    groups: Dict[Tuple[str, str], List[PineconeIndexSettings]] = defaultdict(list)
+    for index_settings in expected_indexes:
+        groups[(index_settings.api_key_secret_name, index_settings.environment)].append(index_settings)
+    return groups
+
+
+def lambda_handler(_: dict, __: LambdaContext) -> Dict[str, Any]:
+    """Detect drift for every managed index and publish the results."""
+    settings = DriftDetectionSettings()  # type: ignore
+    drifts: List[IndexDrift] = []
+    environment_settings = [
+        environment_settings
+        for index_settings in load_expected_indexes(settings.expected_indexes_s3_uri)
+        for environment_settings in index_settings.get_environment_settings()
+    ]
+    if settings.index_pool_table_name:
+        environment_settings = resolve_leased_index_names(
+            environment_settings,
+            DynamoDBIndexPoolStore(settings.index_pool_table_name),
+        )
+    for (secret_name, environment), expected_indexes in _group_by_project(environment_settings).items():
+        key = parameters.get_secret(secret_name, max_age=30)
+        assert isinstance(key, str), f"api_key of type '{type(key)}' returned from " \
+            "secrets manager is not a string"
+        pinecone.init(api_key=key, environment=environment)
+        live_indexes = describe_managed_indexes(
+            [index_settings.name for index_settings in expected_indexes],
+            settings.managed_index_prefixes,
+            settings.max_concurrent_requests,
+        )
+        for drift in detect_drift(expected_indexes, live_indexes, settings.managed_index_prefixes):
+            drift.environment = environment
+            drifts.append(drift)
+    for drift in drifts:
+        LOGGER.warning("Detected drift: %s", drift.model_dump_json())
+    publish_metrics(settings.metrics_namespace, drifts, environment_settings)
+    publish_events(settings.event_bus_name, drifts)
+    return {"drifts": [drift.model_dump(mode="json") for drift in drifts]}
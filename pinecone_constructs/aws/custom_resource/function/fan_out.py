@@ -0,0 +1,144 @@
+"""Define CUD operations for a pinecone index with copies in several environments."""
+import logging
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+from typing import Dict, List, Optional
+
+import pinecone
+from pydantic import BaseModel
+from .settings import Settings
+from .pinecone_settings import PineconeIndexSettings, get_environment_attribute_name
+from .pinecone import PineconeIndex
+from .benchmark import LatencyReport
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class EnvironmentResult(BaseModel):
+    """Define the result of an operation on the index in one environment."""
+
+    environment: str
+    index_name: str
+    host: Optional[str] = None
+    error: Optional[str] = None
+
+
+def _run_operation(
+    settings: Settings,
+    index_settings: PineconeIndexSettings,
+    operation: str,
+    connection: Connection,
+) -> None:
+    """Run an operation on the index in one environment, sending the result through the connection."""
+    result = EnvironmentResult(environment=index_settings.environment, index_name=index_settings.name)
+    try:
+        index = PineconeIndex(settings=settings, index_settings=index_settings)
+        if operation == "update" and index.name not in pinecone.list_indexes():
+            LOGGER.info("Index '%s' does not exist in '%s'. Creating it.", index.name, index_settings.environment)
+            operation = "create"
+        getattr(index, operation)()
+        if operation != "delete":
+            result.host = index.host
+    except Exception as error:  # pylint: disable=broad-except
+        LOGGER.exception(error)
+        result.error = f"{type(error).__name__}: {error}"
+    connection.send(result)
+    connection.close()
+
+
+class FanOutPineconeIndex:
+    """
+    Define CUD operations for a pinecone index with copies in several environments.
+
+    The pinecone client keeps its configuration in module level state, so each
+    environment is handled in its own process, which lets the environments be
+    provisioned concurrently.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        index_settings: PineconeIndexSettings,
+        old_index_settings: Optional[PineconeIndexSettings] = None,
+    ) -> None:
+        """
+        Initialize the index.
+
+        Args:
+            settings: The runtime settings.
+            index_settings: The settings of the index.
+            old_index_settings: The settings of the index before an update. Copies in
+                environments that were removed from the settings are deleted.
+
+        """
+        self._settings = settings
+        self._index_settings = index_settings
+        self._old_index_settings = old_index_settings
+        self.data: Dict[str, str] = {}
+
+    @property
+    def name(self) -> str:
+        """Return the name of the index."""
+        return self._index_settings.name
+
+    def create(self) -> None:
+        """Create the index in every environment."""
+        self._run({"create": self._index_settings.get_environment_settings()})
+
+    def update(self) -> None:
+        """Update the index in every environment, creating or deleting copies in added or removed environments."""
+        environment_settings = self._index_settings.get_environment_settings()
+        environments = {settings.environment for settings in environment_settings}
+        removed = []
+        if self._old_index_settings:
+            removed = [
+                settings
+                for settings in self._old_index_settings.get_environment_settings()
+                if settings.environment not in environments
+            ]
+        self._run({"update": environment_settings, "delete": removed})
+
+    def delete(self) -> None:
+        """Delete the index in every environment."""
+        self._run({"delete": self._index_settings.get_environment_settings()})
+
+    def benchmark(self) -> List[LatencyReport]:
+        """Run the query benchmark against the copy of the index in its own environment."""
+        if self._index_settings.benchmark is None:
+            return []
+        primary_settings = self._index_settings.get_environment_settings()[0]
+        return PineconeIndex(settings=self._settings, index_settings=primary_settings).benchmark()
+
+    def _run(self, operations: Dict[str, List[PineconeIndexSettings]]) -> None:
+        """Run the operations concurrently, raising if any environment failed."""
+        processes = []
+        for operation, environment_settings in operations.items():
+            for index_settings in environment_settings:
+                parent_connection, child_connection = Pipe(duplex=False)
+                process = Process(
+                    target=_run_operation,
+                    args=(self._settings, index_settings, operation, child_connection),
+                )
+                process.start()
+                child_connection.close()
+                processes.append((index_settings, process, parent_connection))
+        results = []
+        for index_settings, process, connection in processes:
+            try:
+                result = connection.recv()
+            except EOFError:
+                result = EnvironmentResult(
+                    environment=index_settings.environment,
+                    index_name=index_settings.name,
+                    error="The process exited without a result.",
+                )
+            process.join()
+            results.append(result)
+        for result in results:
+            if result.host:
+                self.data[get_environment_attribute_name("IndexName", result.environment)] = result.index_name
+                self.data[get_environment_attribute_name("Host", result.environment)] = result.host
+        errors = [f"'{result.environment}': {result.error}" for result in results if result.error]
+        if errors:
+            raise RuntimeError(f"Failed to run operation on index '{self.name}' in " + "; ".join(errors))
@@ -8,6 +8,12 @@ from aws_lambda_powertools.utilities.typing import LambdaContext
 from .pinecone_settings import PineconeIndexSettings
 from .settings import Settings
 from .pinecone import PineconeIndex
+from .fan_out import FanOutPineconeIndex
+from .namespace import NamespacedPineconeIndex
+from .ledger import OperationLedger, get_ledger_store
+from .benchmark import get_benchmark_attributes, publish_benchmark_metrics
+from .tracing import XRaySpanExporter, tracer
+from .pool import get_index_pool
 
 LOGGER = logging.getLogger(__name__)
 
@@ -21,55 +27,121 @@ helper = CfnResource(
 SETTINGS: Union[Settings, None] = None
 try:
     SETTINGS = Settings()  # type: ignore
+    if SETTINGS.tracing_enabled:
+        tracer.configure(XRaySpanExporter())
 except Exception as error:  # pylint: disable=broad-except
     helper.init_failure(error)
 
 
 @helper.create
-def create(_: Dict[str, Any], context: LambdaContext) -> Union[bool, str, None]:
+def create(event: Dict[str, Any], context: LambdaContext) -> Union[bool, str, None]:
     """Create the Pinecone database."""
-    index: PineconeIndex = context.index # type: ignore
+    index: Union[PineconeIndex, FanOutPineconeIndex, NamespacedPineconeIndex] = context.index # type: ignore
+    ledger: OperationLedger = context.ledger # type: ignore
     LOGGER.info("Creating Pinecone index '%s'", index.name)
-    index.create()
-    return index.name
+
+    def _create() -> str:
+        index.create()
+        _add_attributes(index)
+        _benchmark(index, event)
+        return index.name
+
+    return ledger.run_once(event, index.name, _create, helper.Data)
 
 
 @helper.update
 def update(event: Dict[str, Any], context: LambdaContext) -> Union[bool, str, None]:
     """Update the Pinecone database."""
     assert SETTINGS is not None, "SETTINGS is None"
-    index: PineconeIndex = context.index # type: ignore
+    index: Union[PineconeIndex, FanOutPineconeIndex, NamespacedPineconeIndex] = context.index # type: ignore
     resource_id = event.get("PhysicalResourceId")
-    assert (
+    # a namespace can move to another namespace or shared index, which replaces it
+    assert isinstance(index, NamespacedPineconeIndex) or (
         index.name == resource_id
     ), f"PhysicalResourceId '{resource_id}' does not match index name '{index.name}'"
+    ledger: OperationLedger = context.ledger # type: ignore
     LOGGER.info("Updating Pinecone index '%s'", index.name)
-    index.update()
+
+    def _update() -> str:
+        index.update()
+        _add_attributes(index)
+        _benchmark(index, event)
+        return index.name
+
+    return ledger.run_once(event, index.name, _update, helper.Data)
 
 
 @helper.delete
 def delete(event: Dict[str, Any], context: LambdaContext) -> Union[bool, str, None]:
     """Delete the Pinecone database."""
     assert SETTINGS is not None, "SETTINGS is None"
-    index: PineconeIndex = context.index # type: ignore
+    index: Union[PineconeIndex, FanOutPineconeIndex, NamespacedPineconeIndex] = context.index # type: ignore
     resource_id = event.get("PhysicalResourceId")
     assert (
         index.name == resource_id
     ), f"PhysicalResourceId '{resource_id}' does not match index name '{index.name}'"
+    ledger: OperationLedger = context.ledger # type: ignore
     LOGGER.info("Deleting Pinecone index '%s'", index.name)
-    index.delete()
+    ledger.run_once(event, index.name, index.delete)
+
+
+def _add_attributes(index: Union[PineconeIndex, FanOutPineconeIndex, NamespacedPineconeIndex]) -> None:
+    """Publish where clients find the index, i.e. its hosts or its namespace, as custom resource attributes."""
+    if isinstance(index, (FanOutPineconeIndex, NamespacedPineconeIndex)):
+        helper.Data.update(index.data)
+
+
+def _benchmark(
+    index: Union[PineconeIndex, FanOutPineconeIndex, NamespacedPineconeIndex],
+    event: Dict[str, Any],
+) -> None:
+    """Benchmark the index, publishing the results as custom resource attributes and metrics."""
+    assert SETTINGS is not None, "SETTINGS is None"
+    benchmark_settings = PineconeIndexSettings.model_validate(event["ResourceProperties"]).benchmark
+    if benchmark_settings is None:
+        return
+    reports = index.benchmark()
+    helper.Data.update(get_benchmark_attributes(reports, benchmark_settings.concurrency_levels))
+    if reports:
+        with tracer.span("publish_benchmark_metrics"):
+            publish_benchmark_metrics(SETTINGS.metrics_namespace, index.name, reports)
 
 
 def lambda_handler(event: dict, context: LambdaContext):
     """Handle the lambda event."""
     assert SETTINGS is not None, "SETTINGS is None"
-    index_settings = PineconeIndexSettings.model_validate(event["ResourceProperties"])
-    context.index = PineconeIndex(  # type: ignore
-        settings=SETTINGS,
-        index_settings=index_settings,
-    )
-    helper(event, context)
+    with tracer.start_trace(event["RequestId"], f"custom_resource.{event['RequestType'].lower()}") as span:
+        index_settings = PineconeIndexSettings.model_validate(event["ResourceProperties"])
+        span.set_attribute("index_name", index_settings.name)
+        pool = get_index_pool(SETTINGS)
+        physical_resource_id = event.get("PhysicalResourceId")
+        if pool is not None and physical_resource_id and pool.is_pool_index(physical_resource_id):
+            # the index was leased from the pool, so it has the name of the pool index
+            index_settings.name = physical_resource_id
+        old_properties = event.get("OldResourceProperties")
+        old_index_settings = PineconeIndexSettings.model_validate(old_properties) if old_properties else None
+        if index_settings.namespace is not None:
+            context.index = NamespacedPineconeIndex(  # type: ignore
+                settings=SETTINGS,
+                index_settings=index_settings,
+            )
+        elif index_settings.additional_environments or (
+            old_index_settings and old_index_settings.additional_environments
+        ):
+            context.index = FanOutPineconeIndex(  # type: ignore
+                settings=SETTINGS,
+                index_settings=index_settings,
+                old_index_settings=old_index_settings,
+            )
+        else:
+            context.index = PineconeIndex(  # type: ignore
+                settings=SETTINGS,
+                index_settings=index_settings,
+                pool=pool,
+            )
+        context.ledger = OperationLedger(get_ledger_store(SETTINGS))  # type: ignore
+        helper(event, context)
     if helper.Status == FAILED:
         raise RuntimeError(f"Failed to create custom resource: {helper.Reason}")
     LOGGER.debug("Returning PhysicalResourceId '%s'", helper.PhysicalResourceId)
-    return {"PhysicalResourceId": helper.PhysicalResourceId}
+    return {"PhysicalResourceId": helper.PhysicalResourceId, "Data": helper.Data}
@@ -0,0 +1,174 @@
+"""Define a ledger of completed custom resource operations."""
+import time
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional
+
+import boto3
+from pydantic import BaseModel, Field
+from .settings import Settings
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class OperationRecord(BaseModel):
+    """Define a completed operation."""
+
+    key: str = Field(
+        ...,
+        description="The idempotency key, built from the request id and the index name.",
+    )
+    operation: str = Field(
+        ...,
+        description="The CRUD operation that was run.",
+    )
+    index_name: str = Field(
+        ...,
+        description="The name of the index the operation was run against.",
+    )
+    result: Optional[str] = Field(
+        default=None,
+        description="The value returned by the operation, i.e. the physical resource id.",
+    )
+    data: Dict[str, str] = Field(
+        default_factory=dict,
+        description="The custom resource attributes set by the operation.",
+    )
+    completed_at: int = Field(
+        default_factory=lambda: int(time.time()),
+        description="Unix timestamp of when the operation completed.",
+    )
+
+
+class LedgerStore(ABC):
+    """Define an interface for persisting operation records."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[OperationRecord]:
+        """Return the record for the key, if one exists."""
+
+    @abstractmethod
+    def put(self, record: OperationRecord) -> None:
+        """Persist the record."""
+
+
+class InMemoryLedgerStore(LedgerStore):
+    """
+    Store operation records in memory.
+
+    Records only survive for the lifetime of the lambda container, so this only
+    protects against replays that land on a warm container.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the store."""
+        self._records: Dict[str, OperationRecord] = {}
+
+    def get(self, key: str) -> Optional[OperationRecord]:
+        """Return the record for the key, if one exists."""
+        return self._records.get(key)
+
+    def put(self, record: OperationRecord) -> None:
+        """Persist the record."""
+        self._records[record.key] = record
+
+
+class DynamoDBLedgerStore(LedgerStore):
+    """Store operation records in a DynamoDB table."""
+
+    def __init__(self, table_name: str, ttl_seconds: int) -> None:
+        """Initialize the store."""
+        self._table = boto3.resource("dynamodb").Table(table_name)
+        self._ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[OperationRecord]:
+        """Return the record for the key, if one exists."""
+        item = self._table.get_item(Key={"key": key}, ConsistentRead=True).get("Item")
+        if item is None:
+            return None
+        return OperationRecord.model_validate(item)
+
+    def put(self, record: OperationRecord) -> None:
+        """Persist the record."""
+        item = record.model_dump(exclude_none=True)
+        item["expires_at"] = record.completed_at + self._ttl_seconds
+        self._table.put_item(Item=item)
+
+
+_IN_MEMORY_STORE = InMemoryLedgerStore()
+
+
+def get_ledger_store(settings: Settings) -> LedgerStore:
+    """Return the ledger store configured in the runtime settings."""
+    if settings.operation_ledger_table_name:
+        return DynamoDBLedgerStore(
+            table_name=settings.operation_ledger_table_name,
+            ttl_seconds=settings.operation_ledger_ttl_seconds,
+        )
+    return _IN_MEMORY_STORE
+
+
+class OperationLedger:
+    """
+    Run custom resource operations at most once per CloudFormation request.
+
+    CloudFormation resends the same event (with the same RequestId) when the
+    provider times out. Completed operations are recorded against the RequestId
+    and index name so that a replayed event returns the recorded result instead
+    of running the operation again.
+    """
+
+    def __init__(self, store: LedgerStore) -> None:
+        """Initialize the ledger."""
+        self._store = store
+
+    @staticmethod
+    def get_key(request_id: str, index_name: str) -> str:
+        """Return the idempotency key for a request and index."""
+        return f"{request_id}#{index_name}"
+
+    def run_once(
+        self,
+        event: Dict[str, Any],
+        index_name: str,
+        operation: Callable[[], Optional[str]],
+        data: Optional[Dict[str, str]] = None,
+    ) -> Optional[str]:
+        """
+        Run the operation unless it already completed for this request.
+
+        Args:
+            event: The CloudFormation custom resource event.
+            index_name: The name of the index the operation targets.
+            operation: The operation to run.
+            data: The custom resource attributes. The attributes set by the operation
+                are recorded with it, and restored on a replay.
+
+        Returns:
+            The result of the operation, or the recorded result on a replay.
+
+        """
+        key = self.get_key(event["RequestId"], index_name)
+        record = self._store.get(key)
+        if record is not None:
+            LOGGER.info(
+                "Operation '%s' on index '%s' already completed for request '%s'. Returning recorded result.",
+                record.operation,
+                index_name,
+                event["RequestId"],
+            )
+            if data is not None:
+                data.update(record.data)
+            return record.result
+        result = operation()
+        self._store.put(
+            OperationRecord(
+                key=key,
+                operation=event["RequestType"],
+                index_name=index_name,
+                result=result,
+                data=dict(data or {}),
+            )
+        )
+        return result
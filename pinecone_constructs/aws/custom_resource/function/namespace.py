@@ -0,0 +1,124 @@
+"""Define CUD operations for a namespace of a shared pinecone index."""
+import logging
+from typing import Dict, List
+
+import pinecone
+from .settings import Settings
+from .pinecone_settings import PineconeIndexSettings, RemovalPolicy
+from .pinecone import IndexSettingsMismatchError, PineconeIndex
+from .benchmark import LatencyReport
+from .tracing import tracer
+
+
+LOGGER = logging.getLogger(__name__)
+
+NAMESPACE_SEPARATOR = "/"
+
+
+def get_namespace_resource_id(index_name: str, namespace: str) -> str:
+    """Return the physical resource id of a namespace, i.e. 'shared-384-cosine/tenant-a'."""
+    return f"{index_name}{NAMESPACE_SEPARATOR}{namespace}"
+
+
+class NamespacedPineconeIndex:
+    """
+    Define CUD operations for a logical index stored in a namespace of a shared index.
+
+    Pinecone creates a namespace on the first upsert to it, so creating or updating a
+    namespace only checks that the shared index can hold its vectors. The shared index
+    is managed by a custom resource of its own, which its namespaces depend on.
+    """
+
+    def __init__(self, settings: Settings, index_settings: PineconeIndexSettings) -> None:
+        """
+        Initialize the namespace.
+
+        Args:
+            settings: The runtime settings.
+            index_settings: The settings of the logical index, with the name of the shared
+                index and the namespace.
+
+        """
+        assert index_settings.namespace, f"Index '{index_settings.name}' is not a namespace"
+        self._index_settings = index_settings
+        self._index = PineconeIndex(settings=settings, index_settings=index_settings)
+        self.data: Dict[str, str] = {}
+
+    @property
+    def name(self) -> str:
+        """Return the physical resource id of the namespace."""
+        return get_namespace_resource_id(self.index_name, self.namespace)
+
+    @property
+    def index_name(self) -> str:
+        """Return the name of the shared index."""
+        return self._index_settings.name
+
+    @property
+    def namespace(self) -> str:
+        """Return the namespace."""
+        assert self._index_settings.namespace is not None, "namespace is None"
+        return self._index_settings.namespace
+
+    def create(self) -> None:
+        """Check that the shared index can hold the namespace, and publish where to find it."""
+        self._validate_shared_index()
+        self.data.update({"IndexName": self.index_name, "Namespace": self.namespace, "Host": self._index.host})
+
+    def update(self) -> None:
+        """
+        Check the shared index again, i.e. after it was resized.
+
+        A namespace that moved to another namespace or shared index has a new physical
+        resource id, so CloudFormation deletes the old namespace after the update.
+        """
+        self.create()
+
+    def delete(self) -> None:
+        """Delete every vector in the namespace, unless the removal policy retains them."""
+        removal_policy = self._index_settings.removal_policy
+        if removal_policy in (RemovalPolicy.RETAIN.value, RemovalPolicy.SNAPSHOT.value):
+            LOGGER.info("Skipping deletion of namespace '%s' because the removal policy is %s.", self.name, removal_policy)
+            return
+        with tracer.span("pinecone.list_indexes"):
+            index_names = pinecone.list_indexes()
+        if self.index_name not in index_names:
+            LOGGER.info("Shared index '%s' no longer exists. Nothing to delete.", self.index_name)
+            return
+        index = pinecone.Index(self.index_name)
+        with tracer.span("pinecone.describe_index_stats", index_name=self.index_name):
+            namespaces = index.describe_index_stats()["namespaces"]
+        vector_count = namespaces[self.namespace]["vector_count"] if self.namespace in namespaces else 0
+        if vector_count == 0:
+            LOGGER.info("Namespace '%s' is empty. Nothing to delete.", self.name)
+            return
+        if removal_policy == RemovalPolicy.RETAIN_ON_UPDATE_OR_DELETE.value:
+            LOGGER.info("Skipping deletion of namespace '%s' because it is not empty.", self.name)
+            return
+        LOGGER.info("Deleting %s vectors from namespace '%s'.", vector_count, self.name)
+        self._index.run_operation_with_retry(index.delete, delete_all=True, namespace=self.namespace)
+
+    def benchmark(self) -> List[LatencyReport]:
+        """Return no reports, because namespaces are not benchmarked."""
+        return []
+
+    def _validate_shared_index(self) -> None:
+        """
+        Check that the vectors of the namespace fit the shared index.
+
+        Raises:
+            IndexSettingsMismatchError: If the shared index has a different dimension or metric.
+
+        """
+        settings = self._index_settings
+        with tracer.span("pinecone.describe_index", index_name=self.index_name):
+            description = pinecone.describe_index(self.index_name)
+        mismatches = [
+            f"{key}: expected '{value}', found '{getattr(description, key)}'"
+            for key, value in {"dimension": settings.dimension, "metric": settings.metric}.items()
+            if getattr(description, key) != value
+        ]
+        if mismatches:
+            raise IndexSettingsMismatchError(
+                f"Namespace '{self.namespace}' does not fit shared index '{self.index_name}'. " + "; ".join(mismatches)
+            )
@@ -1,17 +1,25 @@
 """Define CUD operations for a pinecone index."""
 import copy
-from typing import Callable
+from typing import Callable, List, Optional
 import time
 import logging
 import pinecone
 from aws_lambda_powertools.utilities import parameters
 from .settings import Settings
 from .pinecone_settings import PineconeIndexSettings, RemovalPolicy
+from .validation import get_update_validation_errors
+from .benchmark import LatencyReport, load_query_vectors, run_benchmark
+from .tracing import tracer
+from .pool import IndexPool
 
 
 LOGGER = logging.getLogger(__name__)
 
 
+class IndexSettingsMismatchError(Exception):
+    """Raised when an existing index does not match the requested settings."""
+
+
 class PineconeIndex:
     """Define CUD operations for a pinecone index."""
 
@@ -19,45 +27,114 @@ class PineconeIndex:
         self,
         settings: Settings,
         index_settings: PineconeIndexSettings,
+        pool: Optional[IndexPool] = None,
     ) -> None:
-        """Initialize the index."""
+        """
+        Initialize the index.
+
+        Args:
+            settings: The runtime settings.
+            index_settings: The settings of the index.
+            pool: If set, the index is leased from this pool when it is created, and
+                returned to it when it is deleted.
+
+        """
         self._index_settings = copy.deepcopy(index_settings)
         self._settings = copy.deepcopy(settings)
-        key = parameters.get_secret(
-            index_settings.api_key_secret_name,
-            max_age=30,
-        )
+        self._pool = pool
+        with tracer.span("secretsmanager.get_secret"):
+            key = parameters.get_secret(
+                index_settings.api_key_secret_name,
+                max_age=30,
+            )
         assert isinstance(key, str), f"api_key of type '{type(key)}' returned from " \
             "secrets manager is not a string"
-        pinecone.init(
-            api_key=key,
-            environment=index_settings.environment,
-        )
+        with tracer.span("pinecone.init", environment=index_settings.environment):
+            pinecone.init(
+                api_key=key,
+                environment=index_settings.environment,
+            )
 
     @property
     def name(self) -> str:
         """Return the name of the index."""
         return self._index_settings.name
 
+    @property
+    def host(self) -> str:
+        """Return the host that clients query the index on."""
+        environment = self._index_settings.environment
+        return f"{self.name}-{pinecone.Config.PROJECT_NAME}.svc.{environment}.pinecone.io"
+
     @staticmethod
     def get_pod_type(index_settings: PineconeIndexSettings) -> str:
         """Pod type is in the format s1.x1, so we need to split and get the first prefix (Example: s1)."""
         return f"{index_settings.pod_instance_type}.{index_settings.pod_size}"
 
     def create(self) -> None:
-        """Create a pinecone index."""
+        """Create a pinecone index, or lease one from the pool, which changes the name of the index."""
+        if self._pool is not None and self._pool.can_lease(self._index_settings):
+            with tracer.span("lease_index", index_name=self.name):
+                leased_index_name = self._pool.lease(self._index_settings)
+            if leased_index_name is not None:
+                self._index_settings.name = leased_index_name
+                return
+        self.run_operation_with_retry(self._create_index_if_missing)
+
+    def _create_index_if_missing(self) -> None:
+        """
+        Create the index unless a matching index already exists.
+
+        This is checked on every attempt so that a replayed event, or a retry after
+        an attempt that created the index but failed while waiting for it, is a no-op.
+        """
         settings = self._index_settings
-        self.run_operation_with_retry(
-            pinecone.create_index,
-            name=settings.name,
-            dimension=settings.dimension,
-            metric=settings.metric,
-            pods=settings.pods,
-            replicas=settings.replicas,
-            pod_type=self.get_pod_type(settings),
-            metadata_config=settings.metadata_config,
-            source_collection=settings.source_collection,
-        )
+        if self._index_exists():
+            LOGGER.info("Index '%s' already exists with matching settings. Skipping creation.", settings.name)
+            return
+        with tracer.span("pinecone.create_index", index_name=settings.name):
+            pinecone.create_index(
+                name=settings.name,
+                dimension=settings.dimension,
+                metric=settings.metric,
+                pods=settings.pods,
+                replicas=settings.replicas,
+                pod_type=self.get_pod_type(settings),
+                metadata_config=settings.metadata_config,
+                source_collection=settings.source_collection,
+            )
+
+    def _index_exists(self) -> bool:
+        """
+        Return whether the index already exists.
+
+        Raises:
+            IndexSettingsMismatchError: If the index exists, but with settings that
+                cannot be reconciled by an update.
+
+        """
+        settings = self._index_settings
+        with tracer.span("pinecone.list_indexes"):
+            index_names = pinecone.list_indexes()
+        if settings.name not in index_names:
+            return False
+        with tracer.span("pinecone.describe_index", index_name=settings.name):
+            description = pinecone.describe_index(settings.name)
+        expected = {
+            "dimension": settings.dimension,
+            "metric": settings.metric,
+            "pod_type": self.get_pod_type(settings),
+        }
+        mismatches = [
+            f"{key}: expected '{value}', found '{getattr(description, key)}'"
+            for key, value in expected.items()
+            if getattr(description, key) != value
+        ]
+        if mismatches:
+            raise IndexSettingsMismatchError(
+                f"Index '{settings.name}' already exists with different settings. " + "; ".join(mismatches)
+            )
+        return True
 
     def update(self) -> None:
         """Update the pinecone index."""
@@ -71,28 +148,79 @@ class PineconeIndex:
         )
 
     def delete(self) -> None:
-        """Delete the pinecone index."""
-        if self._can_delete_index():
+        """Delete the pinecone index, or return it to the pool it was leased from."""
+        if self._pool is not None and self._pool.is_pool_index(self.name):
+            with tracer.span("release_index", index_name=self.name):
+                self._pool.release(
+                    self.name,
+                    self._index_settings.environment,
+                    self._index_settings.api_key_secret_name,
+                )
+            return
+        with tracer.span("can_delete_index", index_name=self._index_settings.name):
+            can_delete_index = self._can_delete_index()
+        if can_delete_index:
             self.run_operation_with_retry(
                 pinecone.delete_index,
                 name=self._index_settings.name,
             )
 
+    def benchmark(self) -> List[LatencyReport]:
+        """
+        Run the query benchmark of the index once it is ready, if one is configured.
+
+        The benchmark is best effort, since it runs in the same request as the create or
+        update it measures. If the index is not ready in time, or the benchmark fails,
+        the error is logged and no reports are returned, so the request still succeeds.
+        """
+        benchmark_settings = self._index_settings.benchmark
+        if benchmark_settings is None:
+            return []
+        try:
+            with tracer.span("wait_until_ready", index_name=self.name):
+                is_ready = self._wait_until_ready(benchmark_settings.max_wait_seconds)
+            if not is_ready:
+                LOGGER.warning("Index '%s' is not ready. Skipping the benchmark.", self.name)
+                return []
+            vectors = load_query_vectors(benchmark_settings, self._index_settings.dimension)
+            with tracer.span("benchmark", index_name=self.name):
+                return run_benchmark(pinecone.Index(self.name), vectors, benchmark_settings)
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.exception("Benchmark of index '%s' failed. Skipping it: %s", self.name, error)
+            return []
+
+    def _wait_until_ready(self, max_wait_seconds: int) -> bool:
+        """Wait for the index to be ready, i.e. for a pod type change to finish, returning whether it is."""
+        deadline = time.monotonic() + max_wait_seconds
+        while True:
+            state = pinecone.describe_index(self.name).status.get("state")
+            if state == "Ready":
+                return True
+            if time.monotonic() >= deadline:
+                LOGGER.warning("Index '%s' is still '%s' after %s seconds.", self.name, state, max_wait_seconds)
+                return False
+            time.sleep(5)
+
     def run_operation_with_retry(self, operation: Callable, *args, **kwargs) -> None:
         """Run an operation with retries."""
         num_attempts = self._settings.num_attempts_to_run_operation
         delay_between_attempts = 5
         for attempt in range(num_attempts):
             try:
-                operation(*args, **kwargs)
+                with tracer.span("attempt", operation=operation.__name__, attempt=attempt + 1):
+                    operation(*args, **kwargs)
                 return
+            except IndexSettingsMismatchError:
+                # retrying will not change the settings of an existing index
+                raise
             except Exception as error:  # pylint: disable=broad-except
                 LOGGER.error(error)
                 LOGGER.info("Attempt %s of %s failed.", attempt + 1, num_attempts)
                 if attempt + 1 == num_attempts:
                     raise RuntimeError(f"Failed to run operation: {operation.__name__}") from error
                 LOGGER.info("Retrying in %s seconds...", delay_between_attempts)
-                time.sleep(delay_between_attempts)
+                with tracer.span("retry_sleep", seconds=delay_between_attempts):
+                    time.sleep(delay_between_attempts)
 
     def _can_delete_index(self) -> bool:
         """Validate that the index can be deleted."""
@@ -100,7 +228,8 @@ class PineconeIndex:
         removal_policy = self._index_settings.removal_policy
         try:
             index = pinecone.Index(index_name)
-            stats = index.describe_index_stats()
+            with tracer.span("pinecone.describe_index_stats", index_name=index_name):
+                stats = index.describe_index_stats()
         except Exception as error:  # pylint: disable=broad-except
             msg = f"Failed to get index stats for index '{index_name}'. Error: {error}"
             raise RuntimeError(msg) from error
@@ -118,6 +247,7 @@ class PineconeIndex:
         LOGGER.info("Index '%s' can be deleted.", index_name)
         return True
 
+    @tracer.traced("create_snapshot")
     def _create_snapshot(self, index_name: str) -> None:
         self.run_operation_with_retry(
             pinecone.create_collection,
@@ -127,13 +257,7 @@ class PineconeIndex:
 
     def _validate_update_operation(self) -> None:
         index_settings = self._index_settings
-        pod_type = pinecone.describe_index(index_settings.name).pod_type
-        current_pod_instance_type, current_pod_size = pod_type.split(".")
-        new_pod_size = index_settings.pod_size
-        assert (
-            current_pod_size <= new_pod_size
-        ), f"Cannot downgrade pod size. Current pod size: '{current_pod_size}', new pod size: '{new_pod_size}'"
-        new_pod_instance_type = index_settings.pod_instance_type
-        assert (
-            current_pod_instance_type == new_pod_instance_type
-        ), f"Cannot change pod type. Current pod type: '{current_pod_instance_type}', new pod type: '{new_pod_instance_type}'"
+        with tracer.span("pinecone.describe_index", index_name=index_settings.name):
+            pod_type = pinecone.describe_index(index_settings.name).pod_type
+        errors = get_update_validation_errors(pod_type, index_settings)
+        assert not errors, "; ".join(errors)
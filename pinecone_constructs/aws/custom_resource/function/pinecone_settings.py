@@ -1,8 +1,11 @@
 """Pinecone index config settings."""
+import json
+import re
+from collections import defaultdict
 from enum import Enum
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from typing_extensions import TypedDict
-from pydantic import Field, BaseModel, ConfigDict
+from pydantic import Field, BaseModel, ConfigDict, field_validator
 
 
 
@@ -70,11 +73,211 @@ class PineConeEnvironment(str, Enum):
 MAX_INDEX_NAME_LENGTH = 45
 
 
+def get_environment_attribute_name(attribute: str, environment: str) -> str:
+    """Return the name of a custom resource attribute for an environment, i.e. HostUsWest1Gcp."""
+    return attribute + "".join(part.capitalize() for part in re.split(r"[^a-zA-Z0-9]+", environment))
+
+
+def get_benchmark_attribute_names(concurrency: int) -> Dict[str, str]:
+    """Return the custom resource attribute name of each measure at a concurrency level."""
+    return {
+        "p50_ms": f"BenchmarkP50MsConcurrency{concurrency}",
+        "p95_ms": f"BenchmarkP95MsConcurrency{concurrency}",
+        "p99_ms": f"BenchmarkP99MsConcurrency{concurrency}",
+        "qps": f"BenchmarkQpsConcurrency{concurrency}",
+    }
+
+
+def get_index_pool_shape_key(  # pylint: disable=too-many-arguments
+    api_key_secret_name: str,
+    environment: str,
+    dimension: int,
+    metric: str,
+    pod_type: str,
+    pods: int,
+    replicas: int,
+) -> str:
+    """
+    Return the key of the pool of interchangeable indexes with this shape.
+
+    The key includes the api key secret, i.e. the project, and the environment, since an
+    index can only be leased by resources in the project that has it.
+    """
+    return f"{api_key_secret_name}#{environment}#{dimension}#{metric}#{pod_type}#{pods}#{replicas}"
+
+
+class IndexPoolShape(BaseModel):
+    """Define the shape of the indexes kept ready in a pool, and how many to keep."""
+
+    model_config = ConfigDict(
+        use_enum_values=True,
+        validate_default=True,
+    )
+
+    api_key_secret_name: str = Field(
+        ...,
+        description="The name of the secret containing the Pinecone API key.",
+    )
+    environment: PineConeEnvironment = Field(
+        ...,
+        description="The environment to keep the indexes in.",
+    )
+    dimension: int = Field(
+        ...,
+        description="Dimension of vectors stored in the indexes.",
+    )
+    metric: DistanceMetric = Field(
+        default=DistanceMetric.DOT_PRODUCT,
+        description="Distance metric used to compute the distance between vectors.",
+    )
+    pods: int = Field(
+        default=1,
+        le=2,
+        ge=1,
+        description="Number of pods to use for the indexes.",
+    )
+    replicas: int = Field(
+        default=1,
+        le=1,
+        ge=1,
+        description="Number of replicas to use for the indexes.",
+    )
+    pod_instance_type: PodType = Field(
+        default=PodType.S1,
+        description="Type of pod to use for the indexes.",
+    )
+    pod_size: PodSize = Field(
+        default=PodSize.X1,
+        description="Size of pod to use for the indexes.",
+    )
+    size: int = Field(
+        default=2,
+        ge=0,
+        description="The number of ready, empty indexes to keep in the pool.",
+    )
+
+    def get_index_pool_shape_key(self) -> str:
+        """Return the key of the pool of indexes with this shape."""
+        return get_index_pool_shape_key(
+            self.api_key_secret_name,
+            self.environment,
+            self.dimension,
+            self.metric,
+            f"{self.pod_instance_type}.{self.pod_size}",
+            self.pods,
+            self.replicas,
+        )
+
+
+class ShardLayout(str, Enum):
+    """Define how vectors are assigned to the shards of a sharded index set."""
+
+    CONSISTENT_HASH = "consistent_hash"
+    TENANT = "tenant"
+
+
+def get_shard_name(name: str, shard: int) -> str:
+    """Return the name of a shard of an index, i.e. 'my-index-0'."""
+    return f"{name}-{shard}"
+
+
+class ShardMap(BaseModel):
+    """Define the shards of an index set, and how vectors are assigned to them."""
+
+    model_config = ConfigDict(
+        use_enum_values=True,
+        validate_default=True,
+    )
+
+    layout: ShardLayout = Field(
+        default=ShardLayout.CONSISTENT_HASH,
+        description="How vectors are assigned to shards.",
+    )
+    index_names: List[str] = Field(
+        ...,
+        min_length=1,
+        description="The names of the shards, in shard order.",
+    )
+    environment: str = Field(
+        ...,
+        description="The environment of the Pinecone project of the shards.",
+    )
+    metric: DistanceMetric = Field(
+        default=DistanceMetric.DOT_PRODUCT,
+        description="The distance metric of the shards, which decides how matches are merged.",
+    )
+    virtual_nodes: int = Field(
+        default=64,
+        ge=1,
+        description="The number of points of each shard on the hash ring.",
+    )
+    tenant_shards: Dict[str, int] = Field(
+        default_factory=dict,
+        description="The shard of each tenant with the tenant layout. Other tenants are hashed onto the ring.",
+    )
+
+
+class AdditionalEnvironment(BaseModel):
+    """Define an additional environment to create a copy of the index in."""
+
+    model_config = ConfigDict(
+        use_enum_values=True,
+        validate_default=True,
+    )
+
+    environment: PineConeEnvironment = Field(
+        ...,
+        description="The environment of the Pinecone project to create the copy in.",
+    )
+    api_key_secret_name: Optional[str] = Field(
+        default=None,
+        description="The name of the secret containing the API key of the project. "
+        "Defaults to the secret of the index.",
+    )
+
+
+class BenchmarkSettings(BaseModel):
+    """Define the query workload that benchmarks the index after it is created or updated."""
+
+    concurrency_levels: List[int] = Field(
+        default_factory=lambda: [1, 4, 16],
+        description="The numbers of concurrent clients to measure the latency and throughput at.",
+    )
+    num_queries: int = Field(
+        default=100,
+        ge=1,
+        description="The number of queries to run at each concurrency level.",
+    )
+    top_k: int = Field(
+        default=10,
+        ge=1,
+        description="The number of results per query.",
+    )
+    namespace: str = Field(
+        default="",
+        description="The namespace to query.",
+    )
+    sample_s3_uri: Optional[str] = Field(
+        default=None,
+        description="An S3 uri of a JSON lines file with a query vector per line. Random vectors of "
+        "the index dimension are queried if not set.",
+    )
+    max_wait_seconds: int = Field(
+        default=600,
+        ge=0,
+        le=720,
+        description="How long to wait for the index to be ready, i.e. after a pod type change, "
+        "before the benchmark starts. The benchmark is skipped if the index is not ready by then. "
+        "This leaves time for the benchmark within the 900 second timeout of the function.",
+    )
+
+
 class PineconeIndexSettings(BaseModel):
     """Define the settings for the Pinecone index."""
 
     model_config = ConfigDict(
         use_enum_values=True,
+        validate_default=True,
     )
 
     api_key_secret_name: str = Field(
@@ -131,3 +334,127 @@ class PineconeIndexSettings(BaseModel):
         default="",
         description="Name of the source collection to use for the index.",
     )
+    additional_environments: List[AdditionalEnvironment] = Field(
+        default_factory=list,
+        description="Additional environments to create a copy of the index in. The copies are "
+        "created, configured and deleted concurrently with the index.",
+    )
+    benchmark: Optional[BenchmarkSettings] = Field(
+        default=None,
+        description="If set, the query latency and throughput of the index are benchmarked after "
+        "every create and update, and published as stack outputs and metrics.",
+    )
+    namespace: Optional[str] = Field(
+        default=None,
+        description="If set, the index is a namespace of the shared index with this name, rather "
+        "than an index of its own.",
+    )
+
+    @field_validator("metadata_config", "additional_environments", "benchmark", mode="before")
+    @classmethod
+    def _decode_json(cls, value: Any) -> Any:
+        """Decode fields that were serialized to JSON strings for the custom resource properties."""
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+    def get_index_pool_shape_key(self) -> str:
+        """Return the key of the pool that an index with these settings can be leased from."""
+        return get_index_pool_shape_key(
+            self.api_key_secret_name,
+            self.environment,
+            self.dimension,
+            self.metric,
+            f"{self.pod_instance_type}.{self.pod_size}",
+            self.pods,
+            self.replicas,
+        )
+
+    def get_environment_settings(self) -> List["PineconeIndexSettings"]:
+        """Return the settings of the index in each of its environments, starting with its own."""
+        environment_settings = [self.model_copy(update={"additional_environments": []})]
+        for additional_environment in self.additional_environments:
+            environment_settings.append(
+                self.model_copy(
+                    update={
+                        "environment": additional_environment.environment,
+                        "api_key_secret_name": additional_environment.api_key_secret_name
+                        or self.api_key_secret_name,
+                        "additional_environments": [],
+                    }
+                )
+            )
+        return environment_settings
+
+
+class SharedIndex(BaseModel):
+    """Define an index shared by several logical indexes, each in a namespace of its own."""
+
+    index_settings: PineconeIndexSettings
+    namespace_settings: List[PineconeIndexSettings]
+
+
+def get_shared_indexes(index_settings: List[PineconeIndexSettings]) -> List[SharedIndex]:
+    """
+    Group indexes with the same project, dimension and metric into namespaces of a shared index.
+
+    The shared index has the largest pods and replicas of its namespaces, and indexes the
+    metadata fields indexed by any of them. It is destroyed with its namespaces if they are
+    all destroyed, and otherwise only once it holds no retained vectors.
+
+    Args:
+        index_settings: The settings of the logical indexes. The name of each becomes its namespace.
+
+    Returns:
+        The shared indexes, with the settings of their namespaces.
+
+    """
+    namespaces = [settings.name for settings in index_settings]
+    assert len(set(namespaces)) == len(namespaces), f"Duplicate namespaces in {namespaces}"
+    groups: Dict[Tuple[str, str, int, str], List[PineconeIndexSettings]] = defaultdict(list)
+    for settings in index_settings:
+        assert settings.namespace is None, f"Index '{settings.name}' is already a namespace"
+        assert not (settings.additional_environments or settings.source_collection or settings.benchmark), (
+            f"Index '{settings.name}' cannot be a namespace, because namespaces do not support "
+            "additional environments, source collections or benchmarks"
+        )
+        assert settings.removal_policy != RemovalPolicy.SNAPSHOT.value, (
+            f"Index '{settings.name}' cannot be a namespace, because a namespace cannot be snapshotted"
+        )
+        groups[(settings.api_key_secret_name, settings.environment, settings.dimension, settings.metric)].append(
+            settings
+        )
+    shared_indexes = []
+    for (_, _, dimension, metric), group in groups.items():
+        namespaces = [settings.name for settings in group]
+        pod_types = {f"{settings.pod_instance_type}.{settings.pod_size}" for settings in group}
+        assert len(pod_types) == 1, f"Namespaces {namespaces} share an index, but have different pod types {pod_types}"
+        metadata_config: Optional[MetaDataConfig] = None
+        if all(settings.metadata_config for settings in group):
+            indexed = {field for settings in group for field in settings.metadata_config["indexed"]}  # type: ignore
+            metadata_config = {"indexed": sorted(indexed)}
+        all_destroyed = all(settings.removal_policy == RemovalPolicy.DESTROY.value for settings in group)
+        name = f"shared-{dimension}-{metric}"
+        shared_indexes.append(
+            SharedIndex(
+                index_settings=group[0].model_copy(
+                    update={
+                        "name": name,
+                        "pods": max(settings.pods for settings in group),
+                        "replicas": max(settings.replicas for settings in group),
+                        "metadata_config": metadata_config,
+                        "removal_policy": RemovalPolicy.DESTROY.value
+                        if all_destroyed
+                        else RemovalPolicy.RETAIN_ON_UPDATE_OR_DELETE.value,
+                    }
+                ),
+                namespace_settings=[
+                    settings.model_copy(update={"name": name, "namespace": settings.name}) for settings in group
+                ],
+            )
+        )
+    names = [shared_index.index_settings.name for shared_index in shared_indexes]
+    assert len(set(names)) == len(names), (
+        f"Shared indexes {names} in different projects have the same name. Use a construct per project."
+    )
+    return shared_indexes
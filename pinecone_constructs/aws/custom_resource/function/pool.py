@@ -0,0 +1,427 @@
+"""Define a pool of ready, empty indexes that are leased instead of created."""
+import logging
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from enum import Enum
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import boto3
+import pinecone
+from aws_lambda_powertools.utilities import parameters
+from aws_lambda_powertools.utilities.typing import LambdaContext
+from pydantic import BaseModel, Field
+from .pinecone_settings import IndexPoolShape, PineconeIndexSettings, RemovalPolicy, get_index_pool_shape_key
+from .settings import IndexPoolSettings, Settings
+from .tracing import tracer
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PoolIndexStatus(str, Enum):
+    """Define the states of an index in the pool."""
+
+    PROVISIONING = "PROVISIONING"
+    CLEARING = "CLEARING"
+    AVAILABLE = "AVAILABLE"
+    LEASED = "LEASED"
+
+
+class PoolRecord(BaseModel):
+    """Define an index in the pool."""
+
+    index_name: str
+    shape: str = Field(
+        ...,
+        description="The key of the shape of the index.",
+    )
+    environment: str
+    api_key_secret_name: str
+    status: PoolIndexStatus
+    lessee: Optional[str] = Field(
+        default=None,
+        description="The name in the settings of the index that leased it.",
+    )
+    updated_at: int = Field(default_factory=lambda: int(time.time()))
+
+
+class IndexPoolStore(ABC):
+    """Define an interface for persisting the indexes in the pool."""
+
+    @abstractmethod
+    def list(self) -> List[PoolRecord]:
+        """Return every index in the pool."""
+
+    @abstractmethod
+    def get(self, index_name: str) -> Optional[PoolRecord]:
+        """Return the record of the index, if it is in the pool."""
+
+    @abstractmethod
+    def put(self, record: PoolRecord) -> None:
+        """Persist the record."""
+
+    @abstractmethod
+    def remove(self, index_name: str) -> None:
+        """Remove the index from the pool."""
+
+    @abstractmethod
+    def remove_unleased(self, index_name: str) -> bool:
+        """Remove the index from the pool unless it is leased, returning false if it was leased first."""
+
+    @abstractmethod
+    def lease(self, index_name: str, lessee: str) -> bool:
+        """Mark an available index as leased, returning false if it was leased by someone else first."""
+
+
+class InMemoryIndexPoolStore(IndexPoolStore):
+    """Store the indexes in the pool in memory, i.e. for tests."""
+
+    def __init__(self) -> None:
+        """Initialize the store."""
+        self._records: Dict[str, PoolRecord] = {}
+        self._lock = threading.Lock()
+
+    def list(self) -> List[PoolRecord]:
+        """Return every index in the pool."""
+        return list(self._records.values())
+
+    def get(self, index_name: str) -> Optional[PoolRecord]:
+        """Return the record of the index, if it is in the pool."""
+        return self._records.get(index_name)
+
+    def put(self, record: PoolRecord) -> None:
+        """Persist the record."""
+        self._records[record.index_name] = record
+
+    def remove(self, index_name: str) -> None:
+        """Remove the index from the pool."""
+        self._records.pop(index_name, None)
+
+    def remove_unleased(self, index_name: str) -> bool:
+        """Remove the index from the pool unless it is leased, returning false if it was leased first."""
+        with self._lock:
+            record = self._records.get(index_name)
+            if record is not None and record.status == PoolIndexStatus.LEASED:
+                return False
+            self._records.pop(index_name, None)
+            return True
+
+    def lease(self, index_name: str, lessee: str) -> bool:
+        """Mark an available index as leased, returning false if it was leased by someone else first."""
+        with self._lock:
+            record = self._records.get(index_name)
+            if record is None or record.status != PoolIndexStatus.AVAILABLE:
+                return False
+            self._records[index_name] = record.model_copy(update={"status": PoolIndexStatus.LEASED, "lessee": lessee})
+            return True
+
+
+class DynamoDBIndexPoolStore(IndexPoolStore):
+    """Store the indexes in the pool in a DynamoDB table, keyed by index name."""
+
+    def __init__(self, table_name: str) -> None:
+        """Initialize the store."""
+        self._table = boto3.resource("dynamodb").Table(table_name)
+
+    def list(self) -> List[PoolRecord]:
+        """Return every index in the pool."""
+        items: List[Dict[str, Any]] = []
+        kwargs: Dict[str, Any] = {"ConsistentRead": True}
+        while True:
+            response = self._table.scan(**kwargs)
+            items.extend(response["Items"])
+            if "LastEvaluatedKey" not in response:
+                return [PoolRecord.model_validate(item) for item in items]
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def get(self, index_name: str) -> Optional[PoolRecord]:
+        """Return the record of the index, if it is in the pool."""
+        item = self._table.get_item(Key={"index_name": index_name}, ConsistentRead=True).get("Item")
+        return PoolRecord.model_validate(item) if item else None
+
+    def put(self, record: PoolRecord) -> None:
+        """Persist the record."""
+        self._table.put_item(Item=record.model_dump(mode="json", exclude_none=True))
+
+    def remove(self, index_name: str) -> None:
+        """Remove the index from the pool."""
+        self._table.delete_item(Key={"index_name": index_name})
+
+    def remove_unleased(self, index_name: str) -> bool:
+        """Remove the index from the pool unless it is leased, returning false if it was leased first."""
+        try:
+            self._table.delete_item(
+                Key={"index_name": index_name},
+                ConditionExpression="attribute_not_exists(index_name) OR #status <> :leased",
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues={":leased": PoolIndexStatus.LEASED.value},
+            )
+        except self._table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def lease(self, index_name: str, lessee: str) -> bool:
+        """Mark an available index as leased, returning false if it was leased by someone else first."""
+        try:
+            self._table.update_item(
+                Key={"index_name": index_name},
+                UpdateExpression="SET #status = :leased, lessee = :lessee, updated_at = :now",
+                ConditionExpression="#status = :available",
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues={
+                    ":leased": PoolIndexStatus.LEASED.value,
+                    ":available": PoolIndexStatus.AVAILABLE.value,
+                    ":lessee": lessee,
+                    ":now": int(time.time()),
+                },
+            )
+        except self._table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+
+class IndexPool:
+    """
+    Lease ready, empty indexes from a pool instead of creating them.
+
+    Creating a pod-based index takes minutes. The pool keeps a number of indexes of
+    each shape ready, so an index with a matching shape is leased in seconds. Pinecone
+    cannot rename an index, so a leased index keeps its pool name, which becomes the
+    physical id of the custom resource. The index is cleared and returned to the pool
+    when it is deleted, and the pool is refilled in the background. Pinecone applies
+    deletes asynchronously, so a returned index is only available again once the
+    refill sees that it has no vectors left.
+
+    The pinecone client must be initialized for the project of the indexes.
+    """
+
+    def __init__(self, store: IndexPoolStore, name_prefix: str) -> None:
+        """Initialize the pool."""
+        self._store = store
+        self._name_prefix = name_prefix
+
+    def is_pool_index(self, index_name: str) -> bool:
+        """Return whether the index belongs to the pool."""
+        return index_name.startswith(f"{self._name_prefix}-")
+
+    @staticmethod
+    def can_lease(index_settings: PineconeIndexSettings) -> bool:
+        """
+        Return whether an index with these settings can be leased from a pool.
+
+        Pool indexes are empty and index every metadata field, and are cleared and
+        reused once they are deleted, so only indexes that are destroyed with their
+        stack, without a metadata config or source collection, are leased.
+        """
+        return (
+            index_settings.removal_policy == RemovalPolicy.DESTROY.value
+            and not index_settings.metadata_config
+            and not index_settings.source_collection
+            and not index_settings.additional_environments
+        )
+
+    def lease(self, index_settings: PineconeIndexSettings) -> Optional[str]:
+        """
+        Lease an available index with the shape of the settings.
+
+        Returns:
+            The name of the leased index, or None if the pool has no available index.
+
+        """
+        shape = index_settings.get_index_pool_shape_key()
+        candidates = [
+            record
+            for record in self._store.list()
+            if record.shape == shape and record.status == PoolIndexStatus.AVAILABLE
+        ]
+        for record in sorted(candidates, key=lambda record: record.updated_at):
+            if not self._store.lease(record.index_name, lessee=index_settings.name):
+                continue
+            if record.index_name not in pinecone.list_indexes():
+                LOGGER.warning("Pool index '%s' no longer exists. Removing it from the pool.", record.index_name)
+                self._store.remove(record.index_name)
+                continue
+            LOGGER.info("Leased pool index '%s' for index '%s'.", record.index_name, index_settings.name)
+            return record.index_name
+        LOGGER.info("No pool index with shape '%s' is available.", shape)
+        return None
+
+    def release(self, index_name: str, environment: str, api_key_secret_name: str) -> None:
+        """
+        Clear a leased index and return it to the pool, as clearing until it is empty.
+
+        The index is deleted instead if it is no longer in the pool, i.e. the pool was
+        removed while the index was leased, or if its shape was changed by an update.
+        """
+        record = self._store.get(index_name)
+        description = pinecone.describe_index(index_name)
+        shape = get_index_pool_shape_key(
+            api_key_secret_name,
+            environment,
+            description.dimension,
+            description.metric,
+            description.pod_type,
+            description.pods,
+            description.replicas,
+        )
+        if record is None or record.status != PoolIndexStatus.LEASED or record.shape != shape:
+            LOGGER.info("Index '%s' cannot be returned to the pool. Deleting it.", index_name)
+            pinecone.delete_index(index_name)
+            self._store.remove(index_name)
+            return
+        self.clear(index_name)
+        self._store.put(record.model_copy(update={"status": PoolIndexStatus.CLEARING, "lessee": None}))
+        LOGGER.info("Returned index '%s' to the pool. It is available once it is empty.", index_name)
+
+    @staticmethod
+    @tracer.traced("clear_index")
+    def clear(index_name: str) -> None:
+        """Delete every vector in every namespace of the index."""
+        index = pinecone.Index(index_name)
+        for namespace in index.describe_index_stats()["namespaces"]:
+            index.delete(delete_all=True, namespace=namespace)
+
+    def refill(self, shapes: List[IndexPoolShape], environment: str, api_key_secret_name: str) -> None:
+        """
+        Refill the pool of every shape in a project up to its size.
+
+        Indexes that finished provisioning, or returned indexes whose vectors are all
+        deleted, are made available, and indexes of shapes that are no longer in the pool are deleted unless they are leased. An index
+        leased after the records were listed is kept, since it is only deleted once its
+        record is conditionally removed. New indexes are created without waiting for
+        them to be ready.
+        """
+        sizes = {shape.get_index_pool_shape_key(): shape for shape in shapes}
+        records = [
+            record
+            for record in self._store.list()
+            if record.environment == environment and record.api_key_secret_name == api_key_secret_name
+        ]
+        live_indexes = set(pinecone.list_indexes())
+        counts: Dict[str, int] = defaultdict(int)
+        for record in records:
+            if record.status == PoolIndexStatus.LEASED:
+                continue
+            if record.shape not in sizes or counts[record.shape] >= sizes[record.shape].size:
+                self._remove(record, live_indexes)
+                continue
+            if record.index_name not in live_indexes:
+                LOGGER.warning("Pool index '%s' no longer exists. Removing it from the pool.", record.index_name)
+                self._store.remove_unleased(record.index_name)
+                continue
+            counts[record.shape] += 1
+            if record.status == PoolIndexStatus.PROVISIONING and self._is_ready(record.index_name):
+                self._store.put(record.model_copy(update={"status": PoolIndexStatus.AVAILABLE}))
+            elif record.status == PoolIndexStatus.CLEARING and self._is_empty(record.index_name):
+                self._store.put(record.model_copy(update={"status": PoolIndexStatus.AVAILABLE}))
+        for shape_key, shape in sizes.items():
+            for _ in range(shape.size - counts[shape_key]):
+                self._create(shape, api_key_secret_name)
+
+    def _remove(self, record: PoolRecord, live_indexes: Set[str]) -> None:
+        if not self._store.remove_unleased(record.index_name):
+            LOGGER.info("Index '%s' was leased while the pool was refilled. Keeping it.", record.index_name)
+            return
+        LOGGER.info("Removing index '%s' from the pool.", record.index_name)
+        if record.index_name in live_indexes:
+            try:
+                pinecone.delete_index(record.index_name)
+            except Exception:
+                # keep the record, so that the index is removed by the next refill
+                self._store.put(record)
+                raise
+
+    @staticmethod
+    def _is_ready(index_name: str) -> bool:
+        return pinecone.describe_index(index_name).status.get("state") == "Ready"
+
+    @staticmethod
+    def _is_empty(index_name: str) -> bool:
+        return pinecone.Index(index_name).describe_index_stats()["total_vector_count"] == 0
+
+    def _create(self, shape: IndexPoolShape, api_key_secret_name: str) -> None:
+        name = f"{self._name_prefix}-{secrets.token_hex(4)}"
+        # the record is written first, so an index is never created without being in the pool
+        self._store.put(
+            PoolRecord(
+                index_name=name,
+                shape=shape.get_index_pool_shape_key(),
+                environment=shape.environment,
+                api_key_secret_name=api_key_secret_name,
+                status=PoolIndexStatus.PROVISIONING,
+            )
+        )
+        LOGGER.info("Creating pool index '%s'.", name)
+        pinecone.create_index(
+            name=name,
+            dimension=shape.dimension,
+            metric=shape.metric,
+            pods=shape.pods,
+            replicas=shape.replicas,
+            pod_type=f"{shape.pod_instance_type}.{shape.pod_size}",
+            timeout=-1,
+        )
+
+
+def resolve_leased_index_names(
+    index_settings: List[PineconeIndexSettings],
+    store: IndexPoolStore,
+) -> List[PineconeIndexSettings]:
+    """
+    Return the settings with the name of the pool index that each leased index has.
+
+    A leased index keeps its pool name, so the settings are renamed before they are
+    compared against the live indexes, i.e. by drift detection and plans. Indexes that
+    are not leased keep their names.
+    """
+    leased_names: Dict[Tuple[str, str, Optional[str]], str] = {}
+    for record in sorted(store.list(), key=lambda record: record.updated_at):
+        if record.status == PoolIndexStatus.LEASED:
+            leased_names[(record.api_key_secret_name, record.environment, record.lessee)] = record.index_name
+    return [
+        settings.model_copy(update={"name": leased_names[key]}) if key in leased_names else settings
+        for settings in index_settings
+        for key in [(settings.api_key_secret_name, settings.environment, settings.name)]
+    ]
+
+
+def get_index_pool(settings: Settings) -> Optional[IndexPool]:
+    """Return the index pool configured in the runtime settings, if there is one."""
+    if not settings.index_pool_table_name or not settings.index_pool_name_prefix:
+        return None
+    return IndexPool(DynamoDBIndexPoolStore(settings.index_pool_table_name), settings.index_pool_name_prefix)
+
+
+def _group_by_project(
+    shapes: List[IndexPoolShape],
+    records: List[PoolRecord],
+) -> Dict[Tuple[str, str], List[IndexPoolShape]]:
+    """Group the shapes by the api key and environment needed to reach them, including projects with only records."""
+    groups: Dict[Tuple[str, str], List[IndexPoolShape]] = defaultdict(list)
+    for record in records:
+        groups[(record.api_key_secret_name, record.environment)] = []
+    for shape in shapes:
+        groups[(shape.api_key_secret_name, shape.environment)].append(shape)
+    return groups
+
+
+def lambda_handler(event: dict, _: LambdaContext) -> Dict[str, Any]:
+    """
+    Refill the pool on a schedule, or when the pool is created or updated.
+
+    When the pool is deleted, every index in it that is not leased is deleted.
+    """
+    settings = IndexPoolSettings()  # type: ignore
+    store = DynamoDBIndexPoolStore(settings.index_pool_table_name)
+    pool = IndexPool(store, settings.index_pool_name_prefix)
+    shapes = [] if event.get("RequestType") == "Delete" else settings.shapes
+    for (secret_name, environment), project_shapes in _group_by_project(shapes, store.list()).items():
+        key = parameters.get_secret(secret_name, max_age=30)
+        assert isinstance(key, str), f"api_key of type '{type(key)}' returned from " \
+            "secrets manager is not a string"
+        pinecone.init(api_key=key, environment=environment)
+        pool.refill(project_shapes, environment, secret_name)
+    return {"PhysicalResourceId": settings.index_pool_name_prefix}
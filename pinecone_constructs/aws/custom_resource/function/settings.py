@@ -1,6 +1,8 @@
 """Define the runtime settings for the function."""
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field
+from .pinecone_settings import IndexPoolShape
 
 
 class Settings(BaseSettings):
@@ -10,3 +12,75 @@ class Settings(BaseSettings):
         default=5,
         description="The number of attempts to run an operation.",
     )
+    operation_ledger_table_name: Optional[str] = Field(
+        default=None,
+        description="The DynamoDB table used to record completed operations. "
+        "If not set, completed operations are only recorded in memory.",
+    )
+    operation_ledger_ttl_seconds: int = Field(
+        default=7 * 24 * 60 * 60,
+        description="How long completed operations are kept in the ledger.",
+    )
+    metrics_namespace: str = Field(
+        default="PineconeConstructs",
+        description="The CloudWatch namespace to publish benchmark metrics to.",
+    )
+    tracing_enabled: bool = Field(
+        default=False,
+        description="If true, the steps of every request are sent to X-Ray as subsegments.",
+    )
+    index_pool_table_name: Optional[str] = Field(
+        default=None,
+        description="The DynamoDB table of a pool of ready indexes to lease from, instead of creating indexes.",
+    )
+    index_pool_name_prefix: Optional[str] = Field(
+        default=None,
+        description="The prefix of the names of the indexes in the pool.",
+    )
+
+
+class DriftDetectionSettings(BaseSettings):
+    """Define the runtime settings for the drift detection function."""
+
+    expected_indexes_s3_uri: Optional[str] = Field(
+        default=None,
+        description="The S3 uri of a JSON list of the synthesized settings of the indexes managed by the construct. "
+        "They are not passed as an environment variable, since those are limited to 4 KB in total.",
+    )
+    managed_index_prefixes: List[str] = Field(
+        default_factory=list,
+        description="Index name prefixes that identify indexes managed by the construct.",
+    )
+    metrics_namespace: str = Field(
+        default="PineconeConstructs",
+        description="The CloudWatch namespace to publish drift metrics to.",
+    )
+    event_bus_name: str = Field(
+        default="default",
+        description="The EventBridge bus to publish drift events to.",
+    )
+    max_concurrent_requests: int = Field(
+        default=8,
+        description="The maximum number of concurrent describe requests to pinecone.",
+    )
+    index_pool_table_name: Optional[str] = Field(
+        default=None,
+        description="The DynamoDB table of the pool the indexes are leased from, to look up their leased names.",
+    )
+
+
+class IndexPoolSettings(BaseSettings):
+    """Define the runtime settings for the index pool function."""
+
+    index_pool_table_name: str = Field(
+        ...,
+        description="The DynamoDB table that records the indexes in the pool.",
+    )
+    index_pool_name_prefix: str = Field(
+        ...,
+        description="The prefix of the names of the indexes in the pool.",
+    )
+    shapes: List[IndexPoolShape] = Field(
+        default_factory=list,
+        description="The shapes of the indexes to keep ready, and how many of each.",
+    )
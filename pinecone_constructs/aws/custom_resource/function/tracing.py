@@ -0,0 +1,253 @@
+"""Define tracing spans for the steps of the custom resource provider."""
+import contextvars
+import functools
+import json
+import logging
+import os
+import secrets
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from pydantic import BaseModel, Field
+
+
+LOGGER = logging.getLogger(__name__)
+
+XRAY_TRACE_HEADER_ENVIRONMENT_VARIABLE = "_X_AMZN_TRACE_ID"
+XRAY_DAEMON_ADDRESS_ENVIRONMENT_VARIABLE = "AWS_XRAY_DAEMON_ADDRESS"
+DEFAULT_XRAY_DAEMON_ADDRESS = "127.0.0.1:2000"
+XRAY_PROTOCOL_HEADER = '{"format": "json", "version": 1}\n'
+REQUEST_ID_ATTRIBUTE = "request_id"
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+
+class Span(BaseModel):
+    """Define a timed step of the provider."""
+
+    name: str
+    trace_id: str
+    span_id: str = Field(default_factory=lambda: secrets.token_hex(8))
+    parent_id: Optional[str] = None
+    start_time: float = Field(default_factory=time.time)
+    end_time: Optional[float] = None
+    attributes: Dict[str, Any] = Field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        """Return the duration of the span."""
+        return ((self.end_time or time.time()) - self.start_time) * 1000
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Set an attribute of the span."""
+        self.attributes[key] = value
+
+
+class SpanExporter(ABC):
+    """Define an interface for exporting finished spans."""
+
+    @abstractmethod
+    def export(self, span: Span) -> None:
+        """Export a finished span."""
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keep the finished spans in memory, i.e. for tests."""
+
+    def __init__(self) -> None:
+        """Initialize the exporter."""
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        """Export a finished span."""
+        with self._lock:
+            self._spans.append(span)
+
+    def get_finished_spans(self) -> List[Span]:
+        """Return the finished spans, in the order they finished."""
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        """Remove the finished spans."""
+        with self._lock:
+            self._spans.clear()
+
+
+def parse_xray_trace_header(header: str) -> Dict[str, str]:
+    """Parse an X-Ray trace header, i.e. 'Root=1-5759e988-bd862e3fe1be46a994272793;Parent=53995c3f42cd8ad8;Sampled=1'."""
+    return dict(part.split("=", 1) for part in header.split(";") if "=" in part)
+
+
+class XRaySpanExporter(SpanExporter):
+    """
+    Send the finished spans to the X-Ray daemon as subsegments.
+
+    Lambda creates the segment of every invocation when active tracing is enabled, and
+    sets its trace id and segment id in the trace header, which the spans are
+    attached to.
+    """
+
+    def __init__(self, daemon_address: Optional[str] = None) -> None:
+        """Initialize the exporter."""
+        address = daemon_address or os.environ.get(XRAY_DAEMON_ADDRESS_ENVIRONMENT_VARIABLE, DEFAULT_XRAY_DAEMON_ADDRESS)
+        # the address may list a udp and tcp address, i.e. 'tcp:127.0.0.1:2000 udp:127.0.0.2:2001'
+        udp_address = next((part[len("udp:") :] for part in address.split() if part.startswith("udp:")), address)
+        host, _, port = udp_address.rpartition(":")
+        self._address = (host, int(port))
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def export(self, span: Span) -> None:
+        """Export a finished span."""
+        trace_header = parse_xray_trace_header(os.environ.get(XRAY_TRACE_HEADER_ENVIRONMENT_VARIABLE, ""))
+        if trace_header.get("Sampled") == "0" or "Root" not in trace_header:
+            return
+        subsegment: Dict[str, Any] = {
+            "type": "subsegment",
+            "id": span.span_id,
+            "trace_id": trace_header["Root"],
+            "parent_id": span.parent_id or trace_header.get("Parent"),
+            "name": span.name,
+            "start_time": span.start_time,
+            "end_time": span.end_time,
+            "annotations": {
+                key: value for key, value in span.attributes.items() if isinstance(value, (str, int, float, bool))
+            },
+        }
+        if span.error:
+            subsegment["fault"] = True
+            subsegment["cause"] = {"exceptions": [{"message": span.error}]}
+        try:
+            self._socket.sendto((XRAY_PROTOCOL_HEADER + json.dumps(subsegment)).encode(), self._address)
+        except OSError as error:
+            LOGGER.warning("Failed to send span '%s' to the X-Ray daemon: %s", span.name, error)
+
+
+def propagate_context(function: _F) -> _F:
+    """
+    Bind the function to the current context, i.e. before submitting it to a thread pool.
+
+    Threads do not inherit the context of the thread that submits work to them, so the
+    spans they start would otherwise begin new traces without a request id. Every call
+    runs in its own copy of the context, so concurrent calls do not see each other's spans.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return context.copy().run(function, *args, **kwargs)
+
+    return wrapper  # type: ignore
+
+
+class _NoOpSpan:
+    """Stand in for a span when tracing is disabled."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Ignore the attribute."""
+
+    def __enter__(self) -> "_NoOpSpan":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        return None
+
+
+_NO_OP_SPAN = _NoOpSpan()
+
+
+class Tracer:
+    """
+    Record spans around the steps of the provider.
+
+    When the tracer is disabled, span returns a shared no-op span, so instrumented code
+    only pays for a function call. Spans started in threads are attached to the span
+    that was current when the thread's context was copied, i.e. by propagate_context.
+    """
+
+    def __init__(self) -> None:
+        """Initialize a disabled tracer."""
+        self._exporter: Optional[SpanExporter] = None
+        self._current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+            "current_span", default=None
+        )
+        self._request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+    @property
+    def enabled(self) -> bool:
+        """Return whether spans are recorded."""
+        return self._exporter is not None
+
+    def configure(self, exporter: Optional[SpanExporter]) -> None:
+        """Set the exporter of the finished spans, or disable tracing if it is None."""
+        self._exporter = exporter
+
+    @contextmanager
+    def start_trace(self, request_id: str, name: str) -> Iterator[Any]:
+        """
+        Start the root span of a CloudFormation request.
+
+        The request id is set as an attribute of every span in the trace, so that all
+        the steps of a request, including replays of it, can be found by it.
+        """
+        if not self.enabled:
+            yield _NO_OP_SPAN
+            return
+        token = self._request_id.set(request_id)
+        try:
+            with self.span(name) as span:
+                yield span
+        finally:
+            self._request_id.reset(token)
+
+    def span(self, name: str, **attributes: Any) -> Any:
+        """Return a context manager that records a span around its block."""
+        if self._exporter is None:
+            return _NO_OP_SPAN
+        return self._record(name, attributes)
+
+    @contextmanager
+    def _record(self, name: str, attributes: Dict[str, Any]) -> Iterator[Span]:
+        parent = self._current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+        request_id = self._request_id.get()
+        if request_id is not None:
+            span.set_attribute(REQUEST_ID_ATTRIBUTE, request_id)
+        token = self._current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.error = f"{type(error).__name__}: {error}"
+            raise
+        finally:
+            self._current_span.reset(token)
+            span.end_time = time.time()
+            if self._exporter is not None:
+                self._exporter.export(span)
+
+    def traced(self, name: str) -> Callable[[_F], _F]:
+        """Return a decorator that records a span around every call of the function."""
+
+        def decorator(function: _F) -> _F:
+            @functools.wraps(function)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.span(name):
+                    return function(*args, **kwargs)
+
+            return wrapper  # type: ignore
+
+        return decorator
+
+
+tracer = Tracer()
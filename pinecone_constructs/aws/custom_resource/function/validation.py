@@ -0,0 +1,31 @@
+"""Define validation of changes to existing pinecone indexes."""
+from typing import List
+from .pinecone_settings import PineconeIndexSettings
+
+
+def get_update_validation_errors(current_pod_type: str, index_settings: PineconeIndexSettings) -> List[str]:
+    """
+    Return the reasons an index cannot be updated to the new settings.
+
+    Args:
+        current_pod_type: The pod type of the live index, in the format s1.x1.
+        index_settings: The new settings for the index.
+
+    Returns:
+        The validation errors. An empty list means the update is valid.
+
+    """
+    errors = []
+    current_pod_instance_type, current_pod_size = current_pod_type.split(".")
+    new_pod_size = index_settings.pod_size
+    if current_pod_size > new_pod_size:
+        errors.append(
+            f"Cannot downgrade pod size. Current pod size: '{current_pod_size}', new pod size: '{new_pod_size}'"
+        )
+    new_pod_instance_type = index_settings.pod_instance_type
+    if current_pod_instance_type != new_pod_instance_type:
+        errors.append(
+            f"Cannot change pod type. Current pod type: '{current_pod_instance_type}', "
+            f"new pod type: '{new_pod_instance_type}'"
+        )
+    return errors
@@ -0,0 +1,315 @@
+"""
+Reduce the dimension of the vectors stored in an index.
+
+Pod capacity and query latency both scale with the dimension of an index. A
+projection, either PCA or a random projection, is fitted on a sample of the
+embeddings and saved as an artifact. The reduced dimension is set on the index
+settings, and the same projection is applied to every vector that is upserted or
+queried. The recall of the reduced vectors is benchmarked against the full vectors.
+
+Example:
+    python -m pinecone_constructs.aws.dimensionality_reduction --sample embeddings.npy \\
+        --dimension 256 --output projection.npz
+
+"""
+import argparse
+import json
+import sys
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Any, List, Optional, Sequence, Union
+
+from pydantic import BaseModel
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError(
+        "The dimensionality reduction tool requires the tools extra: pip install 'pinecone_constructs[tools]'"
+    ) from error
+
+from .custom_resource.function.pinecone_settings import DistanceMetric, PineconeIndexSettings
+
+
+class ProjectionMethod(str, Enum):
+    """Define the projection methods."""
+
+    PCA = "pca"
+    RANDOM = "random"
+
+
+@dataclass
+class Projection:
+    """Define a linear projection of vectors to a lower dimension."""
+
+    method: str
+    mean: np.ndarray
+    components: np.ndarray
+    normalize: bool = False
+
+    @property
+    def input_dimension(self) -> int:
+        """Return the dimension of the vectors before the projection."""
+        return self.components.shape[0]
+
+    @property
+    def dimension(self) -> int:
+        """Return the dimension of the vectors after the projection."""
+        return self.components.shape[1]
+
+    def transform(self, vectors: Union[np.ndarray, Sequence[Sequence[float]]]) -> np.ndarray:
+        """
+        Project the vectors to the reduced dimension.
+
+        Args:
+            vectors: A single vector, or a matrix with a vector per row.
+
+        Returns:
+            The projected vectors, with the same number of dimensions as the input.
+
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        projected = (vectors - self.mean) @ self.components
+        if self.normalize:
+            norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+            projected = projected / np.where(norms == 0, 1, norms)
+        return projected
+
+    def apply_to(self, index_settings: PineconeIndexSettings) -> PineconeIndexSettings:
+        """Return a copy of the index settings with the reduced dimension."""
+        assert index_settings.dimension == self.input_dimension, (
+            f"Index dimension '{index_settings.dimension}' does not match the projection "
+            f"input dimension '{self.input_dimension}'"
+        )
+        return index_settings.model_copy(update={"dimension": self.dimension})
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Save the projection as an artifact."""
+        with open(path, "wb") as file:
+            np.savez(
+                file,
+                method=np.array(self.method),
+                mean=self.mean,
+                components=self.components,
+                normalize=np.array(self.normalize),
+            )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Projection":
+        """Load a projection from an artifact."""
+        with np.load(path) as artifact:
+            return cls(
+                method=str(artifact["method"]),
+                mean=artifact["mean"],
+                components=artifact["components"],
+                normalize=bool(artifact["normalize"]),
+            )
+
+
+def fit_pca(
+    sample: np.ndarray,
+    dimension: int,
+    normalize: bool = False,
+    metric: str = DistanceMetric.DOT_PRODUCT.value,
+) -> Projection:
+    """
+    Fit a PCA projection on a sample of vectors.
+
+    The principal components are computed from the covariance matrix, so the cost
+    grows with the input dimension rather than the size of the sample. Only euclidean
+    distances are unchanged by subtracting the mean, so for the cosine and dot product
+    metrics the vectors are not centered, and the components are computed from the
+    second moment matrix instead, which keeps the direction of the mean.
+
+    Args:
+        sample: The sample, with a vector per row.
+        dimension: The reduced dimension.
+        normalize: If true, the projected vectors are normalized to unit length.
+        metric: The distance metric of the index.
+
+    Returns:
+        The projection.
+
+    """
+    sample = np.asarray(sample, dtype=np.float64)
+    assert dimension <= sample.shape[1], f"Cannot reduce dimension '{sample.shape[1]}' to '{dimension}'"
+    if metric == DistanceMetric.EUCLIDEAN.value:
+        mean = sample.mean(axis=0)
+    else:
+        mean = np.zeros(sample.shape[1])
+    centered = sample - mean
+    covariance = centered.T @ centered / max(len(sample) - 1, 1)
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    components = eigenvectors[:, np.argsort(eigenvalues)[::-1][:dimension]]
+    return Projection(
+        method=ProjectionMethod.PCA.value,
+        mean=mean.astype(np.float32),
+        components=components.astype(np.float32),
+        normalize=normalize,
+    )
+
+
+def fit_random_projection(
+    input_dimension: int,
+    dimension: int,
+    normalize: bool = False,
+    seed: int = 0,
+) -> Projection:
+    """
+    Create a gaussian random projection, which approximately preserves distances.
+
+    Args:
+        input_dimension: The dimension of the vectors before the projection.
+        dimension: The reduced dimension.
+        normalize: If true, the projected vectors are normalized to unit length.
+        seed: The seed of the random number generator.
+
+    Returns:
+        The projection.
+
+    """
+    generator = np.random.default_rng(seed)
+    components = generator.normal(scale=1 / np.sqrt(dimension), size=(input_dimension, dimension))
+    return Projection(
+        method=ProjectionMethod.RANDOM.value,
+        mean=np.zeros(input_dimension, dtype=np.float32),
+        components=components.astype(np.float32),
+        normalize=normalize,
+    )
+
+
+def get_top_k(vectors: np.ndarray, queries: np.ndarray, k: int, metric: str) -> np.ndarray:
+    """Return the indices of the exact top k vectors for each query."""
+    if metric == DistanceMetric.EUCLIDEAN.value:
+        scores = -(
+            np.sum(queries**2, axis=1, keepdims=True) - 2 * queries @ vectors.T + np.sum(vectors**2, axis=1)
+        )
+    else:
+        if metric == DistanceMetric.COSINE.value:
+            vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        scores = queries @ vectors.T
+    k = min(k, vectors.shape[0])
+    top_k = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return top_k
+
+
+class ProjectionBenchmark(BaseModel):
+    """Define the result of benchmarking a projection."""
+
+    method: str
+    input_dimension: int
+    dimension: int
+    k: int
+    num_queries: int
+    recall_at_k: float
+
+
+def benchmark_projection(
+    projection: Projection,
+    vectors: np.ndarray,
+    queries: Optional[np.ndarray] = None,
+    k: int = 10,
+    metric: str = DistanceMetric.COSINE.value,
+    num_queries: int = 100,
+    seed: int = 0,
+) -> ProjectionBenchmark:
+    """
+    Measure the recall@k of the projected vectors against the full vectors.
+
+    Args:
+        projection: The projection to benchmark.
+        vectors: The full dimension vectors to search.
+        queries: The full dimension queries. Defaults to a random subset of the vectors.
+        k: The number of results per query.
+        metric: The distance metric of the index.
+        num_queries: The number of queries to sample, if no queries are given.
+        seed: The seed used to sample the queries.
+
+    Returns:
+        The benchmark result.
+
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if queries is None:
+        generator = np.random.default_rng(seed)
+        queries = vectors[generator.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)]
+    queries = np.asarray(queries, dtype=np.float32)
+    expected = get_top_k(vectors, queries, k, metric)
+    actual = get_top_k(projection.transform(vectors), projection.transform(queries), k, metric)
+    hits = [len(np.intersect1d(expected_row, actual_row)) for expected_row, actual_row in zip(expected, actual)]
+    return ProjectionBenchmark(
+        method=projection.method,
+        input_dimension=projection.input_dimension,
+        dimension=projection.dimension,
+        k=expected.shape[1],
+        num_queries=len(queries),
+        recall_at_k=float(np.sum(hits) / expected.size),
+    )
+
+
+class ProjectedIndex:
+    """
+    Apply a projection to the vectors upserted to, and queried from, a pinecone index.
+
+    This wraps a pinecone.Index, so both seeding the index and querying it at runtime
+    use the reduced dimension, i.e.
+
+        index = ProjectedIndex(pinecone.Index(name), Projection.load("projection.npz"))
+        index.upsert(vectors=[("id", embedding, {"genre": "drama"})])
+        index.query(vector=embedding, top_k=10)
+
+    """
+
+    def __init__(self, index: Any, projection: Projection) -> None:
+        """Initialize the projected index."""
+        self._index = index
+        self._projection = projection
+
+    def upsert(self, vectors: List[Any], **kwargs) -> Any:
+        """Project the values of the vectors, then upsert them."""
+        projected = []
+        for vector in vectors:
+            if isinstance(vector, dict):
+                vector = {**vector, "values": self._projection.transform(vector["values"]).tolist()}
+            else:
+                vector = (vector[0], self._projection.transform(vector[1]).tolist(), *vector[2:])
+            projected.append(vector)
+        return self._index.upsert(vectors=projected, **kwargs)
+
+    def query(self, vector: Optional[Sequence[float]] = None, **kwargs) -> Any:
+        """Project the query vector, then query the index."""
+        if vector is not None:
+            vector = self._projection.transform(vector).tolist()
+        return self._index.query(vector=vector, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        """Forward any other call, i.e. fetch or delete, to the wrapped index."""
+        return getattr(self._index, name)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Fit a projection on a sample of vectors, save it, and print its recall@k."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample", required=True, help="A .npy file with a vector per row.")
+    parser.add_argument("--dimension", type=int, required=True, help="The reduced dimension.")
+    parser.add_argument("--method", choices=[method.value for method in ProjectionMethod], default="pca")
+    parser.add_argument("--metric", choices=[metric.value for metric in DistanceMetric], default="cosine")
+    parser.add_argument("--normalize", action="store_true", help="Normalize the projected vectors.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--output", required=True, help="The path to save the projection to.")
+    args = parser.parse_args(argv)
+    sample = np.load(args.sample)
+    if args.method == ProjectionMethod.PCA:
+        projection = fit_pca(sample, args.dimension, normalize=args.normalize, metric=args.metric)
+    else:
+        projection = fit_random_projection(sample.shape[1], args.dimension, normalize=args.normalize)
+    projection.save(args.output)
+    benchmark = benchmark_projection(projection, sample, k=args.k, metric=args.metric)
+    print(json.dumps(benchmark.model_dump(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
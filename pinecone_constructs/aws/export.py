@@ -0,0 +1,553 @@
+"""
+Export the vectors of an index to Parquet files, and import them back.
+
+A collection, made by the SNAPSHOT removal policy, can only be read by Pinecone. An
+export is a directory of Parquet files, locally or on S3, with a part directory per
+namespace, so it can be read by any tool and imported into an index in another project.
+
+The ids of every namespace are enumerated, then fetched in parallel batches and
+written part by part, so memory is bounded by the number of parts in flight. Completed
+parts are recorded in a checkpoint with the number of ids consumed from the id source,
+and an interrupted export skips that many ids to resume after them.
+
+Pinecone has no api to list the ids of a pod-based index, so they are read from a
+manifest when there is one, and otherwise discovered by querying with random vectors
+until the vector count of the namespace is reached.
+
+Example:
+    python -m pinecone_constructs.aws.export export --index my-index --environment gcp-starter \\
+        --api-key-secret-name pinecone-api-key --destination s3://bucket/exports/my-index/
+
+"""
+import argparse
+import itertools
+import json
+import logging
+import sys
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+import pinecone
+from pydantic import BaseModel, Field
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from pyarrow import fs
+except ImportError as error:
+    raise ImportError("The export tool requires the tools extra: pip install 'pinecone_constructs[tools]'") from error
+
+from .credentials import get_api_key
+from .custom_resource.function.tracing import propagate_context
+from .metadata_config import iter_lines
+
+
+LOGGER = logging.getLogger(__name__)
+
+CHECKPOINT_FILE_NAME = "_checkpoint.json"
+NAMESPACE_DIRECTORY_PREFIX = "namespace="
+DEFAULT_NAMESPACE_DIRECTORY = "__default__"
+DEFAULT_PART_SIZE = 10_000
+DEFAULT_FETCH_BATCH_SIZE = 100
+DEFAULT_UPSERT_BATCH_SIZE = 100
+DEFAULT_MAX_WORKERS = 8
+MAX_QUERY_TOP_K = 1000
+SCHEMA = pa.schema(
+    [
+        pa.field("id", pa.string(), nullable=False),
+        pa.field("values", pa.list_(pa.float32()), nullable=False),
+        pa.field("metadata", pa.string(), nullable=True),
+    ]
+)
+
+
+class IdSource(ABC):
+    """Define an interface for enumerating the ids in a namespace of an index."""
+
+    #: If true, the ids are yielded in the same order every time, so an export resumes by
+    #: skipping the ids of its completed parts. Otherwise, the ids of the completed parts
+    #: are read back from the export and filtered out.
+    ordered: bool = True
+
+    @abstractmethod
+    def iter_ids(self, index: Any, namespace: str, vector_count: int) -> Iterator[str]:
+        """Yield the ids in the namespace."""
+
+
+class ManifestIdSource(IdSource):
+    """
+    Read the ids from a manifest.
+
+    The manifest is a JSON lines file, or a local directory, glob, or S3 prefix of them,
+    with an 'id' and an optional 'namespace' key per line.
+    """
+
+    def __init__(self, source: str) -> None:
+        """Initialize the source."""
+        self._source = source
+
+    def iter_ids(self, index: Any, namespace: str, vector_count: int) -> Iterator[str]:
+        """Yield the ids in the namespace."""
+        for line in iter_lines(self._source):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("namespace", "") == namespace:
+                yield record["id"]
+
+
+class QueryIdSource(IdSource):
+    """
+    Discover the ids by querying the namespace with random vectors.
+
+    This is best effort: vectors that are never in the top k of a random query, i.e.
+    duplicates, are not found. Discovery stops once the vector count of the namespace is
+    reached, or after a number of queries in a row that return no new ids.
+
+    The discovered ids are kept to tell new ids apart, so memory is O(N) in the vector
+    count of the namespace. Use a manifest for namespaces with too many ids to hold.
+    """
+
+    ordered = False
+
+    def __init__(self, dimension: int, max_queries_without_new_ids: int = 10, seed: int = 0) -> None:
+        """Initialize the source."""
+        self._dimension = dimension
+        self._max_queries_without_new_ids = max_queries_without_new_ids
+        self._generator = np.random.default_rng(seed)
+
+    def iter_ids(self, index: Any, namespace: str, vector_count: int) -> Iterator[str]:
+        """Yield the ids in the namespace."""
+        found: Set[str] = set()
+        queries_without_new_ids = 0
+        while len(found) < vector_count and queries_without_new_ids < self._max_queries_without_new_ids:
+            response = index.query(
+                vector=self._generator.normal(size=self._dimension).tolist(),
+                top_k=MAX_QUERY_TOP_K,
+                namespace=namespace,
+                include_values=False,
+                include_metadata=False,
+            )
+            new_ids = [match["id"] for match in response["matches"] if match["id"] not in found]
+            queries_without_new_ids = 0 if new_ids else queries_without_new_ids + 1
+            found.update(new_ids)
+            yield from new_ids
+        if len(found) < vector_count:
+            LOGGER.warning(
+                "Only discovered %d of the %d ids in namespace '%s'. Use an id manifest for a complete export.",
+                len(found),
+                vector_count,
+                namespace,
+            )
+
+
+class TransferReport(BaseModel):
+    """Define the throughput of an export or import."""
+
+    num_vectors: int = 0
+    num_parts: int = 0
+    num_bytes: int = 0
+    seconds: float = 0
+    namespaces: Dict[str, int] = Field(
+        default_factory=dict,
+        description="The number of vectors transferred per namespace.",
+    )
+
+    @property
+    def vectors_per_second(self) -> float:
+        """Return the number of vectors transferred per second."""
+        return self.num_vectors / self.seconds if self.seconds else 0
+
+    @property
+    def mb_per_second(self) -> float:
+        """Return the MiB of Parquet transferred per second."""
+        return self.num_bytes / 2**20 / self.seconds if self.seconds else 0
+
+    def add(self, namespace: str, num_vectors: int, num_bytes: int) -> None:
+        """Add a transferred part to the report."""
+        self.num_vectors += num_vectors
+        self.num_parts += 1
+        self.num_bytes += num_bytes
+        self.namespaces[namespace] = self.namespaces.get(namespace, 0) + num_vectors
+
+
+class Checkpoint(BaseModel):
+    """Define the completed parts of an export, with their number of vectors, per namespace."""
+
+    namespaces: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    id_offsets: Dict[str, int] = Field(
+        default_factory=dict,
+        description="The number of ids of an ordered id source in the first consecutive completed parts, "
+        "per namespace.",
+    )
+
+
+def get_filesystem(uri: str) -> Tuple[fs.FileSystem, str]:
+    """Return the filesystem and path of a local path or S3 uri."""
+    if "://" not in uri:
+        uri = Path(uri).resolve().as_uri()
+    return fs.FileSystem.from_uri(uri)
+
+
+def get_namespace_directory(namespace: str) -> str:
+    """Return the directory of the parts of a namespace."""
+    return NAMESPACE_DIRECTORY_PREFIX + (quote(namespace, safe="") or DEFAULT_NAMESPACE_DIRECTORY)
+
+
+def get_part_name(part: int) -> str:
+    """Return the file name of a part."""
+    return f"part-{part:05d}.parquet"
+
+
+def get_part_number(part_name: str) -> int:
+    """Return the number of a part given its file name."""
+    return int(part_name[len("part-") : -len(".parquet")])
+
+
+def _load_checkpoint(filesystem: fs.FileSystem, root: str) -> Checkpoint:
+    path = f"{root}/{CHECKPOINT_FILE_NAME}"
+    if filesystem.get_file_info(path).type == fs.FileType.NotFound:
+        return Checkpoint()
+    with filesystem.open_input_stream(path) as stream:
+        return Checkpoint.model_validate_json(stream.read())
+
+
+def _save_checkpoint(filesystem: fs.FileSystem, root: str, checkpoint: Checkpoint) -> None:
+    with filesystem.open_output_stream(f"{root}/{CHECKPOINT_FILE_NAME}") as stream:
+        stream.write(checkpoint.model_dump_json(indent=2).encode())
+
+
+def _get_exported_ids(filesystem: fs.FileSystem, root: str, namespace: str, parts: Iterable[str]) -> Set[str]:
+    """Return the ids in the completed parts of a namespace, reading only the id column."""
+    directory = f"{root}/{get_namespace_directory(namespace)}"
+    return {
+        exported_id
+        for part in parts
+        for exported_id in pq.read_table(f"{directory}/{part}", columns=["id"], filesystem=filesystem)
+        .column("id")
+        .to_pylist()
+    }
+
+
+def _skip_exported_ids(ids: Iterator[str], namespace: str, checkpoint: Checkpoint) -> Iterator[str]:
+    """
+    Skip the ids of an ordered id source that are in the first consecutive completed parts.
+
+    Parts after them, which completed out of order, are exported again. Without an
+    offset, i.e. when the parts were exported with an unordered source, every part is.
+    """
+    completed = checkpoint.namespaces[namespace]
+    if namespace not in checkpoint.id_offsets:
+        completed.clear()
+        checkpoint.id_offsets[namespace] = 0
+    num_consecutive_parts = next(part for part in itertools.count() if get_part_name(part) not in completed)
+    for part in list(completed):
+        if get_part_number(part) >= num_consecutive_parts:
+            del completed[part]
+    if checkpoint.id_offsets[namespace]:
+        LOGGER.info("Resuming export of namespace '%s' after %d ids.", namespace, checkpoint.id_offsets[namespace])
+    return itertools.islice(ids, checkpoint.id_offsets[namespace], None)
+
+
+def _iter_chunks(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk: List[str] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _run_bounded(
+    tasks: Iterable[Callable[[], Any]],
+    max_workers: int,
+    on_result: Callable[[Any], None],
+) -> None:
+    """Run the tasks in a thread pool, with at most max_workers in flight, passing each result to on_result."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight: Set[Future] = set()
+        for task in tasks:
+            if len(in_flight) >= max_workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    on_result(future.result())
+            in_flight.add(executor.submit(propagate_context(task)))
+        for future in in_flight:
+            on_result(future.result())
+
+
+def _export_part(
+    index: Any,
+    namespace: str,
+    ids: List[str],
+    filesystem: fs.FileSystem,
+    path: str,
+    fetch_batch_size: int,
+) -> Tuple[int, int]:
+    """Fetch the vectors of a part and write them to a Parquet file, returning the number of vectors and bytes."""
+    rows: Dict[str, list] = {"id": [], "values": [], "metadata": []}
+    for batch in _iter_chunks(ids, fetch_batch_size):
+        vectors = index.fetch(ids=batch, namespace=namespace)["vectors"]
+        for vector_id in batch:
+            vector = vectors.get(vector_id)
+            if vector is None:
+                continue
+            metadata = vector.get("metadata")
+            rows["id"].append(vector_id)
+            rows["values"].append(vector["values"])
+            rows["metadata"].append(json.dumps(metadata) if metadata is not None else None)
+    table = pa.Table.from_pydict(rows, schema=SCHEMA)
+    pq.write_table(table, path, filesystem=filesystem)
+    return table.num_rows, filesystem.get_file_info(path).size
+
+
+def _export_namespace(
+    index: Any,
+    namespace: str,
+    ids: Iterable[str],
+    destination: Tuple[fs.FileSystem, str],
+    checkpoint: Checkpoint,
+    report: TransferReport,
+    part_size: int,
+    fetch_batch_size: int,
+    max_workers: int,
+) -> None:
+    """
+    Export the ids of a namespace in parallel parts, checkpointing every completed part.
+
+    Parts complete out of order, so the id offset of the namespace, if it is tracked, only
+    advances past the first consecutive completed parts.
+    """
+    filesystem, root = destination
+    directory = f"{root}/{get_namespace_directory(namespace)}"
+    filesystem.create_dir(directory, recursive=True)
+    completed = checkpoint.namespaces[namespace]
+    first_part = max((get_part_number(part) + 1 for part in completed), default=0)
+    next_part = first_part
+    num_ids_by_part: Dict[int, int] = {}
+
+    def get_task(part: int, part_ids: List[str]) -> Callable[[], Tuple[int, int, Tuple[int, int]]]:
+        path = f"{directory}/{get_part_name(part)}"
+        return lambda: (
+            part,
+            len(part_ids),
+            _export_part(index, namespace, part_ids, filesystem, path, fetch_batch_size),
+        )
+
+    def on_result(result: Tuple[int, int, Tuple[int, int]]) -> None:
+        nonlocal next_part
+        part, num_ids, (num_vectors, num_bytes) = result
+        completed[get_part_name(part)] = num_vectors
+        num_ids_by_part[part] = num_ids
+        while next_part in num_ids_by_part:
+            if namespace in checkpoint.id_offsets:
+                checkpoint.id_offsets[namespace] += num_ids_by_part[next_part]
+            del num_ids_by_part[next_part]
+            next_part += 1
+        _save_checkpoint(filesystem, root, checkpoint)
+        report.add(namespace, num_vectors, num_bytes)
+
+    tasks = (get_task(part, part_ids) for part, part_ids in enumerate(_iter_chunks(ids, part_size), first_part))
+    _run_bounded(tasks, max_workers, on_result)
+    _save_checkpoint(filesystem, root, checkpoint)
+
+
+def export_index(
+    index: Any,
+    destination: str,
+    id_source: IdSource,
+    namespaces: Optional[List[str]] = None,
+    part_size: int = DEFAULT_PART_SIZE,
+    fetch_batch_size: int = DEFAULT_FETCH_BATCH_SIZE,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> TransferReport:
+    """
+    Export the vectors of an index to Parquet files.
+
+    Args:
+        index: The pinecone.Index to export.
+        destination: A local directory or S3 uri to write the export to.
+        id_source: The source of the ids in each namespace.
+        namespaces: The namespaces to export. Defaults to every namespace in the index.
+        part_size: The number of vectors per Parquet file.
+        fetch_batch_size: The number of ids per fetch request.
+        max_workers: The number of parts fetched in parallel. At most this many parts
+            are held in memory.
+
+    Returns:
+        The throughput of the export.
+
+    """
+    start = time.perf_counter()
+    filesystem, root = get_filesystem(destination)
+    filesystem.create_dir(root, recursive=True)
+    checkpoint = _load_checkpoint(filesystem, root)
+    stats = index.describe_index_stats()
+    vector_counts = {name: summary["vector_count"] for name, summary in stats["namespaces"].items()}
+    report = TransferReport()
+    for namespace in vector_counts if namespaces is None else namespaces:
+        completed = checkpoint.namespaces.setdefault(namespace, {})
+        ids = id_source.iter_ids(index, namespace, vector_counts.get(namespace, 0))
+        if id_source.ordered:
+            ids = _skip_exported_ids(ids, namespace, checkpoint)
+        else:
+            # the offset is meaningless once ids are filtered, so an ordered source starts over
+            checkpoint.id_offsets.pop(namespace, None)
+            exported_ids = _get_exported_ids(filesystem, root, namespace, completed)
+            if exported_ids:
+                LOGGER.info("Resuming export of namespace '%s' after %d vectors.", namespace, len(exported_ids))
+            ids = (vector_id for vector_id in ids if vector_id not in exported_ids)
+        _export_namespace(
+            index,
+            namespace,
+            ids,
+            (filesystem, root),
+            checkpoint,
+            report,
+            part_size,
+            fetch_batch_size,
+            max_workers,
+        )
+    report.seconds = time.perf_counter() - start
+    LOGGER.info(
+        "Exported %d vectors in %d parts in %.1fs (%.0f vectors/s, %.1f MiB/s).",
+        report.num_vectors,
+        report.num_parts,
+        report.seconds,
+        report.vectors_per_second,
+        report.mb_per_second,
+    )
+    return report
+
+
+def _import_part(
+    index: Any,
+    namespace: str,
+    filesystem: fs.FileSystem,
+    path: str,
+    upsert_batch_size: int,
+) -> Tuple[int, int]:
+    """Upsert the vectors of a Parquet file, returning the number of vectors and bytes."""
+    num_vectors = 0
+    parquet_file = pq.ParquetFile(filesystem.open_input_file(path))
+    for batch in parquet_file.iter_batches(batch_size=upsert_batch_size):
+        vectors = []
+        for row in batch.to_pylist():
+            if row["metadata"] is None:
+                vectors.append((row["id"], row["values"]))
+            else:
+                vectors.append((row["id"], row["values"], json.loads(row["metadata"])))
+        index.upsert(vectors=vectors, namespace=namespace)
+        num_vectors += len(vectors)
+    return num_vectors, filesystem.get_file_info(path).size
+
+
+def import_index(
+    index: Any,
+    source: str,
+    namespaces: Optional[Dict[str, str]] = None,
+    upsert_batch_size: int = DEFAULT_UPSERT_BATCH_SIZE,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> TransferReport:
+    """
+    Import an export into an index.
+
+    Args:
+        index: The pinecone.Index to import into.
+        source: The local directory or S3 uri of the export.
+        namespaces: Maps the exported namespaces to import to the namespaces to import
+            them into. Defaults to every exported namespace, into the same namespace.
+        upsert_batch_size: The number of vectors per upsert request.
+        max_workers: The number of parts upserted in parallel.
+
+    Returns:
+        The throughput of the import.
+
+    """
+    start = time.perf_counter()
+    filesystem, root = get_filesystem(source)
+    checkpoint = _load_checkpoint(filesystem, root)
+    if namespaces is None:
+        namespaces = {namespace: namespace for namespace in checkpoint.namespaces}
+    report = TransferReport()
+    tasks = [
+        lambda namespace=namespace, part=part: (
+            namespaces[namespace],
+            _import_part(
+                index,
+                namespaces[namespace],
+                filesystem,
+                f"{root}/{get_namespace_directory(namespace)}/{part}",
+                upsert_batch_size,
+            ),
+        )
+        for namespace in namespaces
+        for part in sorted(checkpoint.namespaces.get(namespace, {}))
+    ]
+    _run_bounded(tasks, max_workers, lambda result: report.add(result[0], *result[1]))
+    report.seconds = time.perf_counter() - start
+    LOGGER.info(
+        "Imported %d vectors in %d parts in %.1fs (%.0f vectors/s, %.1f MiB/s).",
+        report.num_vectors,
+        report.num_parts,
+        report.seconds,
+        report.vectors_per_second,
+        report.mb_per_second,
+    )
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Export an index to Parquet, or import an export into an index, and print the throughput."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command in ("export", "import"):
+        subparser = subparsers.add_parser(command)
+        subparser.add_argument("--index", required=True, help="The name of the index.")
+        subparser.add_argument("--environment", required=True, help="The environment of the index.")
+        subparser.add_argument("--api-key-secret-name", required=True, help="Read unless PINECONE_API_KEY is set.")
+        subparser.add_argument("--namespace", action="append", help="A namespace to transfer. Defaults to all.")
+        subparser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    subparsers.choices["export"].add_argument("--destination", required=True, help="A local directory or S3 uri.")
+    subparsers.choices["export"].add_argument("--id-manifest", help="JSON lines with the ids to export.")
+    subparsers.choices["export"].add_argument("--part-size", type=int, default=DEFAULT_PART_SIZE)
+    subparsers.choices["import"].add_argument("--source", required=True, help="A local directory or S3 uri.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    pinecone.init(api_key=get_api_key(args.api_key_secret_name), environment=args.environment)
+    index = pinecone.Index(args.index)
+    if args.command == "export":
+        if args.id_manifest:
+            id_source: IdSource = ManifestIdSource(args.id_manifest)
+        else:
+            id_source = QueryIdSource(pinecone.describe_index(args.index).dimension)
+        report = export_index(
+            index,
+            args.destination,
+            id_source,
+            namespaces=args.namespace,
+            part_size=args.part_size,
+            max_workers=args.max_workers,
+        )
+    else:
+        namespaces = {namespace: namespace for namespace in args.namespace} if args.namespace else None
+        report = import_index(index, args.source, namespaces=namespaces, max_workers=args.max_workers)
+    output = {
+        **report.model_dump(),
+        "vectors_per_second": report.vectors_per_second,
+        "mb_per_second": report.mb_per_second,
+    }
+    print(json.dumps(output, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""
+Derive the minimal metadata config of an index from a sample of its records.
+
+Pinecone indexes every metadata field unless metadata_config.indexed is set, which
+uses pod memory for fields that are never filtered on. The records are streamed from
+local files or S3, the cardinality and size of every field is profiled, and only the
+fields that queries filter on are kept in the indexed list. Without filter fields, the
+profile picks them: fields with many distinct values, like ids, or with large values,
+like text, make poor filters and use the most memory, so only the others are indexed.
+
+Example:
+    python -m pinecone_constructs.aws.metadata_config --source s3://bucket/records/ --filter-field genre
+
+"""
+import argparse
+import glob
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+import boto3
+from pydantic import BaseModel, Field
+
+from .custom_resource.function.pinecone_settings import PineconeIndexSettings
+
+
+LOGGER = logging.getLogger(__name__)
+
+# rough per-entry costs of the metadata index, used to estimate the memory it uses
+POSTING_BYTES = 8
+DICTIONARY_ENTRY_BYTES = 32
+DEFAULT_MAX_RECORDS = 100_000
+DEFAULT_MAX_DISTINCT_VALUES = 100_000
+# fields with more distinct values per record, or larger values, are not worth indexing
+DEFAULT_MAX_CARDINALITY_RATIO = 0.5
+DEFAULT_MAX_VALUE_BYTES = 64
+
+
+class FieldProfile(BaseModel):
+    """Define the profile of a metadata field."""
+
+    name: str
+    num_records: int = Field(default=0, description="The number of records with the field.")
+    num_values: int = Field(default=0, description="The number of values, counting each item of a list.")
+    num_distinct_values: int = Field(default=0, description="The number of distinct values, up to the limit.")
+    total_value_bytes: int = Field(default=0, description="The total size of the values.")
+
+    @property
+    def average_value_bytes(self) -> float:
+        """Return the average size of a value."""
+        return self.total_value_bytes / self.num_values if self.num_values else 0
+
+    @property
+    def cardinality_ratio(self) -> float:
+        """Return the number of distinct values per record with the field."""
+        return self.num_distinct_values / self.num_records if self.num_records else 0
+
+    def get_exclusion_reason(self, max_cardinality_ratio: float, max_value_bytes: float) -> Optional[str]:
+        """Return why the field is not worth indexing, or None if it is."""
+        if self.cardinality_ratio > max_cardinality_ratio:
+            return f"high cardinality: {self.num_distinct_values} distinct values in {self.num_records} records"
+        if self.average_value_bytes > max_value_bytes:
+            return f"large values: {self.average_value_bytes:.0f} bytes on average"
+        return None
+
+    def get_estimated_index_bytes(self) -> float:
+        """Return the estimated memory used by the metadata index of the field, for the sampled records."""
+        posting_bytes = self.num_values * POSTING_BYTES
+        dictionary_bytes = self.num_distinct_values * (self.average_value_bytes + DICTIONARY_ENTRY_BYTES)
+        return posting_bytes + dictionary_bytes
+
+
+class MetadataProfile(BaseModel):
+    """Define the profile of the metadata of a sample of records."""
+
+    num_records: int = 0
+    fields: Dict[str, FieldProfile] = Field(default_factory=dict)
+
+
+class MetadataConfigRecommendation(BaseModel):
+    """Define the recommended metadata config, and the memory it saves."""
+
+    indexed: List[str]
+    unseen_filter_fields: List[str] = Field(
+        default_factory=list,
+        description="Filter fields that are not in any of the sampled records.",
+    )
+    excluded_fields: Dict[str, str] = Field(
+        default_factory=dict,
+        description="The sampled fields that are not indexed, and why.",
+    )
+    costly_filter_fields: Dict[str, str] = Field(
+        default_factory=dict,
+        description="Filter fields that are indexed, but have high cardinality or large values.",
+    )
+    estimated_bytes_per_vector: float = Field(
+        default=0,
+        description="The estimated metadata index memory per vector when every field is indexed.",
+    )
+    estimated_saved_bytes_per_vector: float = Field(
+        default=0,
+        description="The estimated metadata index memory per vector saved by the recommendation.",
+    )
+
+    @property
+    def estimated_saving_ratio(self) -> float:
+        """Return the estimated fraction of the metadata index memory that is saved."""
+        if not self.estimated_bytes_per_vector:
+            return 0
+        return self.estimated_saved_bytes_per_vector / self.estimated_bytes_per_vector
+
+
+def iter_lines(source: str) -> Iterator[bytes]:
+    """Stream the lines of every file in the source, which is a local path, glob, or S3 prefix."""
+    if source.startswith("s3://"):
+        bucket, _, prefix = source[len("s3://") :].partition("/")
+        client = boto3.client("s3")
+        for page in client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield from client.get_object(Bucket=bucket, Key=obj["Key"])["Body"].iter_lines()
+        return
+    path = Path(source)
+    if path.is_dir():
+        paths = sorted(file for file in path.rglob("*") if file.is_file())
+    elif path.is_file():
+        paths = [path]
+    else:
+        paths = sorted(Path(file) for file in glob.glob(source))
+    for path in paths:
+        with path.open("rb") as file:
+            yield from file
+
+
+def iter_records(source: str) -> Iterator[dict]:
+    """
+    Stream the metadata of the records in JSON lines files.
+
+    Records in the format of a pinecone upsert, i.e. with id, values and metadata keys,
+    yield their metadata. Any other object is treated as the metadata itself, and lines
+    that are not objects, or not valid JSON, e.g. truncated, are skipped.
+    """
+    for line in iter_lines(source):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = None
+        if not isinstance(record, dict):
+            LOGGER.warning("Skipping a line that is not a JSON object: %.80s", line)
+            continue
+        if isinstance(record.get("metadata"), dict) and "values" in record:
+            yield record["metadata"]
+        else:
+            yield record
+
+
+def profile_metadata(
+    records: Iterable[dict],
+    max_records: int = DEFAULT_MAX_RECORDS,
+    max_distinct_values: int = DEFAULT_MAX_DISTINCT_VALUES,
+) -> MetadataProfile:
+    """
+    Profile the cardinality and size of every metadata field.
+
+    Args:
+        records: The metadata of the records.
+        max_records: The maximum number of records to sample.
+        max_distinct_values: The maximum number of distinct values to track per field,
+            which bounds the memory used by the profile.
+
+    Returns:
+        The metadata profile.
+
+    """
+    profile = MetadataProfile()
+    distinct_values: Dict[str, Set[str]] = {}
+    for metadata in records:
+        if profile.num_records >= max_records:
+            break
+        profile.num_records += 1
+        for name, value in metadata.items():
+            field_profile = profile.fields.setdefault(name, FieldProfile(name=name))
+            field_values = distinct_values.setdefault(name, set())
+            field_profile.num_records += 1
+            # pinecone indexes every item of a list of strings separately
+            for item in value if isinstance(value, list) else [value]:
+                encoded = json.dumps(item)
+                field_profile.num_values += 1
+                field_profile.total_value_bytes += len(encoded.encode())
+                if len(field_values) < max_distinct_values:
+                    field_values.add(encoded)
+            field_profile.num_distinct_values = len(field_values)
+    return profile
+
+
+def recommend_metadata_config(
+    profile: MetadataProfile,
+    filter_fields: Optional[Iterable[str]] = None,
+    max_cardinality_ratio: float = DEFAULT_MAX_CARDINALITY_RATIO,
+    max_value_bytes: float = DEFAULT_MAX_VALUE_BYTES,
+) -> MetadataConfigRecommendation:
+    """
+    Recommend the minimal metadata config that still supports the filter fields.
+
+    The filter fields are always indexed, so queries keep working, but the ones with
+    high cardinality or large values are reported as costly. Without filter fields, the
+    sampled fields that have neither are indexed.
+
+    Args:
+        profile: The metadata profile of a sample of the records.
+        filter_fields: The fields that queries filter on, or None to pick them from the profile.
+        max_cardinality_ratio: The maximum number of distinct values per record of an indexed field.
+        max_value_bytes: The maximum average value size of an indexed field.
+
+    Returns:
+        The recommendation.
+
+    """
+    exclusion_reasons = {
+        name: field.get_exclusion_reason(max_cardinality_ratio, max_value_bytes)
+        for name, field in profile.fields.items()
+    }
+    if filter_fields is None:
+        indexed = sorted(name for name, reason in exclusion_reasons.items() if reason is None)
+    else:
+        indexed = sorted(set(filter_fields))
+    num_records = max(profile.num_records, 1)
+    total_bytes = sum(field.get_estimated_index_bytes() for field in profile.fields.values())
+    saved_bytes = sum(
+        field.get_estimated_index_bytes() for name, field in profile.fields.items() if name not in indexed
+    )
+    return MetadataConfigRecommendation(
+        indexed=indexed,
+        unseen_filter_fields=[name for name in indexed if name not in profile.fields],
+        excluded_fields={
+            name: reason or "not filtered on" for name, reason in sorted(exclusion_reasons.items()) if name not in indexed
+        },
+        costly_filter_fields={
+            name: reason for name, reason in sorted(exclusion_reasons.items()) if name in indexed and reason
+        },
+        estimated_bytes_per_vector=total_bytes / num_records,
+        estimated_saved_bytes_per_vector=saved_bytes / num_records,
+    )
+
+
+def optimize_metadata_config(
+    index_settings: PineconeIndexSettings,
+    source: str,
+    filter_fields: Optional[Iterable[str]] = None,
+    max_records: int = DEFAULT_MAX_RECORDS,
+) -> PineconeIndexSettings:
+    """
+    Return a copy of the index settings with the recommended metadata config.
+
+    This is meant to be called while synthesizing the app, i.e.
+
+        PineconeIndex(self, "Index", optimize_metadata_config(settings, "records.jsonl", ["genre"]))
+
+    Args:
+        index_settings: The settings of the index.
+        source: A local path, glob, or S3 prefix of JSON lines files with sample records.
+        filter_fields: The fields that queries filter on, or None to pick them from the profile.
+        max_records: The maximum number of records to sample.
+
+    Returns:
+        The index settings with the recommended metadata config.
+
+    """
+    profile = profile_metadata(iter_records(source), max_records=max_records)
+    recommendation = recommend_metadata_config(profile, filter_fields)
+    LOGGER.info(
+        "Indexing metadata fields %s of index '%s' saves an estimated %.0f bytes per vector (%.0f%%).",
+        recommendation.indexed,
+        index_settings.name,
+        recommendation.estimated_saved_bytes_per_vector,
+        recommendation.estimated_saving_ratio * 100,
+    )
+    for name in recommendation.unseen_filter_fields:
+        LOGGER.warning("Filter field '%s' is not in any of the sampled records.", name)
+    for name, reason in recommendation.costly_filter_fields.items():
+        LOGGER.warning("Filter field '%s' is costly to index (%s).", name, reason)
+    return index_settings.model_copy(update={"metadata_config": {"indexed": recommendation.indexed}})
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Print the recommended metadata config as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", required=True, help="A local path, glob, or S3 prefix of JSON lines files.")
+    parser.add_argument(
+        "--filter-field",
+        action="append",
+        help="A field that queries filter on. Without any, the fields are picked from the profile.",
+    )
+    parser.add_argument("--max-records", type=int, default=DEFAULT_MAX_RECORDS)
+    args = parser.parse_args(argv)
+    profile = profile_metadata(iter_records(args.source), max_records=args.max_records)
+    recommendation = recommend_metadata_config(profile, args.filter_field)
+    output = {
+        "metadata_config": {"indexed": recommendation.indexed},
+        "num_sampled_records": profile.num_records,
+        "fields": {
+            name: field.model_dump(exclude={"name"}) for name, field in sorted(profile.fields.items())
+        },
+        **recommendation.model_dump(exclude={"indexed"}),
+        "estimated_saving_ratio": recommendation.estimated_saving_ratio,
+    }
+    print(json.dumps(output, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
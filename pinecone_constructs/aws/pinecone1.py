@@ -7,6 +7,7 @@ from pydantic import BaseModel, Field, model_validator, validator
 from pydantic_settings import BaseSettings
 from typing_extensions import TypedDict
 from aws_lambda_powertools.utilities.typing import LambdaContext
+from .custom_resource.function.tracing import tracer
 
 
 class PineconeDBSetupCustomResource(CustomResourceInterface):
@@ -19,19 +20,22 @@ class PineconeDBSetupCustomResource(CustomResourceInterface):
         settings: PineconeDBSettings,
     ) -> None:
         super().__init__(event, context)
-        password = self.get_secret(settings.api_key_secret_name)
+        with tracer.span("secretsmanager.get_secret"):
+            password = self.get_secret(settings.api_key_secret_name)
         assert isinstance(password, str), "Pinecone API key must be a string."
         self._settings = settings
-        pinecone.init(
-            api_key=password,
-            environment=settings.environment,
-        )
+        with tracer.span("pinecone.init", environment=settings.environment):
+            pinecone.init(
+                api_key=password,
+                environment=settings.environment,
+            )
         self._index_name_prefix = (
             f"{self._stack_name[:NUM_CHARS_TO_USE_FROM_STACK_NAME]}-"
             f"{self._stack_name_hash[:NUM_CHARS_TO_USE_FROM_STACK_NAME_HASH]}-"
         )
         self._add_stack_namespace_to_index_names()
 
+    @tracer.traced("get_managed_index_names")
     def _get_managed_index_names(self) -> Set[str]:
         """Get the managed index names."""
         index_names: List[str] = pinecone.list_indexes()
@@ -72,6 +76,7 @@ class PineconeDBSetupCustomResource(CustomResourceInterface):
         for index in managed_index_names:
             self._delete_index(index)
 
+    @tracer.traced("create_index")
     def _create_index(self, index_settings: PineconeIndexConfig) -> None:
         logger.info(f"Creating index '{index_settings.name}'")
         pinecone_options = index_settings.model_dump(
@@ -83,6 +88,7 @@ class PineconeDBSetupCustomResource(CustomResourceInterface):
             **pinecone_options,
         )
 
+    @tracer.traced("update_index")
     def _update_index(self, index_settings: PineconeIndexConfig) -> None:
         self._validate_update_operation(index_settings)
         self._run_operation_with_retry(
@@ -92,6 +98,7 @@ class PineconeDBSetupCustomResource(CustomResourceInterface):
             index_settings.pod_type,
         )
 
+    @tracer.traced("validate_update_operation")
     def _validate_update_operation(self, index_settings: PineconeIndexConfig) -> None:
         pod_type = pinecone.describe_index(index_settings.name).pod_type
         current_pod_size = self._get_pod_size(pod_type)
@@ -113,6 +120,7 @@ class PineconeDBSetupCustomResource(CustomResourceInterface):
         """Pod type is in the format s1.x1, so we need to split and get the number."""
         return int(pod_type.split(".")[1][1:])
 
+    @tracer.traced("delete_index")
     def _delete_index(self, index: str) -> None:
         if self._can_delete_index(index):
             self._run_operation_with_retry(
@@ -120,6 +128,7 @@ class PineconeDBSetupCustomResource(CustomResourceInterface):
                 index,
             )
 
+    @tracer.traced("can_delete_index")
     def _can_delete_index(self, index_name: str) -> bool:
         """Validate that the index can be deleted."""
         try:
@@ -144,5 +153,6 @@ class PineconeDBSetupCustomResource(CustomResourceInterface):
         logger.info(f"Index {index} can be deleted.")
         return True
 
+    @tracer.traced("create_snapshot")
     def _create_snapshot(self, index_name: str) -> None:
         pinecone.create_collection(name=f"{index_name}_snapshot", source=index_name)
@@ -0,0 +1,383 @@
+"""
+Preview the changes a deploy would make to the managed Pinecone indexes.
+
+The app is synthesized without bundling to load the index settings of every
+PineconeIndex construct, so the index names are computed exactly as they are
+on deploy. The live state of the indexes is then read through a backend and
+compared against the settings, without a CloudFormation round trip.
+
+Example:
+    python -m pinecone_constructs.aws.plan --app pinecone_constructs/examples/aws/app.py
+
+"""
+import argparse
+import json
+import os
+import runpy
+import sys
+import tempfile
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from enum import Enum
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple
+
+import boto3
+import pinecone
+from pydantic import BaseModel, Field
+
+from .credentials import get_api_key
+from .custom_resource.function.pinecone import PineconeIndex
+from .custom_resource.function.pinecone_settings import PineconeIndexSettings, RemovalPolicy
+from .custom_resource.function.pool import (
+    DynamoDBIndexPoolStore,
+    IndexPoolStore,
+    InMemoryIndexPoolStore,
+    resolve_leased_index_names,
+)
+from .custom_resource.function.validation import get_update_validation_errors
+
+
+if TYPE_CHECKING:
+    from .construct import PineconeIndex as PineconeIndexConstruct
+
+
+class IndexState(BaseModel):
+    """Define the live state of an index."""
+
+    name: str
+    dimension: int
+    metric: str
+    pods: int
+    replicas: int
+    pod_type: str
+    total_vector_count: int = 0
+
+
+class IndexStateBackend(ABC):
+    """Define an interface for reading the live state of the indexes in a Pinecone project."""
+
+    @abstractmethod
+    def list_indexes(self) -> List[str]:
+        """Return the names of the indexes."""
+
+    @abstractmethod
+    def describe_index(self, name: str) -> IndexState:
+        """Return the state of the index."""
+
+    @abstractmethod
+    def list_collections(self) -> List[str]:
+        """Return the names of the collections."""
+
+
+class PineconeBackend(IndexStateBackend):
+    """Read the live state of the indexes from Pinecone."""
+
+    def __init__(self, api_key: str, environment: str) -> None:
+        """Initialize the backend."""
+        pinecone.init(api_key=api_key, environment=environment)
+
+    def list_indexes(self) -> List[str]:
+        """Return the names of the indexes."""
+        return pinecone.list_indexes()
+
+    def describe_index(self, name: str) -> IndexState:
+        """Return the state of the index."""
+        description = pinecone.describe_index(name)
+        stats = pinecone.Index(name).describe_index_stats()
+        return IndexState(
+            name=name,
+            dimension=description.dimension,
+            metric=description.metric,
+            pods=description.pods,
+            replicas=description.replicas,
+            pod_type=description.pod_type,
+            total_vector_count=stats["total_vector_count"],
+        )
+
+    def list_collections(self) -> List[str]:
+        """Return the names of the collections."""
+        return pinecone.list_collections()
+
+
+class InMemoryBackend(IndexStateBackend):
+    """Serve the state of the indexes from memory, i.e. for tests."""
+
+    def __init__(
+        self,
+        indexes: Optional[List[IndexState]] = None,
+        collections: Optional[List[str]] = None,
+    ) -> None:
+        """Initialize the backend."""
+        self.indexes = {index.name: index for index in indexes or []}
+        self.collections = list(collections or [])
+
+    def list_indexes(self) -> List[str]:
+        """Return the names of the indexes."""
+        return list(self.indexes)
+
+    def describe_index(self, name: str) -> IndexState:
+        """Return the state of the index."""
+        return self.indexes[name]
+
+    def list_collections(self) -> List[str]:
+        """Return the names of the collections."""
+        return list(self.collections)
+
+
+class PlannedAction(str, Enum):
+    """Define the actions a deploy can take on an index."""
+
+    CREATE = "create"
+    CONFIGURE = "configure"
+    NO_CHANGE = "no-change"
+    SNAPSHOT = "snapshot"
+    DELETE = "delete"
+    RETAIN = "retain"
+
+
+class PlannedChange(BaseModel):
+    """Define the change a deploy would make to an index."""
+
+    index_name: str
+    action: PlannedAction
+    details: List[str] = Field(default_factory=list)
+    errors: List[str] = Field(default_factory=list)
+
+
+def _plan_update(
+    index_settings: PineconeIndexSettings,
+    state: IndexState,
+) -> PlannedChange:
+    """Plan the update of an existing index."""
+    change = PlannedChange(index_name=index_settings.name, action=PlannedAction.NO_CHANGE)
+    for key, value in {"dimension": index_settings.dimension, "metric": index_settings.metric}.items():
+        if getattr(state, key) != value:
+            change.errors.append(
+                f"Cannot change {key} of an existing index from '{getattr(state, key)}' to '{value}'"
+            )
+    change.errors.extend(get_update_validation_errors(state.pod_type, index_settings))
+    pod_type = PineconeIndex.get_pod_type(index_settings)
+    for key, value in {"replicas": index_settings.replicas, "pod_type": pod_type}.items():
+        if getattr(state, key) != value:
+            change.action = PlannedAction.CONFIGURE
+            change.details.append(f"{key}: '{getattr(state, key)}' -> '{value}'")
+    if state.pods != index_settings.pods:
+        change.details.append(f"pods: '{state.pods}' -> '{index_settings.pods}' is not applied by an update")
+    return change
+
+
+def _plan_delete(
+    index_settings: PineconeIndexSettings,
+    state: IndexState,
+    collections: List[str],
+) -> List[PlannedChange]:
+    """Plan the deletion of an index, mirroring the removal policy handling of the provider."""
+    name = index_settings.name
+    removal_policy = index_settings.removal_policy
+    if removal_policy == RemovalPolicy.RETAIN.value:
+        details = [f"removal policy is {removal_policy}"]
+        return [PlannedChange(index_name=name, action=PlannedAction.RETAIN, details=details)]
+    if removal_policy == RemovalPolicy.RETAIN_ON_UPDATE_OR_DELETE.value and state.total_vector_count > 0:
+        details = [f"removal policy is {removal_policy} and the index has {state.total_vector_count} vectors"]
+        return [PlannedChange(index_name=name, action=PlannedAction.RETAIN, details=details)]
+    changes = []
+    if removal_policy == RemovalPolicy.SNAPSHOT.value:
+        details = [f"collection '{name}_snapshot'"]
+        snapshot = PlannedChange(index_name=name, action=PlannedAction.SNAPSHOT, details=details)
+        if f"{name}_snapshot" in collections:
+            snapshot.errors.append(f"Collection '{name}_snapshot' already exists")
+        changes.append(snapshot)
+    changes.append(PlannedChange(index_name=name, action=PlannedAction.DELETE))
+    return changes
+
+
+def plan_changes(
+    index_settings: List[PineconeIndexSettings],
+    backend: IndexStateBackend,
+    managed_index_prefixes: Sequence[str] = (),
+    destroy: bool = False,
+) -> List[PlannedChange]:
+    """
+    Plan the changes a deploy would make to the indexes in a Pinecone project.
+
+    Args:
+        index_settings: The settings of the indexes, with their deployed names.
+        backend: The backend to read the live state of the indexes from.
+        managed_index_prefixes: Prefixes of the index names managed by the app. Live
+            indexes with one of these prefixes and no settings will be deleted.
+        destroy: If true, plan the deletion of every index instead of a deploy.
+
+    Returns:
+        The planned changes.
+
+    """
+    live_names = set(backend.list_indexes())
+    collections = backend.list_collections()
+    changes: List[PlannedChange] = []
+    names = [settings.name for settings in index_settings]
+    for settings in index_settings:
+        if settings.name not in live_names:
+            action = PlannedAction.NO_CHANGE if destroy else PlannedAction.CREATE
+            planned = [PlannedChange(index_name=settings.name, action=action)]
+            if settings.source_collection and settings.source_collection not in collections:
+                planned[0].errors.append(f"Source collection '{settings.source_collection}' does not exist")
+        elif destroy:
+            planned = _plan_delete(settings, backend.describe_index(settings.name), collections)
+        else:
+            planned = [_plan_update(settings, backend.describe_index(settings.name))]
+        if names.count(settings.name) > 1:
+            planned[0].errors.append("Index name is used by more than one index")
+        changes.extend(planned)
+    prefixes = tuple(managed_index_prefixes)
+    for name in sorted(live_names - set(names)):
+        if prefixes and name.startswith(prefixes):
+            details = ["no longer in the app, deleted according to the removal policy it was deployed with"]
+            changes.append(PlannedChange(index_name=name, action=PlannedAction.DELETE, details=details))
+    return changes
+
+
+def load_app(app_path: str) -> List["PineconeIndexConstruct"]:
+    """
+    Run a CDK app and return its PineconeIndex constructs.
+
+    Bundling is skipped and the cloud assembly is written to a temporary directory,
+    so loading the app takes seconds and does not need docker. The CDK context and
+    output directory are read from the environment when the jsii runtime starts, so
+    aws_cdk must not be imported before this is called. The environment is restored
+    afterwards.
+
+    Args:
+        app_path: The path to the python file that defines the app.
+
+    Returns:
+        The PineconeIndex constructs in the app.
+
+    """
+    previous_environment = {name: os.environ.get(name) for name in ("CDK_CONTEXT_JSON", "CDK_OUTDIR")}
+    context = json.loads(previous_environment["CDK_CONTEXT_JSON"] or "{}")
+    context["aws:cdk:bundling-stacks"] = []
+    try:
+        with tempfile.TemporaryDirectory() as outdir:
+            os.environ["CDK_CONTEXT_JSON"] = json.dumps(context)
+            os.environ["CDK_OUTDIR"] = outdir
+            # pylint: disable=import-outside-toplevel
+            from aws_cdk import App
+            from .construct import PineconeIndex as PineconeIndexConstruct
+
+            app_globals = runpy.run_path(app_path, run_name="__main__")
+    finally:
+        for name, value in previous_environment.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    apps = [value for value in app_globals.values() if isinstance(value, App)]
+    return [
+        construct
+        for app in apps
+        for construct in app.node.find_all()
+        if isinstance(construct, PineconeIndexConstruct)
+    ]
+
+
+def get_index_pool_store(table_name_parameter_name: str) -> IndexPoolStore:
+    """Return the store of a deployed index pool, or an empty store if the pool is not deployed yet."""
+    client = boto3.client("ssm")
+    try:
+        table_name = client.get_parameter(Name=table_name_parameter_name)["Parameter"]["Value"]
+    except client.exceptions.ParameterNotFound:
+        return InMemoryIndexPoolStore()
+    return DynamoDBIndexPoolStore(table_name)
+
+
+def plan_app(
+    constructs: List["PineconeIndexConstruct"],
+    get_backend: Callable[[str, str], IndexStateBackend],
+    destroy: bool = False,
+    get_pool_store: Callable[[str], IndexPoolStore] = get_index_pool_store,
+) -> List[PlannedChange]:
+    """
+    Plan the changes for every index in the app.
+
+    Indexes leased from a pool are planned under the name of the pool index they
+    leased, which is looked up in the pool table. The name of the table is read from
+    the SSM parameter the pool publishes it to.
+
+    Args:
+        constructs: The PineconeIndex constructs in the app.
+        get_backend: Returns a backend given an api key secret name and environment.
+        destroy: If true, plan the deletion of every index instead of a deploy.
+        get_pool_store: Returns the store of an index pool given the name of its table name parameter.
+
+    Returns:
+        The planned changes.
+
+    """
+    projects: Dict[Tuple[str, str], List[PineconeIndexSettings]] = defaultdict(list)
+    prefixes: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+    leased_names = set()
+    for construct in constructs:
+        environment_settings = [
+            environment_settings
+            for index_settings in construct.index_settings
+            for environment_settings in index_settings.get_environment_settings()
+        ]
+        if construct.index_pool is not None:
+            synthesized_names = [index_settings.name for index_settings in environment_settings]
+            environment_settings = resolve_leased_index_names(
+                environment_settings,
+                get_pool_store(construct.index_pool.table_name_parameter_name),
+            )
+            leased_names.update(
+                index_settings.name
+                for index_settings, name in zip(environment_settings, synthesized_names)
+                if index_settings.name != name
+            )
+        for index_settings in environment_settings:
+            project = (index_settings.api_key_secret_name, index_settings.environment)
+            projects[project].append(index_settings)
+            prefixes[project].append(construct.index_name_prefix)
+    changes = []
+    for (secret_name, environment), index_settings in projects.items():
+        backend = get_backend(secret_name, environment)
+        changes.extend(plan_changes(index_settings, backend, prefixes[(secret_name, environment)], destroy))
+    for change in changes:
+        if change.index_name in leased_names and change.action == PlannedAction.DELETE:
+            change.details.append("leased from the pool, so it is cleared and returned to it instead")
+    return changes
+
+
+def format_plan(changes: List[PlannedChange]) -> str:
+    """Format the planned changes for the terminal."""
+    lines = []
+    for change in changes:
+        lines.append(f"{change.action.value:>10}  {change.index_name}")
+        lines.extend(f"{'':>12}{detail}" for detail in change.details)
+        lines.extend(f"{'':>12}ERROR: {error}" for error in change.errors)
+    num_errors = sum(len(change.errors) for change in changes)
+    lines.append(f"\n{len(changes)} planned changes, {num_errors} validation errors.")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Print the planned changes, returning a non-zero exit code if any are invalid."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", required=True, help="The path to the python file that defines the CDK app.")
+    parser.add_argument("--destroy", action="store_true", help="Plan the deletion of every index.")
+    parser.add_argument("--json", action="store_true", help="Print the plan as JSON.")
+    args = parser.parse_args(argv)
+    constructs = load_app(args.app)
+    changes = plan_app(
+        constructs,
+        lambda secret_name, environment: PineconeBackend(get_api_key(secret_name), environment),
+        destroy=args.destroy,
+    )
+    if args.json:
+        print(json.dumps([change.model_dump(mode="json") for change in changes], indent=2))
+    else:
+        print(format_plan(changes))
+    return 1 if any(change.errors for change in changes) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
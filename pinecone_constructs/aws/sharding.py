@@ -0,0 +1,250 @@
+"""
+Route the vectors of a tenant-sharded index set to the index that owns them.
+
+A single index is limited to a couple of pods. A ShardedPineconeIndex provisions a
+number of identical indexes, the shards, and publishes a shard map that says which
+shard owns each vector. The router reads the shard map, upserts, fetches and deletes
+on the owning shard, and fans queries out across the shards in parallel, merging
+their matches into a single top k.
+
+With the consistent hash layout, the id of each vector is hashed onto a ring of
+virtual nodes, so vectors are spread evenly and adding a shard only moves the ids of
+about one shard's share of the vectors. With the tenant layout, every vector of a
+tenant is on one shard, i.e. the one assigned to it in the shard map, or its consistent
+hash, in a namespace named after the tenant. A tenant's operations are scoped to its
+namespace, so they never read or delete the vectors of other tenants on the shard.
+
+Example:
+    router = ShardRouter.from_parameter("/pinecone/my-index/shard-map")
+    router.upsert(vectors=[("id", embedding, {"genre": "drama"})])
+    router.query(vector=embedding, top_k=10, include_metadata=True)
+
+"""
+import bisect
+import heapq
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import md5
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import boto3
+import pinecone
+
+from .custom_resource.function.pinecone_settings import DistanceMetric, ShardLayout, ShardMap
+from .custom_resource.function.tracing import propagate_context
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(md5(key.encode()).digest()[:8], "big")
+
+
+class ConsistentHashRing:
+    """
+    Map keys onto shards with a hash ring of virtual nodes.
+
+    The points of a shard only depend on its position, so renaming the shards does not
+    move any keys, and adding a shard only moves the keys that hash next to its points.
+    """
+
+    def __init__(self, num_shards: int, virtual_nodes: int = 64) -> None:
+        """Initialize the ring."""
+        points = sorted(
+            (_hash(f"shard-{shard}#{node}"), shard) for shard in range(num_shards) for node in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def get_shard(self, key: str) -> int:
+        """Return the shard that owns the key."""
+        position = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._shards[position]
+
+
+def merge_matches(results: Sequence[Sequence[Any]], top_k: int, metric: str) -> List[Any]:
+    """
+    Merge the matches of several shards into a single top k.
+
+    The euclidean score is a distance, so lower scores rank first, while the cosine and
+    dot product scores are similarities, so higher scores rank first.
+    """
+    matches = [match for result in results for match in result]
+    if metric == DistanceMetric.EUCLIDEAN.value:
+        return heapq.nsmallest(top_k, matches, key=lambda match: match["score"])
+    return heapq.nlargest(top_k, matches, key=lambda match: match["score"])
+
+
+def _get_id(vector: Any) -> str:
+    """Return the id of a vector, either in the tuple or the dict format of a pinecone upsert."""
+    return vector["id"] if isinstance(vector, dict) else vector[0]
+
+
+class ShardRouter:
+    """
+    Route the operations of a sharded index set to its shards.
+
+    This has the interface of a pinecone.Index, so it can stand in for a single index,
+    i.e. be wrapped in a ProjectedIndex. With the tenant layout, every call takes the
+    tenant, and the namespace is the tenant. With the consistent hash layout, calls
+    take no tenant.
+    """
+
+    def __init__(
+        self,
+        shard_map: ShardMap,
+        get_index: Callable[[str], Any] = pinecone.Index,
+        max_workers: Optional[int] = None,
+    ) -> None:
+        """
+        Initialize the router.
+
+        Args:
+            shard_map: The shard map of the index set.
+            get_index: Returns the client of a shard by name. Defaults to pinecone.Index,
+                which requires pinecone.init to be called for the project first.
+            max_workers: The number of shards to call in parallel. Defaults to all of them.
+
+        """
+        self.shard_map = shard_map
+        self._indexes = [get_index(name) for name in shard_map.index_names]
+        self._ring = ConsistentHashRing(len(shard_map.index_names), shard_map.virtual_nodes)
+        self._max_workers = max_workers or len(self._indexes)
+
+    @classmethod
+    def from_parameter(cls, parameter_name: str, **kwargs) -> "ShardRouter":
+        """Create a router from the shard map published to an SSM parameter."""
+        value = boto3.client("ssm").get_parameter(Name=parameter_name)["Parameter"]["Value"]
+        return cls(ShardMap.model_validate_json(value), **kwargs)
+
+    def get_shard(self, vector_id: str, tenant: Optional[str] = None) -> int:
+        """Return the shard that owns a vector, or every vector of a tenant with the tenant layout."""
+        if self.shard_map.layout == ShardLayout.TENANT.value:
+            assert tenant is not None, "The tenant layout requires a tenant"
+            if tenant in self.shard_map.tenant_shards:
+                return self.shard_map.tenant_shards[tenant]
+            return self._ring.get_shard(tenant)
+        assert tenant is None, f"A tenant is only used with the tenant layout, not '{self.shard_map.layout}'"
+        return self._ring.get_shard(vector_id)
+
+    def upsert(self, vectors: List[Any], tenant: Optional[str] = None, **kwargs) -> Dict[str, int]:
+        """Upsert each vector to the shard that owns it, calling the shards in parallel."""
+        kwargs = self._scope_to_tenant(tenant, kwargs)
+        shard_vectors = self._group_by_shard(vectors, _get_id, tenant)
+        responses = self._run(
+            {
+                shard: (self._indexes[shard].upsert, {"vectors": batch, **kwargs})
+                for shard, batch in shard_vectors.items()
+            }
+        )
+        return {"upserted_count": sum(response["upserted_count"] for response in responses.values())}
+
+    def fetch(self, ids: List[str], tenant: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """Fetch each vector from the shard that owns it."""
+        kwargs = self._scope_to_tenant(tenant, kwargs)
+        shard_ids = self._group_by_shard(ids, lambda vector_id: vector_id, tenant)
+        responses = self._run(
+            {shard: (self._indexes[shard].fetch, {"ids": batch, **kwargs}) for shard, batch in shard_ids.items()}
+        )
+        return {
+            "namespace": kwargs.get("namespace", ""),
+            "vectors": {key: value for response in responses.values() for key, value in response["vectors"].items()},
+        }
+
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        delete_all: bool = False,
+        tenant: Optional[str] = None,
+        **kwargs,
+    ) -> None:
+        """
+        Delete each vector from the shard that owns it, or delete by filter or all.
+
+        Without ids, every shard is deleted from, or with the tenant layout, only the
+        namespace of the tenant on its shard.
+        """
+        kwargs = self._scope_to_tenant(tenant, kwargs)
+        if ids is None:
+            self._run(
+                {
+                    shard: (self._indexes[shard].delete, {"delete_all": delete_all, **kwargs})
+                    for shard in self._get_shards(tenant)
+                }
+            )
+            return
+        shard_ids = self._group_by_shard(ids, lambda vector_id: vector_id, tenant)
+        self._run(
+            {shard: (self._indexes[shard].delete, {"ids": batch, **kwargs}) for shard, batch in shard_ids.items()}
+        )
+
+    def query(self, top_k: int, tenant: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Query the shards in parallel, and merge their matches into a single top k.
+
+        Every shard returns its own top k, so the merged matches are exactly the top k of
+        the index set. With the tenant layout, only the namespace of the tenant on its
+        shard is queried.
+        """
+        kwargs = self._scope_to_tenant(tenant, kwargs)
+        responses = self._run(
+            {shard: (self._indexes[shard].query, {"top_k": top_k, **kwargs}) for shard in self._get_shards(tenant)}
+        )
+        return {
+            "namespace": kwargs.get("namespace", ""),
+            "matches": merge_matches(
+                [response["matches"] for response in responses.values()],
+                top_k,
+                self.shard_map.metric,
+            ),
+        }
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        """Return the vector count of the index set, and of each of its shards."""
+        shards = range(len(self._indexes))
+        responses = self._run({shard: (self._indexes[shard].describe_index_stats, {}) for shard in shards})
+        return {
+            "total_vector_count": sum(response["total_vector_count"] for response in responses.values()),
+            "shards": {
+                self.shard_map.index_names[shard]: response["total_vector_count"]
+                for shard, response in responses.items()
+            },
+        }
+
+    def _scope_to_tenant(self, tenant: Optional[str], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Set the namespace of a call to the tenant with the tenant layout."""
+        if self.shard_map.layout != ShardLayout.TENANT.value:
+            assert tenant is None, f"A tenant is only used with the tenant layout, not '{self.shard_map.layout}'"
+            return kwargs
+        assert tenant is not None, "The tenant layout requires a tenant"
+        namespace = kwargs.get("namespace", tenant)
+        assert namespace == tenant, f"The namespace '{namespace}' of tenant '{tenant}' must be the tenant"
+        return {**kwargs, "namespace": tenant}
+
+    def _get_shards(self, tenant: Optional[str]) -> List[int]:
+        """Return the shard of the tenant with the tenant layout, or else every shard."""
+        if self.shard_map.layout == ShardLayout.TENANT.value:
+            return [self.get_shard("", tenant)]
+        return list(range(len(self._indexes)))
+
+    def _group_by_shard(
+        self,
+        items: List[Any],
+        get_id: Callable[[Any], str],
+        tenant: Optional[str],
+    ) -> Dict[int, List[Any]]:
+        shard_items: Dict[int, List[Any]] = defaultdict(list)
+        for item in items:
+            shard_items[self.get_shard(get_id(item), tenant)].append(item)
+        return shard_items
+
+    def _run(self, calls: Dict[int, Tuple[Callable, Dict[str, Any]]]) -> Dict[int, Any]:
+        """Make a call on each shard in parallel, raising the first error."""
+        if not calls:
+            return {}
+        if len(calls) == 1:
+            ((shard, (function, kwargs)),) = calls.items()
+            return {shard: function(**kwargs)}
+        with ThreadPoolExecutor(max_workers=min(self._max_workers, len(calls))) as executor:
+            futures = {
+                shard: executor.submit(propagate_context(function), **kwargs) for shard, (function, kwargs) in calls.items()
+            }
+            return {shard: future.result() for shard, future in futures.items()}
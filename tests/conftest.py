@@ -0,0 +1,108 @@
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from pinecone_constructs.aws.custom_resource.function import pinecone as pinecone_module
+
+
+class FakeIndexClient:
+    """Hold the vector counts of a fake index, per namespace."""
+
+    def __init__(self, namespaces: Optional[Dict[str, int]] = None):
+        self.namespaces = dict(namespaces or {})
+
+    def describe_index_stats(self):
+        return {
+            "namespaces": {name: {"vector_count": count} for name, count in self.namespaces.items()},
+            "total_vector_count": sum(self.namespaces.values()),
+        }
+
+    def delete(self, delete_all, namespace):
+        assert delete_all
+        del self.namespaces[namespace]
+
+
+class FakePinecone:
+    """
+    Stand in for the functions of the pinecone client, with in-memory indexes.
+
+    Indexes are kept per environment, i.e. the one the client was last initialized for.
+    Each index has a list of states, and every describe returns the first state that was
+    not returned yet, staying in the last one. Created indexes are Ready.
+    """
+
+    def __init__(self):
+        self.config = SimpleNamespace(PROJECT_NAME="project", environment=None)
+        self.environments: Dict[Optional[str], Dict[str, SimpleNamespace]] = defaultdict(dict)
+        self.clients: Dict[str, Any] = {}
+        self.calls: List[str] = []
+        self.errors: Dict[str, List[Exception]] = defaultdict(list)
+        self.failing_environments: Dict[str, Exception] = {}
+
+    @property
+    def indexes(self) -> Dict[str, SimpleNamespace]:
+        """Return the indexes of the current environment."""
+        return self.environments[self.config.environment]
+
+    def add_index(self, name, dimension, metric="cosine", pods=1, replicas=1, pod_type="p1.x1", **kwargs):
+        """Add an index to an environment, by default the current one, with the states it is described in."""
+        states = kwargs.get("states", ["Ready"])
+        environment = kwargs.get("environment", self.config.environment)
+        self.environments[environment][name] = SimpleNamespace(
+            name=name,
+            dimension=dimension,
+            metric=metric,
+            pods=pods,
+            replicas=replicas,
+            pod_type=pod_type,
+            states=list(states),
+            status=None,
+        )
+
+    def init(self, api_key, environment):
+        self.config.environment = environment
+
+    def list_indexes(self):
+        self._call("list_indexes")
+        return list(self.indexes)
+
+    def describe_index(self, name):
+        self._call("describe_index")
+        description = self.indexes[name]
+        description.status = {"state": description.states[0]}
+        if len(description.states) > 1:
+            description.states.pop(0)
+        return description
+
+    def create_index(self, name, dimension, metric, pods, replicas, pod_type, **_):
+        self._call("create_index")
+        self.add_index(name, dimension, metric, pods, replicas, pod_type)
+
+    def delete_index(self, name):
+        self._call("delete_index")
+        del self.indexes[name]
+
+    def Index(self, name):  # pylint: disable=invalid-name
+        return self.clients.setdefault(name, FakeIndexClient())
+
+    def _call(self, function_name):
+        """Record the call, and raise the next error of the function, or of the environment."""
+        self.calls.append(function_name)
+        if self.errors[function_name]:
+            raise self.errors[function_name].pop(0)
+        if function_name == "create_index" and self.config.environment in self.failing_environments:
+            raise self.failing_environments[self.config.environment]
+
+
+@pytest.fixture(name="fake_pinecone")
+def fixture_fake_pinecone(monkeypatch):
+    """Replace the pinecone client with an in-memory fake, and skip the sleeps between retries."""
+    fake = FakePinecone()
+    monkeypatch.setattr(pinecone_module.parameters, "get_secret", lambda *_, **__: "api-key")
+    monkeypatch.setattr(pinecone_module.time, "sleep", lambda _: None)
+    monkeypatch.setattr(pinecone_module.pinecone, "Config", fake.config)
+    for name in ("init", "list_indexes", "describe_index", "create_index", "delete_index", "Index"):
+        monkeypatch.setattr(pinecone_module.pinecone, name, getattr(fake, name))
+    return fake
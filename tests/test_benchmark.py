@@ -0,0 +1,141 @@
+import itertools
+import time
+
+import pytest
+
+from pinecone_constructs.aws.custom_resource.function.benchmark import (
+    get_benchmark_attributes,
+    get_percentile,
+    load_query_vectors,
+    run_benchmark,
+)
+from pinecone_constructs.aws.custom_resource.function.pinecone import PineconeIndex
+from pinecone_constructs.aws.custom_resource.function.pinecone_settings import (
+    BenchmarkSettings,
+    PineconeIndexSettings,
+)
+from pinecone_constructs.aws.custom_resource.function.settings import Settings
+
+
+class FakeIndex:
+    """Answer queries after a fixed delay, failing every nth query."""
+
+    def __init__(self, delay_seconds=0.001, fail_every=0):
+        self.delay_seconds = delay_seconds
+        self.fail_every = fail_every
+        self.queries = []
+        self._count = itertools.count(1)
+
+    def query(self, vector, top_k, namespace):
+        self.queries.append((vector, top_k, namespace))
+        count = next(self._count)
+        time.sleep(self.delay_seconds)
+        if self.fail_every and count % self.fail_every == 0:
+            raise RuntimeError("query failed")
+        return {"matches": []}
+
+
+@pytest.mark.parametrize(
+    "percentile,expected",
+    [(50, 50), (95, 95), (99, 99), (100, 100), (0, 1)],
+)
+def test_get_percentile_uses_nearest_rank(percentile, expected):
+    """The nearest-rank percentile of 1..100 should be the percentile itself."""
+    assert get_percentile([float(value) for value in range(1, 101)], percentile) == expected
+
+
+def test_run_benchmark_reports_each_concurrency_level():
+    """Every concurrency level should run the configured number of queries."""
+    settings = BenchmarkSettings(concurrency_levels=[1, 4], num_queries=20, top_k=5, namespace="a")
+    index = FakeIndex(fail_every=10)
+    reports = run_benchmark(index, load_query_vectors(settings, dimension=8), settings)
+    assert [report.concurrency for report in reports] == [1, 4]
+    assert len(index.queries) == 40
+    assert {(len(vector), top_k, namespace) for vector, top_k, namespace in index.queries} == {(8, 5, "a")}
+    for report in reports:
+        assert report.num_errors == 2
+        assert 1 <= report.p50_ms <= report.p95_ms <= report.p99_ms
+        assert report.qps > 0
+
+
+def test_run_benchmark_fails_when_every_query_fails():
+    """A benchmark that cannot reach the index should fail instead of reporting zeros."""
+    settings = BenchmarkSettings(concurrency_levels=[2], num_queries=4)
+    with pytest.raises(RuntimeError):
+        run_benchmark(FakeIndex(delay_seconds=0, fail_every=1), [[0.1, 0.2]], settings)
+
+
+def test_benchmark_attributes_cover_every_measure():
+    """Each concurrency level should be published as p50, p95, p99 and qps attributes."""
+    settings = BenchmarkSettings(concurrency_levels=[1, 16], num_queries=2)
+    reports = run_benchmark(FakeIndex(delay_seconds=0), [[0.1]], settings)
+    assert sorted(get_benchmark_attributes(reports)) == sorted(
+        f"Benchmark{measure}Concurrency{concurrency}"
+        for measure in ("P50Ms", "P95Ms", "P99Ms", "Qps")
+        for concurrency in (1, 16)
+    )
+
+
+def test_skipped_benchmark_attributes_are_still_set():
+    """Every configured concurrency level should have attributes, so the stack outputs resolve."""
+    reports = run_benchmark(FakeIndex(delay_seconds=0), [[0.1]], BenchmarkSettings(concurrency_levels=[1], num_queries=2))
+    attributes = get_benchmark_attributes(reports, concurrency_levels=[1, 4])
+    assert attributes["BenchmarkQpsConcurrency4"] == "skipped"
+    assert attributes["BenchmarkQpsConcurrency1"] != "skipped"
+    assert len(attributes) == 8
+
+
+def test_index_benchmark_waits_for_ready_index(fake_pinecone):
+    """The benchmark should start once a pod type change has finished."""
+    fake_pinecone.add_index("test-index", dimension=4, states=["Configuring", "Ready"], environment="gcp-starter")
+    fake_index = fake_pinecone.clients["test-index"] = FakeIndex(delay_seconds=0)
+    index = PineconeIndex(
+        settings=Settings(),
+        index_settings=PineconeIndexSettings(
+            api_key_secret_name="secret",
+            environment="gcp-starter",
+            name="test-index",
+            dimension=4,
+            benchmark=BenchmarkSettings(concurrency_levels=[2], num_queries=3),
+        ),
+    )
+    reports = index.benchmark()
+    assert len(reports) == 1
+    assert len(fake_index.queries) == 3
+    assert fake_pinecone.calls.count("describe_index") == 2
+
+
+def test_benchmark_settings_decode_from_custom_resource_properties():
+    """The benchmark settings should be decoded from the JSON string they are serialized to."""
+    settings = PineconeIndexSettings.model_validate(
+        {
+            "api_key_secret_name": "secret",
+            "environment": "gcp-starter",
+            "name": "test-index",
+            "dimension": "4",
+            "benchmark": '{"concurrency_levels": [1, 2], "num_queries": 10}',
+        }
+    )
+    assert settings.benchmark == BenchmarkSettings(concurrency_levels=[1, 2], num_queries=10)
+
+
+@pytest.mark.parametrize(
+    "state,fake_index",
+    [("Initializing", FakeIndex(delay_seconds=0)), ("Ready", FakeIndex(delay_seconds=0, fail_every=1))],
+)
+def test_index_benchmark_is_best_effort(fake_pinecone, state, fake_index):
+    """An index that is not ready, or a failing benchmark, should skip the benchmark instead of failing."""
+    fake_pinecone.add_index("test-index", dimension=4, states=[state], environment="gcp-starter")
+    fake_pinecone.clients["test-index"] = fake_index
+    index = PineconeIndex(
+        settings=Settings(),
+        index_settings=PineconeIndexSettings(
+            api_key_secret_name="secret",
+            environment="gcp-starter",
+            name="test-index",
+            dimension=4,
+            benchmark=BenchmarkSettings(concurrency_levels=[1], num_queries=2, max_wait_seconds=0),
+        ),
+    )
+    assert index.benchmark() == []
+    assert len(fake_index.queries) == (0 if state == "Initializing" else 2)
@@ -0,0 +1,91 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import aws_lambda_powertools
+import pytest
+
+from pinecone_constructs.aws.custom_resource import bundling
+
+
+# the package __init__ of the first 2.x releases, before the user agent was injected
+POWERTOOLS_2_0_INIT = '''\
+"""Top-level package for Lambda Python Powertools."""
+
+from pathlib import Path
+
+from .logging import Logger  # noqa: F401
+from .metrics import Metrics, single_metric  # noqa: F401
+from .package_logger import set_package_logger_handler
+from .tracing import Tracer  # noqa: F401
+
+__author__ = """Amazon Web Services"""
+
+PACKAGE_PATH = Path(__file__).parent
+
+set_package_logger_handler()
+'''
+
+
+@pytest.fixture(name="bundle_dir")
+def fixture_bundle_dir(tmp_path):
+    """Return a bundle with a copy of the installed powertools package."""
+    source = Path(aws_lambda_powertools.__file__).parent
+    shutil.copytree(source, tmp_path / "aws_lambda_powertools")
+    return tmp_path
+
+
+def test_lazy_powertools_import_defers_the_logger_metrics_and_tracer(bundle_dir):
+    """Importing a utility should not import the tracer, while the package attributes still resolve."""
+    bundling.use_lazy_powertools_import(bundle_dir)
+    code = (
+        "import sys; import aws_lambda_powertools.utilities.parameters; "
+        "assert 'aws_lambda_powertools.tracing' not in sys.modules; "
+        "from aws_lambda_powertools import Logger, Tracer, single_metric"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=bundle_dir, env={"PYTHONPATH": str(bundle_dir)}, check=True)
+
+
+def test_lazy_powertools_init_keeps_the_rest_of_other_versions():
+    """The __init__ of another version should only lose its eager imports."""
+    source = bundling.get_lazy_powertools_init(POWERTOOLS_2_0_INIT)
+    assert "from .logging" not in source and "from .tracing" not in source
+    assert "from .package_logger import set_package_logger_handler" in source
+    assert "user_agent" not in source
+    compile(source, "__init__.py", "exec")
+
+
+def test_unrecognized_powertools_init_is_left_as_is(bundle_dir):
+    """An __init__ without the expected imports should not be replaced."""
+    init_file = bundle_dir / "aws_lambda_powertools" / "__init__.py"
+    init_file.write_text('"""Powertools."""\n')
+    bundling.use_lazy_powertools_import(bundle_dir)
+    assert init_file.read_text() == '"""Powertools."""\n'
+
+
+def test_report_does_not_fail_when_the_handlers_fail_to_import(tmp_path, monkeypatch, capsys):
+    """A handler that fails to import should be reported as over budget, instead of failing the bundling."""
+    (tmp_path / "function").mkdir()
+    (tmp_path / "function" / "index.py").write_text("import missing_module\n")
+    monkeypatch.setattr(bundling, "NUM_IMPORT_TIME_SAMPLES", 1)
+    assert not bundling.report(tmp_path, max_bundle_size_mb=100, max_bundle_import_ms=2000)
+    assert "ModuleNotFoundError: No module named 'missing_module'" in capsys.readouterr().out
+
+
+def test_report_measures_the_import_time(tmp_path, monkeypatch, capsys):
+    """Handlers that import should be reported within their budgets."""
+    (tmp_path / "function").mkdir()
+    (tmp_path / "function" / "index.py").write_text("import json\n")
+    monkeypatch.setattr(bundling, "NUM_IMPORT_TIME_SAMPLES", 1)
+    assert bundling.report(tmp_path, max_bundle_size_mb=100, max_bundle_import_ms=2000)
+    assert "bundle import time (build host):" in capsys.readouterr().out
+
+
+def test_report_does_not_fail_on_the_import_time(tmp_path, monkeypatch, capsys):
+    """The import time on the build host is not the cold start, so it should only be reported."""
+    (tmp_path / "function").mkdir()
+    (tmp_path / "function" / "index.py").write_text("import json\n")
+    monkeypatch.setattr(bundling, "NUM_IMPORT_TIME_SAMPLES", 1)
+    assert bundling.report(tmp_path, max_bundle_size_mb=100, max_bundle_import_ms=0)
+    assert "WARNING: the handlers take longer to import on the build host" in capsys.readouterr().out
@@ -0,0 +1,102 @@
+import json
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from aws_cdk import App, Duration, Stack, Stage
+from aws_cdk import aws_events as events
+from aws_cdk.assertions import Template
+
+from pinecone_constructs.aws.construct import PineconeIndex, PineconeIndexPool
+from pinecone_constructs.aws.custom_resource.function.pinecone_settings import IndexPoolShape, PineconeIndexSettings
+from pinecone_constructs.aws.custom_resource.function.settings import DriftDetectionSettings
+
+
+def get_settings(name: str, dimension: int = 384) -> PineconeIndexSettings:
+    """Return index settings with test defaults."""
+    return PineconeIndexSettings(
+        api_key_secret_name="secret",
+        environment="gcp-starter",
+        name=name,
+        dimension=dimension,
+        removal_policy="DESTROY",
+    )
+
+
+def get_logical_ids(settings: List[PineconeIndexSettings], **kwargs) -> Dict[str, str]:
+    """Synthesize the indexes without bundling, and return the logical id of each custom resource by its name."""
+    stack = Stack(App(context={"aws:cdk:bundling-stacks": []}), "stack")
+    PineconeIndex(stack, "Index", settings, **kwargs)
+    resources = Template.from_stack(stack).find_resources("AWS::CloudFormation::CustomResource")
+    return {
+        "/".join(filter(None, [resource["Properties"]["name"], resource["Properties"].get("namespace")])): logical_id
+        for logical_id, resource in resources.items()
+    }
+
+
+def strip_prefix(logical_ids: Dict[str, str]) -> Dict[str, str]:
+    """Remove the index name prefix, which depends on the provider, from the names."""
+    return {name.split("-", 1)[1]: logical_id for name, logical_id in logical_ids.items()}
+
+
+def test_logical_ids_do_not_depend_on_the_order_of_the_indexes():
+    """Removing or reordering indexes should not move the settings of the others to another resource."""
+    before = strip_prefix(get_logical_ids([get_settings("a"), get_settings("b"), get_settings("c")]))
+    after = strip_prefix(get_logical_ids([get_settings("c"), get_settings("a")]))
+    assert after == {"a": before["a"], "c": before["c"]}
+
+
+def test_logical_ids_of_shared_indexes_do_not_depend_on_the_order_of_the_tenants():
+    """Adding a tenant with a new dimension first should not move the shared indexes or namespaces."""
+    tenants = [get_settings("tenant-a"), get_settings("tenant-b", dimension=768)]
+    before = strip_prefix(get_logical_ids(tenants, multiplex_namespaces=True))
+    tenants_after = [get_settings("tenant-c", dimension=1536), *tenants]
+    after = strip_prefix(get_logical_ids(tenants_after, multiplex_namespaces=True))
+    assert {name: after[name] for name in before} == before
+    assert len(after) == len(before) + 2
+
+
+@pytest.mark.parametrize("settings_names", [["legacy"], ["other", "legacy"]])
+def test_legacy_index_keeps_the_single_index_logical_id(settings_names):
+    """The legacy index should keep the id of the single index custom resource, wherever it is in the list."""
+    logical_ids = strip_prefix(
+        get_logical_ids([get_settings(name) for name in settings_names], legacy_index_name="legacy")
+    )
+    # logical ids are the path of the resource, followed by a hash of 8 characters
+    assert logical_ids["legacy"][:-8] == "IndexIndexLambdaCustomResource"
+    if "other" in logical_ids:
+        assert logical_ids["other"][:-8] == "IndexIndexLambdaotherCustomResource"
+
+
+def get_pool(stack_name: str, **kwargs) -> PineconeIndexPool:
+    """Return an index pool in a stack without bundling."""
+    stack = Stack(App(context={"aws:cdk:bundling-stacks": []}), stack_name)
+    shape = IndexPoolShape(api_key_secret_name="secret", environment="gcp-starter", dimension=4, size=1)
+    return PineconeIndexPool(stack, "Pool", [shape], **kwargs)
+
+
+def test_index_pool_names_are_unique_per_stack():
+    """Pools with the same path in different stacks should not share index names, tables or parameters."""
+    pools = [get_pool("preview-1"), get_pool("preview-2"), get_pool("preview-1", index_name_prefix="pool-custom")]
+    assert len({pool.index_name_prefix for pool in pools}) == 3
+    assert pools[2].index_name_prefix == "pool-custom"
+    template = Template.from_stack(Stack.of(pools[0]))
+    (table,) = template.find_resources("AWS::DynamoDB::Table").values()
+    assert "TableName" not in table["Properties"]
+    template.has_resource_properties("AWS::SSM::Parameter", {"Name": pools[0].table_name_parameter_name})
+
+
+def test_drift_detection_settings_of_many_indexes_fit_in_the_environment():
+    """The expected indexes should be uploaded as an asset, rather than exceed the 4 KB environment limit."""
+    settings = [get_settings(f"index-{i}") for i in range(50)]
+    stack = Stack(App(context={"aws:cdk:bundling-stacks": []}), "stack")
+    index = PineconeIndex(stack, "Index", settings, drift_detection_schedule=events.Schedule.rate(Duration.hours(1)))
+    logical_id = stack.get_logical_id(index.drift_detection_function.node.default_child)
+    resource = Template.from_stack(stack).to_json()["Resources"][logical_id]
+    environment = resource["Properties"]["Environment"]["Variables"]
+    assert len(json.dumps(environment)) < 4096
+    assert set(environment) <= set(DriftDetectionSettings.model_fields)
+    assert "expected_indexes_s3_uri" in environment
+    (expected_indexes_path,) = Path(Stage.of(stack).outdir).glob("*-expected-indexes.json")
+    expected_indexes = json.loads(expected_indexes_path.read_text())
+    assert [PineconeIndexSettings.model_validate(item) for item in expected_indexes] == settings
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from pinecone_constructs.aws.custom_resource.function.pinecone_settings import PineconeIndexSettings
+from pinecone_constructs.aws.dimensionality_reduction import (
+    ProjectedIndex,
+    Projection,
+    benchmark_projection,
+    fit_pca,
+    fit_random_projection,
+)
+
+
+@pytest.fixture(name="vectors")
+def fixture_vectors():
+    """Return vectors that lie close to a low dimensional subspace."""
+    generator = np.random.default_rng(0)
+    latent = generator.normal(size=(500, 8))
+    basis = generator.normal(size=(8, 64))
+    return latent @ basis + generator.normal(scale=0.01, size=(500, 64))
+
+
+@pytest.mark.parametrize("metric", ["cosine", "dotproduct", "euclidean"])
+def test_pca_preserves_recall_of_low_rank_vectors(vectors, metric):
+    """Reducing to the rank of the vectors should barely change the nearest neighbours."""
+    projection = fit_pca(vectors, 8, metric=metric)
+    benchmark = benchmark_projection(projection, vectors, k=10, metric=metric)
+    assert benchmark.dimension == 8
+    assert benchmark.input_dimension == 64
+    assert benchmark.recall_at_k > 0.9
+
+
+@pytest.mark.parametrize("metric", ["cosine", "dotproduct"])
+def test_pca_does_not_center_similarity_metrics(vectors, metric):
+    """Vectors far from the origin should keep their similarity ranking, which centering them loses."""
+    offset_vectors = vectors + 20 * np.random.default_rng(1).normal(size=64)
+    uncentered = benchmark_projection(fit_pca(offset_vectors, 9, metric=metric), offset_vectors, metric=metric)
+    centered = benchmark_projection(fit_pca(offset_vectors, 9, metric="euclidean"), offset_vectors, metric=metric)
+    assert uncentered.recall_at_k > 0.95
+    assert centered.recall_at_k < 0.8
+
+
+def test_random_projection_has_lower_recall_than_pca(vectors):
+    """A random projection to the same dimension should not beat PCA."""
+    pca = benchmark_projection(fit_pca(vectors, 4), vectors)
+    random = benchmark_projection(fit_random_projection(64, 4), vectors)
+    assert random.recall_at_k <= pca.recall_at_k
+
+
+def test_projection_round_trips_through_artifact(tmp_path, vectors):
+    """A loaded projection should transform vectors exactly like the saved one."""
+    projection = fit_pca(vectors, 8, normalize=True)
+    projection.save(tmp_path / "projection.npz")
+    loaded = Projection.load(tmp_path / "projection.npz")
+    assert loaded.method == "pca"
+    assert loaded.normalize
+    np.testing.assert_array_equal(loaded.transform(vectors), projection.transform(vectors))
+
+
+def test_apply_to_sets_reduced_dimension():
+    """The index settings should be copied with the reduced dimension."""
+    settings = PineconeIndexSettings(
+        api_key_secret_name="secret",
+        environment="gcp-starter",
+        name="index",
+        dimension=64,
+    )
+    reduced = fit_random_projection(64, 16).apply_to(settings)
+    assert reduced.dimension == 16
+    assert settings.dimension == 64
+
+
+def test_projected_index_projects_upserts_and_queries(vectors):
+    """Both tuple and dict vectors, and the query vector, should be projected."""
+
+    class FakeIndex:
+        def upsert(self, vectors):
+            self.upserted = vectors
+
+        def query(self, vector, top_k):
+            return vector, top_k
+
+    projection = fit_pca(vectors, 8)
+    index = ProjectedIndex(FakeIndex(), projection)
+    index.upsert(vectors=[("1", vectors[0], {"genre": "drama"}), {"id": "2", "values": vectors[1]}])
+    assert len(index.upserted[0][1]) == 8
+    assert index.upserted[0][2] == {"genre": "drama"}
+    assert len(index.upserted[1]["values"]) == 8
+    vector, top_k = index.query(vector=vectors[0], top_k=3)
+    assert len(vector) == 8 and top_k == 3
@@ -0,0 +1,75 @@
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from pinecone_constructs.aws.custom_resource.function import drift
+from pinecone_constructs.aws.custom_resource.function.drift import DriftType, detect_drift, load_expected_indexes
+from pinecone_constructs.aws.custom_resource.function.pinecone_settings import PineconeIndexSettings
+from pinecone_constructs.aws.custom_resource.function.pool import (
+    InMemoryIndexPoolStore,
+    PoolIndexStatus,
+    PoolRecord,
+    resolve_leased_index_names,
+)
+
+
+EXPECTED = PineconeIndexSettings(
+    api_key_secret_name="secret",
+    environment="gcp-starter",
+    name="prefix-index",
+    dimension=384,
+)
+LIVE = SimpleNamespace(pods=1, replicas=1, pod_type="s1.x1", metric="dotproduct")
+
+
+@pytest.mark.parametrize(
+    ("live_indexes", "expected_drift"),
+    [
+        ({"prefix-index": LIVE}, []),
+        ({}, [("prefix-index", DriftType.MISSING)]),
+        ({"prefix-index": SimpleNamespace(**{**vars(LIVE), "pods": 2})}, [("prefix-index", DriftType.MODIFIED)]),
+        ({"prefix-index": LIVE, "prefix-other": LIVE}, [("prefix-other", DriftType.UNMANAGED)]),
+        ({"prefix-index": LIVE, "unrelated": LIVE}, []),
+    ],
+)
+def test_detect_drift(live_indexes, expected_drift):
+    """Drift should be reported for missing, modified and unmanaged indexes."""
+    drifts = detect_drift([EXPECTED], live_indexes, ["prefix-"])
+    assert [(drift.index_name, drift.drift_type) for drift in drifts] == expected_drift
+
+
+@pytest.mark.parametrize(
+    ("lease", "expected_drift"),
+    [
+        ({}, []),
+        ({"environment": "us-west1-gcp"}, [("prefix-index", DriftType.MISSING)]),
+        ({"api_key_secret_name": "other-secret"}, [("prefix-index", DriftType.MISSING)]),
+        ({"status": PoolIndexStatus.AVAILABLE, "lessee": None}, [("prefix-index", DriftType.MISSING)]),
+    ],
+)
+def test_leased_indexes_are_compared_under_their_pool_name(lease, expected_drift):
+    """An index leased from the pool in its project should not be reported as missing."""
+    store = InMemoryIndexPoolStore()
+    record = {
+        "index_name": "pool-abc-1234",
+        "shape": "shape",
+        "environment": "gcp-starter",
+        "api_key_secret_name": "secret",
+        "status": PoolIndexStatus.LEASED,
+        "lessee": "prefix-index",
+    }
+    store.put(PoolRecord(**{**record, **lease}))
+    expected_indexes = resolve_leased_index_names([EXPECTED], store)
+    drifts = detect_drift(expected_indexes, {"pool-abc-1234": LIVE}, ["prefix-"])
+    assert [(drift.index_name, drift.drift_type) for drift in drifts] == expected_drift
+
+
+def test_load_expected_indexes(monkeypatch):
+    """The expected indexes should be read from the JSON file the construct uploaded to S3."""
+    objects = {("bucket", "path/indexes.json"): json.dumps([EXPECTED.model_dump(mode="json")]).encode()}
+    client = SimpleNamespace(get_object=lambda Bucket, Key: {"Body": io.BytesIO(objects[(Bucket, Key)])})
+    monkeypatch.setattr(drift.boto3, "client", lambda _: client)
+    assert load_expected_indexes("s3://bucket/path/indexes.json") == [EXPECTED]
+    assert not load_expected_indexes(None)
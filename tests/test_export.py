@@ -0,0 +1,139 @@
+import importlib
+import json
+import sys
+
+import pytest
+
+from pinecone_constructs.aws import export as export_module
+from pinecone_constructs.aws.export import (
+    ManifestIdSource,
+    QueryIdSource,
+    export_index,
+    get_filesystem,
+    import_index,
+)
+
+
+class FakeIndex:
+    """Serve vectors from memory, like a pinecone.Index."""
+
+    def __init__(self, vectors=None):
+        self.namespaces = vectors or {}
+
+    def describe_index_stats(self):
+        return {
+            "namespaces": {name: {"vector_count": len(vectors)} for name, vectors in self.namespaces.items()},
+        }
+
+    def fetch(self, ids, namespace):
+        vectors = self.namespaces.get(namespace, {})
+        return {"vectors": {vector_id: vectors[vector_id] for vector_id in ids if vector_id in vectors}}
+
+    def query(self, vector, top_k, namespace, **kwargs):
+        return {"matches": [{"id": vector_id} for vector_id in list(self.namespaces[namespace])[:top_k]]}
+
+    def upsert(self, vectors, namespace):
+        for vector in vectors:
+            record = {"id": vector[0], "values": vector[1]}
+            if len(vector) > 2:
+                record["metadata"] = vector[2]
+            self.namespaces.setdefault(namespace, {})[vector[0]] = record
+
+
+@pytest.fixture(name="index")
+def fixture_index():
+    """Return an index with a metadata-less default namespace and a named namespace."""
+    return FakeIndex(
+        {
+            "": {f"{i}": {"id": f"{i}", "values": [float(i), 0.5]} for i in range(25)},
+            "tenant/a": {
+                f"a{i}": {"id": f"a{i}", "values": [0.5, float(i)], "metadata": {"genre": "drama"}} for i in range(7)
+            },
+        }
+    )
+
+
+def test_export_round_trips_through_import(tmp_path, index):
+    """Every vector, with its metadata and namespace, should be imported as it was exported."""
+    report = export_index(index, str(tmp_path), QueryIdSource(dimension=2), part_size=10, fetch_batch_size=3)
+    assert report.num_vectors == 32
+    assert report.num_parts == 4
+    assert report.namespaces == {"": 25, "tenant/a": 7}
+    target = FakeIndex()
+    import_report = import_index(target, str(tmp_path), upsert_batch_size=4)
+    assert import_report.num_vectors == 32
+    assert target.namespaces == index.namespaces
+
+
+def test_export_resumes_after_completed_parts(tmp_path, index, monkeypatch):
+    """An interrupted export should not fetch the vectors of its completed parts again."""
+    original_export_part = export_module._export_part
+    exported_parts = []
+
+    def export_part(fake_index, namespace, ids, *args):
+        if len(exported_parts) == 2:
+            raise RuntimeError("interrupted")
+        exported_parts.append(ids)
+        return original_export_part(fake_index, namespace, ids, *args)
+
+    monkeypatch.setattr(export_module, "_export_part", export_part)
+    with pytest.raises(RuntimeError):
+        export_index(index, str(tmp_path), QueryIdSource(dimension=2), namespaces=[""], part_size=10, max_workers=1)
+    monkeypatch.setattr(export_module, "_export_part", original_export_part)
+    fetched = []
+    original_fetch = index.fetch
+    monkeypatch.setattr(index, "fetch", lambda ids, namespace: fetched.extend(ids) or original_fetch(ids, namespace))
+    report = export_index(index, str(tmp_path), QueryIdSource(dimension=2), namespaces=[""], part_size=10)
+    assert report.num_vectors == 5
+    assert sorted(fetched) == sorted(set(index.namespaces[""]) - {i for ids in exported_parts for i in ids})
+    target = FakeIndex()
+    import_index(target, str(tmp_path))
+    assert target.namespaces[""] == index.namespaces[""]
+
+
+def test_export_from_a_manifest_resumes_at_its_offset(tmp_path, index, monkeypatch):
+    """A resumed manifest export should skip the ids of the consecutive completed parts, without reading them back."""
+    manifest = tmp_path / "ids.jsonl"
+    manifest.write_text("\n".join(json.dumps({"id": vector_id}) for vector_id in index.namespaces[""]))
+    destination = tmp_path / "export"
+    export_index(index, str(destination), ManifestIdSource(str(manifest)), namespaces=[""], part_size=10)
+    # as if the second part failed after the third completed
+    checkpoint_path = destination / export_module.CHECKPOINT_FILE_NAME
+    checkpoint = json.loads(checkpoint_path.read_text())
+    assert checkpoint["id_offsets"] == {"": 25}
+    del checkpoint["namespaces"][""]["part-00001.parquet"]
+    checkpoint["id_offsets"][""] = 10
+    checkpoint_path.write_text(json.dumps(checkpoint))
+    monkeypatch.setattr(export_module, "_get_exported_ids", None)
+    fetched = []
+    original_fetch = index.fetch
+    monkeypatch.setattr(index, "fetch", lambda ids, namespace: fetched.extend(ids) or original_fetch(ids, namespace))
+    report = export_index(index, str(destination), ManifestIdSource(str(manifest)), namespaces=[""], part_size=10)
+    assert report.num_vectors == 15
+    assert sorted(fetched) == sorted(list(index.namespaces[""])[10:])
+    target = FakeIndex()
+    import_index(target, str(destination))
+    assert target.namespaces[""] == index.namespaces[""]
+
+
+def test_manifest_id_source_filters_by_namespace(tmp_path):
+    """Only the ids of the requested namespace should be read from the manifest."""
+    manifest = tmp_path / "ids.jsonl"
+    manifest.write_text("\n".join(json.dumps(record) for record in [{"id": "1"}, {"id": "a1", "namespace": "a"}]))
+    source = ManifestIdSource(str(manifest))
+    assert list(source.iter_ids(None, "", 1)) == ["1"]
+    assert list(source.iter_ids(None, "a", 1)) == ["a1"]
+
+
+def test_get_filesystem_resolves_local_paths(tmp_path):
+    """Local paths should be resolved to absolute paths on the local filesystem."""
+    _, path = get_filesystem(str(tmp_path / "export"))
+    assert path == str(tmp_path / "export")
+
+
+def test_export_requires_the_tools_extra(monkeypatch):
+    """Without pyarrow, importing the export tool should name the extra that installs it."""
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    monkeypatch.delitem(sys.modules, export_module.__name__)
+    with pytest.raises(ImportError, match=r"pinecone_constructs\[tools\]"):
+        importlib.import_module(export_module.__name__)
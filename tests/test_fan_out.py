@@ -0,0 +1,41 @@
+import pytest
+
+from pinecone_constructs.aws.custom_resource.function.fan_out import FanOutPineconeIndex
+from pinecone_constructs.aws.custom_resource.function.pinecone_settings import PineconeIndexSettings
+from pinecone_constructs.aws.custom_resource.function.settings import Settings
+
+
+def get_index(*environments: str) -> FanOutPineconeIndex:
+    """Return an index with copies in the additional environments."""
+    return FanOutPineconeIndex(
+        settings=Settings(num_attempts_to_run_operation=1),
+        index_settings=PineconeIndexSettings(
+            api_key_secret_name="secret",
+            environment="gcp-starter",
+            name="test-index",
+            dimension=384,
+            additional_environments=[{"environment": environment} for environment in environments],
+        ),
+    )
+
+
+@pytest.mark.usefixtures("fake_pinecone")
+def test_create_publishes_the_host_in_each_environment():
+    """Creating the index should publish its name and host in every environment."""
+    index = get_index("us-west1-gcp")
+    index.create()
+    assert index.data == {
+        "IndexNameGcpStarter": "test-index",
+        "HostGcpStarter": "test-index-project.svc.gcp-starter.pinecone.io",
+        "IndexNameUsWest1Gcp": "test-index",
+        "HostUsWest1Gcp": "test-index-project.svc.us-west1-gcp.pinecone.io",
+    }
+
+
+def test_create_fails_if_any_environment_fails(fake_pinecone):
+    """A failure in one environment should fail the operation, naming the environment."""
+    fake_pinecone.failing_environments["eu-west1-gcp"] = ValueError("quota exceeded")
+    index = get_index("us-west1-gcp", "eu-west1-gcp")
+    with pytest.raises(RuntimeError, match="'eu-west1-gcp'"):
+        index.create()
+    assert "HostUsWest1Gcp" in index.data
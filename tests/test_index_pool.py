@@ -0,0 +1,155 @@
+from types import SimpleNamespace
+
+import pytest
+
+from pinecone_constructs.aws.custom_resource.function.pinecone import PineconeIndex
+from pinecone_constructs.aws.custom_resource.function.pinecone_settings import (
+    IndexPoolShape,
+    PineconeIndexSettings,
+)
+from pinecone_constructs.aws.custom_resource.function.pool import (
+    InMemoryIndexPoolStore,
+    IndexPool,
+    PoolIndexStatus,
+)
+from pinecone_constructs.aws.custom_resource.function.settings import Settings
+
+
+SHAPE = IndexPoolShape(api_key_secret_name="secret", environment="us-west1-gcp", dimension=4, size=2)
+
+
+@pytest.fixture(name="pool")
+def fixture_pool(fake_pinecone):
+    """Return a pool with two available indexes of the test shape."""
+    fake_pinecone.init(api_key="api-key", environment=SHAPE.environment)
+    store = InMemoryIndexPoolStore()
+    pool = IndexPool(store, "pool-test")
+    pool.refill([SHAPE], SHAPE.environment, SHAPE.api_key_secret_name)
+    assert {record.status for record in store.list()} == {PoolIndexStatus.PROVISIONING}
+    pool.refill([SHAPE], SHAPE.environment, SHAPE.api_key_secret_name)
+    assert {record.status for record in store.list()} == {PoolIndexStatus.AVAILABLE}
+    return SimpleNamespace(pool=pool, store=store)
+
+
+def get_index(pool, removal_policy="DESTROY", name="test-index", dimension=4) -> PineconeIndex:
+    """Return an index that leases from the pool."""
+    return PineconeIndex(
+        settings=Settings(),
+        index_settings=PineconeIndexSettings(
+            api_key_secret_name="secret",
+            environment="us-west1-gcp",
+            name=name,
+            dimension=dimension,
+            removal_policy=removal_policy,
+        ),
+        pool=pool,
+    )
+
+
+def test_create_leases_index_and_delete_returns_it_cleared(fake_pinecone, pool):
+    """A leased index should be renamed to the pool index, and cleared when it is returned."""
+    index = get_index(pool.pool)
+    index.create()
+    assert pool.pool.is_pool_index(index.name)
+    assert len(fake_pinecone.indexes) == 2
+    assert pool.store.get(index.name).status == PoolIndexStatus.LEASED
+    assert pool.store.get(index.name).lessee == "test-index"
+    client = fake_pinecone.Index(index.name)
+    client.namespaces.update({"": 3, "tenant": 2})
+    index.delete()
+    assert not client.namespaces
+    assert index.name in fake_pinecone.indexes
+    assert pool.store.get(index.name).status == PoolIndexStatus.CLEARING
+    pool.pool.refill([SHAPE], SHAPE.environment, SHAPE.api_key_secret_name)
+    assert pool.store.get(index.name).status == PoolIndexStatus.AVAILABLE
+
+
+def test_leases_are_exclusive_and_fall_back_to_create(fake_pinecone, pool):
+    """Once the pool is empty, indexes should be created as usual."""
+    names = []
+    for i in range(3):
+        index = get_index(pool.pool, name=f"index-{i}")
+        index.create()
+        names.append(index.name)
+    assert len(set(names)) == 3
+    assert names[2] == "index-2"
+    assert len(fake_pinecone.indexes) == 3
+
+
+@pytest.mark.parametrize(
+    "removal_policy,dimension",
+    [("RETAIN", 4), ("SNAPSHOT", 4), ("DESTROY", 8)],
+)
+def test_create_does_not_lease_ineligible_indexes(fake_pinecone, pool, removal_policy, dimension):
+    """Retained indexes, and indexes without a matching shape, should not be leased."""
+    index = get_index(pool.pool, removal_policy=removal_policy, dimension=dimension)
+    index.create()
+    assert index.name == "test-index"
+    assert {record.status for record in pool.store.list()} == {PoolIndexStatus.AVAILABLE}
+
+
+def test_release_deletes_index_with_changed_shape(fake_pinecone, pool):
+    """An index whose shape was changed by an update should be deleted instead of returned."""
+    index = get_index(pool.pool)
+    index.create()
+    fake_pinecone.indexes[index.name].pod_type = "s1.x2"
+    index.delete()
+    assert index.name not in fake_pinecone.indexes
+    assert pool.store.get(index.name) is None
+
+
+def test_refill_replaces_leased_indexes_and_prunes_removed_shapes(fake_pinecone, pool):
+    """Refilling should keep the size of each shape, and delete indexes of shapes that were removed."""
+    get_index(pool.pool).create()
+    pool.pool.refill([SHAPE], SHAPE.environment, SHAPE.api_key_secret_name)
+    assert len(fake_pinecone.indexes) == 3
+    pool.pool.refill([], SHAPE.environment, SHAPE.api_key_secret_name)
+    assert [record.status for record in pool.store.list()] == [PoolIndexStatus.LEASED]
+    assert len(fake_pinecone.indexes) == 1
+
+
+def test_lease_ignores_indexes_of_other_projects(fake_pinecone):
+    """An index in the pool of another project should not be leased, even with the same shape."""
+    store = InMemoryIndexPoolStore()
+    pool = IndexPool(store, "pool-test")
+    other_shape = SHAPE.model_copy(update={"api_key_secret_name": "other-secret"})
+    fake_pinecone.init(api_key="api-key", environment=other_shape.environment)
+    for _ in range(2):
+        pool.refill([other_shape], other_shape.environment, other_shape.api_key_secret_name)
+    index = get_index(pool)
+    index.create()
+    assert index.name == "test-index"
+    assert {record.status for record in store.list()} == {PoolIndexStatus.AVAILABLE}
+
+
+def test_refill_keeps_an_index_leased_after_the_records_were_listed(fake_pinecone, pool, monkeypatch):
+    """An index leased while the pool is drained should not be deleted under its lessee."""
+    records = pool.store.list()
+    leased_index_name = records[0].index_name
+    assert pool.store.lease(leased_index_name, lessee="test-index")
+    monkeypatch.setattr(pool.store, "list", lambda: records)
+    pool.pool.refill([], SHAPE.environment, SHAPE.api_key_secret_name)
+    assert leased_index_name in fake_pinecone.indexes
+    assert pool.store.get(leased_index_name).status == PoolIndexStatus.LEASED
+    assert records[1].index_name not in fake_pinecone.indexes
+
+
+def test_returned_index_is_not_leased_until_its_deletes_are_applied(fake_pinecone, pool):
+    """An index whose vectors are still being deleted should not be leased to the next index."""
+    index = get_index(pool.pool)
+    index.create()
+    leased_index_name = index.name
+    client = fake_pinecone.Index(leased_index_name)
+    client.namespaces.update({"": 3})
+    index.delete()
+    # pinecone applies the deletes asynchronously, so the vectors are still there
+    client.namespaces.update({"": 3})
+    pool.pool.refill([SHAPE], SHAPE.environment, SHAPE.api_key_secret_name)
+    assert pool.store.get(leased_index_name).status == PoolIndexStatus.CLEARING
+    for i in range(2):
+        next_index = get_index(pool.pool, name=f"index-{i}")
+        next_index.create()
+        assert next_index.name != leased_index_name
+    client.namespaces.clear()
+    pool.pool.refill([SHAPE], SHAPE.environment, SHAPE.api_key_secret_name)
+    assert pool.store.get(leased_index_name).status == PoolIndexStatus.AVAILABLE
@@ -0,0 +1,94 @@
+import json
+
+from pinecone_constructs.aws.custom_resource.function.pinecone_settings import PineconeIndexSettings
+from pinecone_constructs.aws.metadata_config import (
+    iter_records,
+    optimize_metadata_config,
+    profile_metadata,
+    recommend_metadata_config,
+)
+
+
+RECORDS = [
+    {"id": "1", "values": [0.1], "metadata": {"genre": "drama", "tags": ["a", "b"], "text": "a long passage"}},
+    {"id": "2", "values": [0.2], "metadata": {"genre": "comedy", "tags": ["a"], "text": "another long passage"}},
+    {"genre": "drama", "text": "a record without vector values"},
+]
+
+# a larger sample, with a low cardinality field, an id-like field and a large text field
+CATALOG = [
+    {
+        "id": str(number),
+        "values": [0.1],
+        "metadata": {
+            "genre": ["drama", "comedy", "horror"][number % 3],
+            "year": 2000 + number % 5,
+            "document_id": f"document-{number}",
+            "text": f"passage {number} " + "lorem ipsum " * 20,
+        },
+    }
+    for number in range(30)
+]
+
+
+def write_records(tmp_path, records=None):
+    """Write the test records to a JSON lines file."""
+    path = tmp_path / "records.jsonl"
+    path.write_text("\n".join(json.dumps(record) for record in records or RECORDS) + "\n")
+    return path
+
+
+def test_profile_counts_list_items_and_distinct_values(tmp_path):
+    """Every item of a list should be profiled as a separate value."""
+    profile = profile_metadata(iter_records(str(write_records(tmp_path))))
+    assert profile.num_records == 3
+    assert profile.fields["genre"].num_distinct_values == 2
+    assert profile.fields["tags"].num_values == 3
+    assert profile.fields["tags"].num_distinct_values == 2
+
+
+def test_recommendation_only_indexes_filter_fields(tmp_path):
+    """Only the filter fields should be indexed, saving the memory of the others."""
+    profile = profile_metadata(iter_records(str(write_records(tmp_path))))
+    recommendation = recommend_metadata_config(profile, ["genre", "year"])
+    assert recommendation.indexed == ["genre", "year"]
+    assert recommendation.unseen_filter_fields == ["year"]
+    assert 0 < recommendation.estimated_saving_ratio < 1
+
+
+def test_iter_records_skips_lines_that_are_not_objects(tmp_path):
+    """Lines with JSON arrays, scalars or invalid JSON should be skipped instead of failing the profile."""
+    path = tmp_path / "records.jsonl"
+    path.write_text('[1, 2]\n"text"\n3\nnull\n{"genre": "drama"}\n{"genre": "com\n')
+    assert list(iter_records(str(path))) == [{"genre": "drama"}]
+
+
+def test_recommendation_without_filter_fields_excludes_costly_fields(tmp_path):
+    """Without filter fields, fields with high cardinality or large values should not be indexed."""
+    profile = profile_metadata(iter_records(str(write_records(tmp_path, CATALOG))))
+    recommendation = recommend_metadata_config(profile)
+    assert recommendation.indexed == ["genre", "year"]
+    assert recommendation.excluded_fields["document_id"].startswith("high cardinality")
+    assert recommendation.excluded_fields["text"].startswith("high cardinality")
+    assert recommendation.estimated_saving_ratio > 0.5
+
+
+def test_recommendation_reports_costly_filter_fields(tmp_path):
+    """Filter fields should be indexed even when costly, but reported."""
+    profile = profile_metadata(iter_records(str(write_records(tmp_path, CATALOG))))
+    recommendation = recommend_metadata_config(profile, ["genre", "document_id"], max_cardinality_ratio=1)
+    assert recommendation.indexed == ["document_id", "genre"]
+    assert recommendation.costly_filter_fields == {}
+    assert recommendation.excluded_fields["text"].startswith("large values")
+    assert recommendation.excluded_fields["year"] == "not filtered on"
+    recommendation = recommend_metadata_config(profile, ["genre", "document_id"])
+    assert list(recommendation.costly_filter_fields) == ["document_id"]
+
+
+def test_optimize_sets_the_metadata_config(tmp_path):
+    """The settings should be copied with the recommended metadata config."""
+    settings = PineconeIndexSettings(api_key_secret_name="secret", environment="gcp-starter", name="index", dimension=1)
+    source = str(write_records(tmp_path, CATALOG))
+    assert optimize_metadata_config(settings, source, ["genre"]).metadata_config == {"indexed": ["genre"]}
+    assert optimize_metadata_config(settings, source).metadata_config == {"indexed": ["genre", "year"]}
+    assert settings.metadata_config is None
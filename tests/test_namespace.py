@@ -0,0 +1,109 @@
+import pytest
+
+from pinecone_constructs.aws.custom_resource.function.namespace import NamespacedPineconeIndex
+from pinecone_constructs.aws.custom_resource.function.pinecone import IndexSettingsMismatchError
+from pinecone_constructs.aws.custom_resource.function.pinecone_settings import (
+    PineconeIndexSettings,
+    get_shared_indexes,
+)
+from pinecone_constructs.aws.custom_resource.function.settings import Settings
+
+
+def get_settings(name: str, **kwargs) -> PineconeIndexSettings:
+    """Return the settings of a logical index."""
+    return PineconeIndexSettings(
+        api_key_secret_name="secret",
+        environment="gcp-starter",
+        name=name,
+        dimension=kwargs.pop("dimension", 384),
+        metric=kwargs.pop("metric", "cosine"),
+        **kwargs,
+    )
+
+
+@pytest.fixture(name="index_client")
+def fixture_index_client(fake_pinecone):
+    """Add a shared 384 dimension cosine index, with vectors in two namespaces."""
+    fake_pinecone.add_index("shared-384-cosine", dimension=384, metric="cosine", environment="gcp-starter")
+    index_client = fake_pinecone.Index("shared-384-cosine")
+    index_client.namespaces.update({"tenant-a": 3, "tenant-b": 2})
+    return index_client
+
+
+def get_namespace(namespace: str, **kwargs) -> NamespacedPineconeIndex:
+    """Return a namespace of the shared index."""
+    settings = get_settings("shared-384-cosine", **kwargs).model_copy(update={"namespace": namespace})
+    return NamespacedPineconeIndex(settings=Settings(num_attempts_to_run_operation=1), index_settings=settings)
+
+
+def test_indexes_with_the_same_dimension_and_metric_share_an_index():
+    """Indexes should be grouped by dimension and metric, taking the largest pods and all indexed metadata."""
+    shared_indexes = get_shared_indexes(
+        [
+            get_settings("tenant-a", removal_policy="DESTROY", metadata_config={"indexed": ["genre"]}),
+            get_settings("tenant-b", pods=2, metadata_config={"indexed": ["year", "genre"]}),
+            get_settings("tenant-c", metric="dotproduct", removal_policy="DESTROY"),
+        ]
+    )
+    assert [shared_index.index_settings.name for shared_index in shared_indexes] == [
+        "shared-384-cosine",
+        "shared-384-dotproduct",
+    ]
+    cosine, dotproduct = shared_indexes
+    assert cosine.index_settings.pods == 2
+    assert cosine.index_settings.metadata_config == {"indexed": ["genre", "year"]}
+    assert cosine.index_settings.removal_policy == "RETAIN_ON_UPDATE_OR_DELETE"
+    assert dotproduct.index_settings.removal_policy == "DESTROY"
+    assert [(settings.name, settings.namespace) for settings in cosine.namespace_settings] == [
+        ("shared-384-cosine", "tenant-a"),
+        ("shared-384-cosine", "tenant-b"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        [get_settings("tenant-a"), get_settings("tenant-a", metric="dotproduct")],
+        [get_settings("tenant-a"), get_settings("tenant-b", pod_size="x2")],
+        [get_settings("tenant-a", removal_policy="SNAPSHOT")],
+        [get_settings("tenant-a", additional_environments=[{"environment": "us-west1-gcp"}])],
+    ],
+)
+def test_indexes_that_cannot_share_an_index_are_rejected(settings):
+    """Duplicate namespaces, mixed pod types, and settings namespaces do not support should be rejected."""
+    with pytest.raises(AssertionError):
+        get_shared_indexes(settings)
+
+
+@pytest.mark.usefixtures("index_client")
+def test_create_publishes_the_namespace():
+    """Creating a namespace should publish the shared index and namespace as attributes."""
+    namespace = get_namespace("tenant-a")
+    namespace.create()
+    assert namespace.name == "shared-384-cosine/tenant-a"
+    assert namespace.data == {
+        "IndexName": "shared-384-cosine",
+        "Namespace": "tenant-a",
+        "Host": "shared-384-cosine-project.svc.gcp-starter.pinecone.io",
+    }
+
+
+@pytest.mark.usefixtures("index_client")
+def test_create_fails_if_the_shared_index_does_not_fit():
+    """A namespace with a different dimension than its shared index should fail to be created."""
+    with pytest.raises(IndexSettingsMismatchError, match="dimension"):
+        get_namespace("tenant-a", dimension=768).create()
+
+
+@pytest.mark.parametrize(
+    "removal_policy,expected_namespaces",
+    [
+        ("DESTROY", {"tenant-b": 2}),
+        ("RETAIN", {"tenant-a": 3, "tenant-b": 2}),
+        ("RETAIN_ON_UPDATE_OR_DELETE", {"tenant-a": 3, "tenant-b": 2}),
+    ],
+)
+def test_delete_removes_only_the_vectors_of_the_namespace(index_client, removal_policy, expected_namespaces):
+    """Deleting a namespace should delete its vectors, unless its removal policy retains them."""
+    get_namespace("tenant-a", removal_policy=removal_policy).delete()
+    assert index_client.namespaces == expected_namespaces
@@ -0,0 +1,57 @@
+import pytest
+
+from pinecone_constructs.aws.custom_resource.function import pinecone as pinecone_module
+from pinecone_constructs.aws.custom_resource.function.ledger import InMemoryLedgerStore, OperationLedger
+from pinecone_constructs.aws.custom_resource.function.pinecone import (
+    IndexSettingsMismatchError,
+    PineconeIndex,
+)
+from pinecone_constructs.aws.custom_resource.function.pinecone_settings import PineconeIndexSettings
+from pinecone_constructs.aws.custom_resource.function.settings import Settings
+
+
+EVENT = {"RequestId": "request-1", "RequestType": "Create"}
+
+
+def get_index(dimension: int = 384) -> PineconeIndex:
+    """Return an index with test settings."""
+    return PineconeIndex(
+        settings=Settings(num_attempts_to_run_operation=2),
+        index_settings=PineconeIndexSettings(
+            api_key_secret_name="secret",
+            environment="gcp-starter",
+            name="test-index",
+            dimension=dimension,
+        ),
+    )
+
+
+def test_replayed_operation_returns_recorded_result():
+    """A replayed request should not run the operation again."""
+    ledger = OperationLedger(InMemoryLedgerStore())
+    calls = []
+
+    def operation():
+        calls.append(1)
+        return "test-index"
+
+    assert ledger.run_once(EVENT, "test-index", operation) == "test-index"
+    assert ledger.run_once(EVENT, "test-index", operation) == "test-index"
+    assert len(calls) == 1
+    ledger.run_once({**EVENT, "RequestId": "request-2"}, "test-index", operation)
+    assert len(calls) == 2
+
+
+def test_create_is_a_no_op_when_matching_index_exists(fake_pinecone):
+    """Creating an index that already exists with matching settings should succeed."""
+    get_index().create()
+    get_index().create()
+    assert list(fake_pinecone.indexes) == ["test-index"]
+
+
+def test_create_fails_fast_when_existing_index_does_not_match(fake_pinecone, monkeypatch):
+    """Creating an index that exists with different settings should fail without retrying."""
+    get_index().create()
+    monkeypatch.setattr(pinecone_module.time, "sleep", pytest.fail)
+    with pytest.raises(IndexSettingsMismatchError):
+        get_index(dimension=1536).create()
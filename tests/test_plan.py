@@ -0,0 +1,177 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from pinecone_constructs.aws.custom_resource.function.pinecone_settings import PineconeIndexSettings
+from pinecone_constructs.aws.custom_resource.function.pool import (
+    InMemoryIndexPoolStore,
+    PoolIndexStatus,
+    PoolRecord,
+)
+from pinecone_constructs.aws.plan import InMemoryBackend, IndexState, PlannedAction, plan_app, plan_changes
+
+
+EXAMPLE_APP = Path(__file__).parent.parent / "pinecone_constructs" / "examples" / "aws" / "app.py"
+
+# load_app must run before aws_cdk is imported, so it is run in a fresh interpreter
+LOAD_APP_SCRIPT = """
+import json, os
+from pinecone_constructs.aws.plan import load_app
+constructs = load_app({app_path!r})
+print(json.dumps({{
+    "names": [settings.name for construct in constructs for settings in construct.index_settings],
+    "environment": {{name: os.environ.get(name) for name in ("CDK_CONTEXT_JSON", "CDK_OUTDIR")}},
+}}))
+"""
+
+
+def get_settings(**kwargs) -> PineconeIndexSettings:
+    """Return index settings with test defaults."""
+    return PineconeIndexSettings(
+        **{
+            "api_key_secret_name": "secret",
+            "environment": "gcp-starter",
+            "name": "prefix-index",
+            "dimension": 384,
+            **kwargs,
+        }
+    )
+
+
+def get_state(**kwargs) -> IndexState:
+    """Return a live index state matching the default test settings."""
+    return IndexState(
+        **{
+            "name": "prefix-index",
+            "dimension": 384,
+            "metric": "dotproduct",
+            "pods": 1,
+            "replicas": 1,
+            "pod_type": "s1.x1",
+            **kwargs,
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    ("settings", "indexes", "expected_actions", "num_errors"),
+    [
+        (get_settings(), [], [PlannedAction.CREATE], 0),
+        (get_settings(), [get_state()], [PlannedAction.NO_CHANGE], 0),
+        (get_settings(pod_size="x2"), [get_state()], [PlannedAction.CONFIGURE], 0),
+        (get_settings(), [get_state(pod_type="s1.x2")], [PlannedAction.CONFIGURE], 1),
+        (get_settings(pod_instance_type="p1"), [get_state()], [PlannedAction.CONFIGURE], 1),
+        (get_settings(dimension=1536), [get_state()], [PlannedAction.NO_CHANGE], 1),
+        (get_settings(source_collection="missing"), [], [PlannedAction.CREATE], 1),
+        (
+            get_settings(),
+            [get_state(), get_state(name="prefix-removed")],
+            [PlannedAction.NO_CHANGE, PlannedAction.DELETE],
+            0,
+        ),
+    ],
+)
+def test_plan_deploy(settings, indexes, expected_actions, num_errors):
+    """The plan should match what the provider would do on deploy."""
+    changes = plan_changes([settings], InMemoryBackend(indexes), ["prefix-"])
+    assert [change.action for change in changes] == expected_actions
+    assert sum(len(change.errors) for change in changes) == num_errors
+
+
+@pytest.mark.parametrize(
+    ("removal_policy", "total_vector_count", "expected_actions"),
+    [
+        ("RETAIN", 0, [PlannedAction.RETAIN]),
+        ("RETAIN_ON_UPDATE_OR_DELETE", 10, [PlannedAction.RETAIN]),
+        ("RETAIN_ON_UPDATE_OR_DELETE", 0, [PlannedAction.DELETE]),
+        ("SNAPSHOT", 10, [PlannedAction.SNAPSHOT, PlannedAction.DELETE]),
+        ("DESTROY", 10, [PlannedAction.DELETE]),
+    ],
+)
+def test_plan_destroy(removal_policy, total_vector_count, expected_actions):
+    """Destroying the app should follow the removal policy of each index."""
+    backend = InMemoryBackend([get_state(total_vector_count=total_vector_count)])
+    changes = plan_changes([get_settings(removal_policy=removal_policy)], backend, destroy=True)
+    assert [change.action for change in changes] == expected_actions
+
+
+def test_load_app_returns_the_index_constructs_and_restores_the_environment():
+    """Loading an app should find its indexes without bundling, and leave the CDK environment as it was."""
+    environment = {**os.environ, "CDK_OUTDIR": "cdk.out", "JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION": "1"}
+    environment.pop("CDK_CONTEXT_JSON", None)
+    result = subprocess.run(
+        [sys.executable, "-c", LOAD_APP_SCRIPT.format(app_path=str(EXAMPLE_APP))],
+        env=environment,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    output = json.loads(result.stdout.strip().splitlines()[-1])
+    (name,) = output["names"]
+    assert name.endswith("-pinecone-test")
+    assert output["environment"] == {"CDK_CONTEXT_JSON": None, "CDK_OUTDIR": "cdk.out"}
+
+
+def test_plan_app_plans_each_project_with_its_own_backend():
+    """The indexes of every environment should be planned against the backend of their project."""
+    constructs = [
+        SimpleNamespace(
+            index_name_prefix="prefix-",
+            index_settings=[get_settings(additional_environments=[{"environment": "us-west1-gcp"}])],
+            index_pool=None,
+        ),
+        SimpleNamespace(index_name_prefix="other-", index_settings=[get_settings(name="other-index")], index_pool=None),
+    ]
+    backends = {
+        ("secret", "gcp-starter"): InMemoryBackend([get_state(), get_state(name="prefix-removed")]),
+        ("secret", "us-west1-gcp"): InMemoryBackend(),
+    }
+    changes = plan_app(constructs, lambda secret_name, environment: backends[(secret_name, environment)])
+    assert [(change.index_name, change.action) for change in changes] == [
+        ("prefix-index", PlannedAction.NO_CHANGE),
+        ("other-index", PlannedAction.CREATE),
+        ("prefix-removed", PlannedAction.DELETE),
+        ("prefix-index", PlannedAction.CREATE),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("destroy", "expected_action", "expected_details"),
+    [
+        (False, PlannedAction.NO_CHANGE, []),
+        (True, PlannedAction.DELETE, ["leased from the pool, so it is cleared and returned to it instead"]),
+    ],
+)
+def test_plan_app_looks_up_indexes_leased_from_a_pool(destroy, expected_action, expected_details):
+    """An index leased from a pool should be planned under its pool name, instead of being created."""
+    store = InMemoryIndexPoolStore()
+    store.put(
+        PoolRecord(
+            index_name="pool-abc-1234",
+            shape="shape",
+            environment="gcp-starter",
+            api_key_secret_name="secret",
+            status=PoolIndexStatus.LEASED,
+            lessee="prefix-index",
+        )
+    )
+    construct = SimpleNamespace(
+        index_name_prefix="prefix-",
+        index_settings=[get_settings(removal_policy="DESTROY")],
+        index_pool=SimpleNamespace(table_name_parameter_name="/pool-abc/table-name"),
+    )
+    backend = InMemoryBackend([get_state(name="pool-abc-1234")])
+    changes = plan_app(
+        [construct],
+        lambda secret_name, environment: backend,
+        destroy=destroy,
+        get_pool_store={"/pool-abc/table-name": store}.__getitem__,
+    )
+    assert [(change.index_name, change.action, change.details) for change in changes] == [
+        ("pool-abc-1234", expected_action, expected_details)
+    ]
@@ -0,0 +1,132 @@
+from collections import Counter, defaultdict
+
+import pytest
+
+from pinecone_constructs.aws.sharding import ConsistentHashRing, ShardMap, ShardRouter, merge_matches
+
+
+class FakeShard:
+    """Hold the vectors of a fake shard per namespace, scoring queries by the first value of each vector."""
+
+    def __init__(self, name):
+        self.name = name
+        self.namespaces = defaultdict(dict)
+        self.num_queries = 0
+
+    @property
+    def vectors(self):
+        return {vector_id: values for vectors in self.namespaces.values() for vector_id, values in vectors.items()}
+
+    def upsert(self, vectors, namespace=""):
+        for vector_id, values in vectors:
+            self.namespaces[namespace][vector_id] = values
+        return {"upserted_count": len(vectors)}
+
+    def fetch(self, ids, namespace=""):
+        vectors = self.namespaces[namespace]
+        return {"vectors": {vector_id: vectors[vector_id] for vector_id in ids if vector_id in vectors}}
+
+    def delete(self, ids=None, delete_all=False, namespace=""):
+        vectors = self.namespaces[namespace]
+        for vector_id in list(vectors) if delete_all else ids:
+            del vectors[vector_id]
+
+    def query(self, vector, top_k, namespace=""):
+        self.num_queries += 1
+        matches = [
+            {"id": vector_id, "score": values[0] * vector[0]} for vector_id, values in self.namespaces[namespace].items()
+        ]
+        return {"matches": sorted(matches, key=lambda match: match["score"], reverse=True)[:top_k]}
+
+
+def get_router(**kwargs) -> ShardRouter:
+    """Return a router over three fake shards."""
+    shard_map = ShardMap(index_names=["shard-0", "shard-1", "shard-2"], environment="gcp-starter", **kwargs)
+    return ShardRouter(shard_map, get_index=FakeShard)
+
+
+def test_consistent_hash_ring_spreads_keys_and_moves_few_when_a_shard_is_added():
+    """Keys should be spread evenly, and adding a shard should only move keys to the new shard."""
+    keys = [f"id-{i}" for i in range(10_000)]
+    ring, larger_ring = ConsistentHashRing(4), ConsistentHashRing(5)
+    counts = Counter(ring.get_shard(key) for key in keys)
+    assert min(counts.values()) > 0.15 * len(keys)
+    moved = [key for key in keys if ring.get_shard(key) != larger_ring.get_shard(key)]
+    assert {larger_ring.get_shard(key) for key in moved} == {4}
+    assert len(moved) < 0.3 * len(keys)
+
+
+def test_router_upserts_and_fetches_on_the_owning_shard():
+    """Each vector should be stored on exactly one shard, and fetched from it."""
+    router = get_router()
+    vectors = [(f"id-{i}", [float(i)]) for i in range(100)]
+    assert router.upsert(vectors=vectors) == {"upserted_count": 100}
+    shards = router._indexes  # pylint: disable=protected-access
+    assert sum(len(shard.vectors) for shard in shards) == 100
+    assert all(shard.vectors for shard in shards)
+    assert router.fetch(ids=["id-1", "id-42"])["vectors"] == {"id-1": [1.0], "id-42": [42.0]}
+    router.delete(ids=["id-1"])
+    assert router.fetch(ids=["id-1"])["vectors"] == {}
+
+
+def test_router_calls_no_shard_without_vectors():
+    """Empty upserts, fetches and deletes should not call any shard."""
+    router = get_router()
+    assert router.upsert(vectors=[]) == {"upserted_count": 0}
+    assert router.fetch(ids=[])["vectors"] == {}
+    router.delete(ids=[])
+
+
+def test_query_fans_out_and_merges_the_top_k():
+    """A query should be answered by every shard, with the global top k."""
+    router = get_router()
+    router.upsert(vectors=[(f"id-{i}", [float(i)]) for i in range(100)])
+    matches = router.query(vector=[1.0], top_k=3)["matches"]
+    assert [match["id"] for match in matches] == ["id-99", "id-98", "id-97"]
+    assert all(shard.num_queries == 1 for shard in router._indexes)  # pylint: disable=protected-access
+
+
+def test_tenant_layout_keeps_each_tenant_on_one_shard():
+    """Every vector of a tenant should be on its assigned shard, and queried only there."""
+    router = get_router(layout="tenant", tenant_shards={"acme": 2})
+    router.upsert(vectors=[(f"id-{i}", [float(i)]) for i in range(10)], tenant="acme")
+    shards = router._indexes  # pylint: disable=protected-access
+    assert [len(shard.vectors) for shard in shards] == [0, 0, 10]
+    assert len(router.query(vector=[1.0], top_k=5, tenant="acme")["matches"]) == 5
+    assert [shard.num_queries for shard in shards] == [0, 0, 1]
+    with pytest.raises(AssertionError, match="tenant"):
+        router.upsert(vectors=[("id", [1.0])])
+    with pytest.raises(AssertionError, match="namespace"):
+        router.query(vector=[1.0], top_k=5, tenant="acme", namespace="globex")
+
+
+def test_tenants_on_the_same_shard_are_isolated():
+    """Queries and deletes of a tenant should never see or remove the vectors of another tenant on its shard."""
+    router = get_router(layout="tenant", tenant_shards={"acme": 1, "globex": 1})
+    router.upsert(vectors=[("a1", [1.0])], tenant="acme")
+    router.upsert(vectors=[("g1", [2.0])], tenant="globex")
+    assert [match["id"] for match in router.query(vector=[1.0], top_k=5, tenant="acme")["matches"]] == ["a1"]
+    assert router.fetch(ids=["g1"], tenant="acme")["vectors"] == {}
+    router.delete(delete_all=True, tenant="acme")
+    assert router.query(vector=[1.0], top_k=5, tenant="acme")["matches"] == []
+    assert router.fetch(ids=["g1"], tenant="globex")["vectors"] == {"g1": [2.0]}
+
+
+def test_consistent_hash_layout_rejects_a_tenant():
+    """A tenant should not narrow a consistent hash query to one shard, which would drop matches."""
+    router = get_router()
+    with pytest.raises(AssertionError, match="tenant layout"):
+        router.query(vector=[1.0], top_k=5, tenant="acme")
+
+
+@pytest.mark.parametrize(
+    "metric,expected_ids",
+    [("cosine", ["b", "d"]), ("dotproduct", ["b", "d"]), ("euclidean", ["a", "c"])],
+)
+def test_merge_matches_ranks_by_metric(metric, expected_ids):
+    """Similarities should rank highest first, and euclidean distances lowest first."""
+    results = [
+        [{"id": "a", "score": 0.1}, {"id": "b", "score": 0.9}],
+        [{"id": "c", "score": 0.2}, {"id": "d", "score": 0.8}],
+    ]
+    assert [match["id"] for match in merge_matches(results, 2, metric)] == expected_ids
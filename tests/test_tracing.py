@@ -0,0 +1,159 @@
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pinecone_constructs.aws.custom_resource.function.benchmark import run_benchmark
+from pinecone_constructs.aws.custom_resource.function.pinecone import PineconeIndex
+from pinecone_constructs.aws.custom_resource.function.pinecone_settings import BenchmarkSettings, PineconeIndexSettings
+from pinecone_constructs.aws.custom_resource.function.settings import Settings
+from pinecone_constructs.aws.custom_resource.function.tracing import (
+    InMemorySpanExporter,
+    Span,
+    Tracer,
+    XRaySpanExporter,
+    propagate_context,
+    tracer,
+)
+
+
+@pytest.fixture(name="exporter")
+def fixture_exporter():
+    """Record the spans of the provider in memory."""
+    exporter = InMemorySpanExporter()
+    tracer.configure(exporter)
+    yield exporter
+    tracer.configure(None)
+
+
+@pytest.fixture(name="flaky_pinecone")
+def fixture_flaky_pinecone(fake_pinecone):
+    """Replace the pinecone client with a fake whose first create_index call fails."""
+    fake_pinecone.errors["create_index"].append(ConnectionError("connection reset"))
+    return fake_pinecone
+
+
+def create_index() -> None:
+    """Create an index with test settings."""
+    PineconeIndex(
+        settings=Settings(),
+        index_settings=PineconeIndexSettings(
+            api_key_secret_name="secret",
+            environment="gcp-starter",
+            name="test-index",
+            dimension=4,
+        ),
+    ).create()
+
+
+def test_spans_record_every_step_and_retry(exporter, flaky_pinecone):
+    """Each step, attempt and sleep should be a child of the request span, tagged with the request id."""
+    with tracer.start_trace("request-1", "custom_resource.create"):
+        create_index()
+    spans = {(span.name, span.attributes.get("attempt")): span for span in exporter.get_finished_spans()}
+    root = spans[("custom_resource.create", None)]
+    assert root.parent_id is None
+    assert list(spans) == [
+        ("secretsmanager.get_secret", None),
+        ("pinecone.init", None),
+        ("pinecone.list_indexes", None),
+        ("pinecone.create_index", None),
+        ("attempt", 1),
+        ("retry_sleep", None),
+        ("attempt", 2),
+        ("custom_resource.create", None),
+    ]
+    assert spans[("attempt", 1)].error == "ConnectionError: connection reset"
+    assert spans[("attempt", 2)].error is None
+    for key, span in spans.items():
+        assert span.attributes["request_id"] == "request-1"
+        assert span.trace_id == root.trace_id
+        assert span.end_time >= span.start_time
+        if key[0] in ("attempt", "retry_sleep", "secretsmanager.get_secret", "pinecone.init"):
+            assert span.parent_id == root.span_id
+        assert span.duration_ms <= root.duration_ms
+
+
+def test_disabled_tracer_records_nothing(flaky_pinecone):
+    """Without an exporter, spans should be shared no-ops."""
+    disabled = Tracer()
+    assert disabled.span("a") is disabled.span("b")
+    with disabled.start_trace("request-1", "custom_resource.create") as span:
+        span.set_attribute("index_name", "test-index")
+        create_index()
+
+
+def test_traced_decorator_records_errors(exporter):
+    """A decorated function that raises should record the error and re-raise it."""
+
+    @tracer.traced("failing_step")
+    def failing_step():
+        raise ValueError("bad value")
+
+    with pytest.raises(ValueError):
+        failing_step()
+    (span,) = exporter.get_finished_spans()
+    assert span.name == "failing_step"
+    assert span.error == "ValueError: bad value"
+
+
+def test_xray_exporter_sends_subsegment_to_daemon(monkeypatch):
+    """Spans should be sent to the daemon as subsegments of the lambda segment."""
+    daemon = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    daemon.bind(("127.0.0.1", 0))
+    daemon.settimeout(5)
+    monkeypatch.setenv("AWS_XRAY_DAEMON_ADDRESS", f"127.0.0.1:{daemon.getsockname()[1]}")
+    monkeypatch.setenv("_X_AMZN_TRACE_ID", "Root=1-5759e988-bd862e3fe1be46a994272793;Parent=53995c3f42cd8ad8;Sampled=1")
+    span = Span(name="pinecone.init", trace_id="local", attributes={"request_id": "request-1"}, end_time=1.0)
+    XRaySpanExporter().export(span)
+    header, body = daemon.recv(65536).decode().split("\n", 1)
+    subsegment = json.loads(body)
+    assert json.loads(header) == {"format": "json", "version": 1}
+    assert subsegment["trace_id"] == "1-5759e988-bd862e3fe1be46a994272793"
+    assert subsegment["parent_id"] == "53995c3f42cd8ad8"
+    assert subsegment["annotations"] == {"request_id": "request-1"}
+    daemon.close()
+
+
+def test_spans_in_worker_threads_attach_to_the_submitting_span(exporter):
+    """Spans started in a thread pool should be children of the span that submitted the work."""
+
+    class TracedIndex:
+        """Record a span around each query, like an instrumented client."""
+
+        def query(self, **_):
+            with tracer.span("pinecone.query"):
+                return {"matches": []}
+
+    settings = BenchmarkSettings(num_queries=6, concurrency_levels=[3])
+    with tracer.start_trace("request-1", "custom_resource.create"):
+        run_benchmark(TracedIndex(), [[0.1, 0.2]], settings)
+    spans = exporter.get_finished_spans()
+    (level,) = [span for span in spans if span.name == "benchmark.concurrency"]
+    queries = [span for span in spans if span.name == "pinecone.query"]
+    assert len(queries) == 6
+    for span in queries:
+        assert span.parent_id == level.span_id
+        assert span.trace_id == level.trace_id
+        assert span.attributes["request_id"] == "request-1"
+
+
+def test_propagated_calls_do_not_share_their_context(exporter):
+    """Concurrent calls should each run in a copy of the context, and not leave spans current."""
+    barrier = threading.Barrier(2)
+
+    def step():
+        with tracer.span("step") as span:
+            barrier.wait(timeout=5)
+            return span.parent_id
+
+    with tracer.start_trace("request-1", "custom_resource.create") as root:
+        bound_step = propagate_context(step)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parents = list(executor.map(lambda _: bound_step(), range(2)))
+        with tracer.span("after") as after:
+            pass
+    assert parents == [root.span_id, root.span_id]
+    assert after.parent_id == root.span_id